@@ -1,13 +1,64 @@
 """Main entrypoint for running the falling sand simulation"""
 
+import sys
+from typing import Optional
+
 from . import scenarios
-from .args import args
+from .args import parse_args
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    """Main entrypoint for running a simulation, 'tfs bench' to run the benchmarks, 'tfs sweep' to run a parameter sweep,
+    'tfs verify' to check the engines against each other or 'tfs replay' to play a recording
+
+    Args:
+        argv (list[str]): The command line arguments. Defaults to sys.argv[1:]
+    """
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ["bench"]:
+        from .bench import main as bench
+
+        bench(argv[1:])
+        return
+    if argv[:1] == ["sweep"]:
+        from .sweep import main as sweep
+
+        sweep(argv[1:])
+        return
+    if argv[:1] == ["verify"]:
+        from .verify import main as verify
+
+        verify(argv[1:])
+        return
+    if argv[:1] == ["replay"]:
+        from .recording import main as replay
+
+        replay(argv[1:])
+        return
 
+    options = parse_args(argv)
+    dispersions = options.pop("dispersion")
+    if dispersions:
+        from .elements import ELEMENT_TYPES, set_dispersion
 
-def main() -> None:
-    """Main entrypoint for running a simulation on default settings"""
-    sim = scenarios.SCENARIO_3
-    sim.start(**args)
+        elements = {e.__name__: e for e in ELEMENT_TYPES}
+        for name, dispersion in dispersions.items():
+            set_dispersion(elements[name], dispersion)
+    sim = scenarios.build(
+        options.pop("scenario"),
+        engine=options.pop("engine"),
+        workers=options.pop("workers"),
+        xmax=options.pop("xmax"),
+        ymax=options.pop("ymax"),
+        seed=options.pop("seed"),
+    )
+    stats = sim.start(**options)
+    if stats is not None:
+        print(
+            f"{stats.ticks} ticks at {stats.ticks_per_second:.1f}/s, "
+            f"{stats.frames} frames at {stats.frames_per_second:.1f}/s ({stats.skipped_frames} skipped)",
+            file=sys.stderr,
+        )
 
 
 if __name__ == "__main__":
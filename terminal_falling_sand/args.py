@@ -1,9 +1,36 @@
 """Manages command line arguments"""
 
 import argparse
+from typing import Optional
+
+from .scenarios import SCENARIOS
+
+
+def _dispersions(value: str) -> dict[str, int]:
+    """Parses a NAME=CELLS[,NAME=CELLS...] set of element dispersions, checking each against the registered elements"""
+    from .elements import ELEMENT_TYPES
+
+    dispersions = {}
+    try:
+        for pair in value.split(","):
+            name, cells = pair.split("=")
+            dispersions[name.strip()] = int(cells)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Expected dispersions like Water=5,Lava=2, got {value!r}")
+    names = [e.__name__ for e in ELEMENT_TYPES]
+    for name, cells in dispersions.items():
+        if name not in names:
+            raise argparse.ArgumentTypeError(f"Unknown element type {name!r}. Expected one of {names}")
+        if cells < 1:
+            raise argparse.ArgumentTypeError(f"An element's dispersion must be at least 1, not {cells} for {name}")
+    return dispersions
+
 
 parser = argparse.ArgumentParser(
-    description="A pixel physics simulator with terminal rendering"
+    prog="tfs",
+    description="A pixel physics simulator with terminal rendering. "
+    "Run 'tfs bench' to benchmark it, 'tfs sweep' to run many variations of a world headless, 'tfs verify' to check "
+    "the engines step worlds alike, or 'tfs replay' to play back a recording",
 )
 
 parser.add_argument(
@@ -11,7 +38,23 @@ parser.add_argument(
     "--refresh-rate",
     type=int,
     default=60,
-    help="The refresh rate of the simulation",
+    help="The number of times per second the simulation steps. 0 for as fast as possible",
+)
+
+parser.add_argument(
+    "-f",
+    "--frame-rate",
+    type=int,
+    default=0,
+    help="The number of frames per second to render. 0 renders after every step",
+)
+
+parser.add_argument(
+    "-t",
+    "--threaded",
+    action="store_true",
+    default=False,
+    help="Renders frames on a separate thread, from snapshots of the simulation",
 )
 
 parser.add_argument(
@@ -27,7 +70,37 @@ parser.add_argument(
     "--debug",
     action="store_true",
     default=False,
-    help="Controls if the simluation runs in debug mode",
+    help="Runs in debug mode: profiles the run with cProfile, without rendering. See --profile",
+)
+
+parser.add_argument(
+    "--profile",
+    choices=["cprofile", "sample"],
+    default=None,
+    help="Profiles the run, then reports where the time went. 'cprofile' traces every call, slowing the run down; "
+    "'sample' samples it every --profile-interval seconds, breaking time down by phase (stepping, rendering), function "
+    "and the element type of the cells stepped",
+)
+
+parser.add_argument(
+    "--profile-output",
+    default=None,
+    help="When profiling, saves the profile to this file: as pstats with 'cprofile', or with 'sample' as the report "
+    "otherwise printed (JSON if the file ends in .json)",
+)
+
+parser.add_argument(
+    "--profile-sort",
+    choices=["cumulative", "tottime", "ncalls", "pcalls", "name", "filename"],
+    default="cumulative",
+    help="With --profile cprofile, what to sort the functions reported by",
+)
+
+parser.add_argument(
+    "--profile-interval",
+    type=float,
+    default=0.005,
+    help="With --profile sample, the time between samples, in seconds",
 )
 
 parser.add_argument(
@@ -39,5 +112,149 @@ parser.add_argument(
     help="Disables simulation rendering to the terminal",
 )
 
+parser.add_argument(
+    "-s",
+    "--scenario",
+    choices=list(SCENARIOS),
+    default="scenario_3",
+    help="The world to simulate. Only the chosen scenario is built",
+)
+
+parser.add_argument(
+    "--width",
+    dest="xmax",
+    type=int,
+    default=None,
+    help="The width of the world, in cells. Defaults to the width of the terminal",
+)
+
+parser.add_argument(
+    "--height",
+    dest="ymax",
+    type=int,
+    default=None,
+    help="The height of the world, in cells. Defaults to twice the height of the terminal",
+)
+
+parser.add_argument(
+    "--dispersion",
+    type=_dispersions,
+    default={},
+    help="How far element types travel along a row in one step, as NAME=CELLS[,NAME=CELLS...], e.g. Water=5 to level "
+    "water out faster. Defaults to their own, 1 for every built-in element",
+)
+
+parser.add_argument(
+    "-z",
+    "--scale",
+    type=int,
+    default=None,
+    help="Renders an overview of the world, each glyph standing for a block of this many cells across. "
+    "Scroll with the arrow keys, zoom with '+' and '-'",
+)
+
+parser.add_argument(
+    "--record",
+    default=None,
+    help="Records the run to this file, to be played back with 'tfs replay'",
+)
+
+parser.add_argument(
+    "--keyframe-interval",
+    type=int,
+    default=300,
+    help="When recording, the number of ticks between keyframes",
+)
+
+parser.add_argument(
+    "--metrics",
+    default=None,
+    help="Writes the cost of every tick (step and render time, cells evaluated, swaps per element, active region) to "
+    "this file, as JSON lines",
+)
+
+parser.add_argument(
+    "--export",
+    default=None,
+    help="Exports frames as images, whether or not rendering: streamed to this file ('-' for standard output, e.g. "
+    "piped into ffmpeg), or one file per frame if this is a directory",
+)
+
+parser.add_argument(
+    "--export-format",
+    choices=["rgb", "ppm", "png"],
+    default="ppm",
+    help="When exporting, how frames are encoded: raw RGB, or PPM or PNG images",
+)
+
+parser.add_argument(
+    "--export-every",
+    type=int,
+    default=1,
+    help="When exporting, the number of ticks between frames",
+)
+
+parser.add_argument(
+    "--export-scale",
+    type=int,
+    default=1,
+    help="When exporting, the number of pixels across each cell is drawn as",
+)
+
+parser.add_argument(
+    "--seed",
+    type=int,
+    default=None,
+    help="The seed for the simulation's random number generator. The same seed builds and runs the same world",
+)
+
+parser.add_argument(
+    "-e",
+    "--engine",
+    choices=["list", "numpy", "vector", "parallel", "jit"],
+    default="list",
+    help="The grid backend to run the simulation on. 'jit' needs Numba installed to be any faster than 'numpy'",
+)
+
+parser.add_argument(
+    "-w",
+    "--workers",
+    type=int,
+    default=None,
+    help="The number of worker processes for the parallel engine. Defaults to the number of CPUs",
+)
+
+parser.add_argument(
+    "--renderer",
+    choices=["rich", "diff"],
+    default="rich",
+    help="How to render to the terminal. 'diff' only redraws cells that changed since the last frame",
+)
+
+
+def grid_size(value: str) -> tuple[int, int]:
+    """Parses a WIDTHxHEIGHT grid size, as taken by the 'bench', 'sweep' and 'verify' commands
+
+    Args:
+        value (str): The size, e.g. '160x96'
+
+    Returns:
+        The width and height
+    """
+    try:
+        xmax, ymax = (int(n) for n in value.lower().split("x"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Expected a size like 160x96, got {value!r}")
+    return (xmax, ymax)
+
+
+def parse_args(argv: Optional[list[str]] = None) -> dict:
+    """Parses command line arguments
+
+    Args:
+        argv (list[str]): The arguments to parse. Defaults to sys.argv[1:]
 
-args = vars(parser.parse_args())
+    Returns:
+        The parsed options, by destination name
+    """
+    return vars(parser.parse_args(argv))
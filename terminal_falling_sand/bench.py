@@ -0,0 +1,209 @@
+"""Benchmarks the simulation headless, reporting results as JSON
+
+Each benchmark builds a world from the 'scenarios' module at a fixed size and seed, then times:
+
+    1. 'steps' steps of the simulation, without rendering
+    2. 'frames' frames rendered to a null device, stepping (untimed) between each
+
+Peak memory is measured with tracemalloc while the world is built and warmed up, separately from the timed runs, so
+tracing doesn't slow down the steps being timed.
+
+Run with 'tfs bench', or 'python -m terminal_falling_sand.bench'. See 'tfs bench --help' for options.
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tracemalloc
+from time import perf_counter
+from typing import Callable, Optional
+
+from . import scenarios
+from .args import grid_size
+from .simulation import ENGINES, RENDERERS, Simulation
+
+SIZES = ((80, 48), (160, 96), (320, 192))
+WARMUP_STEPS = 5
+
+
+parser = argparse.ArgumentParser(prog="tfs bench", description="Benchmarks the simulation headless")
+parser.add_argument(
+    "-w",
+    "--world",
+    action="append",
+    choices=list(scenarios.SCENARIOS),
+    help="A world to benchmark. May be repeated. Defaults to every world",
+)
+parser.add_argument(
+    "-s",
+    "--size",
+    action="append",
+    type=grid_size,
+    help="A grid size to benchmark, as WIDTHxHEIGHT. May be repeated. Defaults to 80x48, 160x96 and 320x192",
+)
+parser.add_argument(
+    "-e",
+    "--engine",
+    action="append",
+    choices=ENGINES,
+    help="An engine to benchmark. May be repeated. Defaults to 'list'",
+)
+parser.add_argument(
+    "--renderer",
+    choices=RENDERERS,
+    default="diff",
+    help="The renderer to time frames with",
+)
+parser.add_argument("--steps", type=int, default=100, help="The number of steps to time")
+parser.add_argument("--frames", type=int, default=20, help="The number of frames to time. 0 to skip rendering")
+parser.add_argument("--seed", type=int, default=0, help="The seed for the simulation's random number generator")
+parser.add_argument("--workers", type=int, default=None, help="The number of worker processes for the parallel engine")
+parser.add_argument("-o", "--output", default=None, help="The file to write results to. Defaults to stdout")
+
+
+def build(world: str, engine: str, xmax: int, ymax: int, seed: int, workers: Optional[int] = None) -> Simulation:
+    """Builds a world with a seeded random number generator
+
+    Args:
+        world (str): The name of the world, one of scenarios.SCENARIOS
+        engine (str): The engine to build it on
+        xmax (int): The width of the grid
+        ymax (int): The height of the grid
+        seed (int): The seed
+        workers (int): The number of worker processes for the 'parallel' engine. Defaults to the number of CPUs
+
+    Returns:
+        The simulation
+    """
+    return scenarios.build(world, engine=engine, workers=workers, xmax=xmax, ymax=ymax, seed=seed)
+
+
+def _renderer(renderer: str, xmax: int, ymax: int, file) -> Callable:
+    """Returns a function drawing a matrix to 'file' with the given renderer"""
+    if renderer == "diff":
+        from rich.color import ColorSystem
+
+        from .render import DiffRenderer
+
+        return DiffRenderer(file, ColorSystem.TRUECOLOR).render
+
+    from rich.console import Console
+
+    console = Console(file=file, force_terminal=True, color_system="truecolor", width=xmax, height=ymax // 2)
+    return console.print
+
+
+def run_benchmark(
+    world: str,
+    engine: str,
+    xmax: int,
+    ymax: int,
+    steps: int = 100,
+    frames: int = 20,
+    seed: int = 0,
+    renderer: str = "diff",
+    workers: Optional[int] = None,
+) -> dict:
+    """Runs a single benchmark
+
+    Args:
+        world (str): The name of the world, one of scenarios.SCENARIOS
+        engine (str): The engine to run it on
+        xmax (int): The width of the grid
+        ymax (int): The height of the grid
+        steps (int): The number of steps to time. Defaults to 100
+        frames (int): The number of frames to time. Defaults to 20
+        seed (int): The seed for the simulation's random number generator. Defaults to 0
+        renderer (str): The renderer to time frames with. Defaults to 'diff'
+        workers (int): The number of worker processes for the 'parallel' engine. Defaults to the number of CPUs
+
+    Returns:
+        The benchmark's parameters and results
+    """
+    tracemalloc.start()
+    try:
+        sim = build(world, engine, xmax, ymax, seed, workers)
+        for _ in range(WARMUP_STEPS):
+            sim.step()
+        _, peak_memory = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    sim.close()
+
+    sim = build(world, engine, xmax, ymax, seed, workers)
+    try:
+        start = perf_counter()
+        for _ in range(steps):
+            sim.step()
+        step_time = perf_counter() - start
+
+        render_time = 0.0
+        with open(os.devnull, "w", encoding="utf-8") as null:
+            draw = _renderer(renderer, xmax, ymax, null)
+            for _ in range(frames):
+                sim.step()
+                start = perf_counter()
+                draw(sim.matrix)
+                render_time += perf_counter() - start
+    finally:
+        sim.close()
+
+    steps_per_second = steps / step_time if step_time else 0.0
+    return {
+        "world": world,
+        "engine": engine,
+        "width": xmax,
+        "height": ymax,
+        "seed": seed,
+        "steps": steps,
+        "frames": frames,
+        "renderer": renderer,
+        "steps_per_second": steps_per_second,
+        "cells_per_second": steps_per_second * xmax * ymax,
+        "frames_per_second": frames / render_time if render_time else 0.0,
+        "peak_memory_bytes": peak_memory,
+    }
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    """Runs every combination of the worlds, sizes and engines given on the command line, and writes the results"""
+    options = parser.parse_args(argv)
+    results = []
+    for world in options.world or list(scenarios.SCENARIOS):
+        for xmax, ymax in options.size or SIZES:
+            for engine in options.engine or ["list"]:
+                result = run_benchmark(
+                    world,
+                    engine,
+                    xmax,
+                    ymax,
+                    options.steps,
+                    options.frames,
+                    options.seed,
+                    options.renderer,
+                    options.workers,
+                )
+                results.append(result)
+                print(
+                    f"{world} {xmax}x{ymax} {engine}: {result['steps_per_second']:.1f} steps/s, "
+                    f"{result['frames_per_second']:.1f} frames/s",
+                    file=sys.stderr,
+                )
+
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+    if options.output is None:
+        json.dump(report, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+    else:
+        with open(options.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
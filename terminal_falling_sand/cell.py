@@ -2,8 +2,8 @@
 
 from typing import Optional
 
-from .cell_state import CellState
-from .coordinate import Coordinate, MooreNeighborhood, Neighbors
+from .cell_state import SIDEWAYS, CellState
+from .coordinate import Coordinate, neighbor_table
 
 
 class Cell:
@@ -12,13 +12,20 @@ class Cell:
     All cells participating in the CellMatrix simulation should ultimatleyb e derived from this class. Refer to the
     'elements' module for the public facing API (the details of an element should be defined there)
 
+    Cells hold nothing but references to shared objects and their update stamp, so they're kept in __slots__.
+
     Attributes:
-        state (CellState): The state the cell is in
-        neighbors (Neighbors): Stores MooreNeighboorhood enum variants to their respective coord
-        updated (bool): Whether the cell has been updated for a given step in the sim
+        state (CellState): The state the cell is in. Shared with every cell holding the same element in the same color
+        neighbors (Neighbors): Stores MooreNeighboorhood enum variants to their respective coord. Shared with every cell
+                               at the same coordinate in a grid of the same shape (see coordinate.neighbor_table)
+        updated (int): The tick of the sim the cell was last updated in. 0 if it hasn't been updated yet
+        asleep (bool): Whether the cell failed to move when last stepped, and nothing next to it has changed since. See
+                       CellMatrix.step
 
     """
 
+    __slots__ = ("state", "neighbors", "updated", "asleep")
+
     def __init__(
         self,
         coord: Coordinate,
@@ -30,36 +37,65 @@ class Cell:
         Args:
             coord (Coordinate): The coordinate of the cell
             max_coord (Coordinate): The maximum possible coordinate for a cell. Used to identify valid neighbors
-            state (CellState): The CellState we should defer to for a cell's behavior
-            color (str): The color of the cell. Hex or standard color names are acceptable here
+            state (CellState): The state the cell starts in
         """
         self.state = state
-        neighbors = []
-        for nc in MooreNeighborhood:
-            c = coord + nc.value
-            if (0 <= c.x <= max_coord.x) and (0 <= c.y <= max_coord.y):
-                neighbors.append(c)
-            else:
-                neighbors.append(None)
-
-        self.neighbors = Neighbors(*neighbors)
-        self.updated = False
+        self.neighbors = neighbor_table(max_coord)[coord.y][coord.x]
+        self.updated = 0
+        self.asleep = False
 
     def change_state(self, matrix: list) -> Optional[Coordinate]:
         """Steps the cell forward based on the parameters of its neighbors
 
-        If the cell's state changes, swap its color and state with the target neighbor.
+        The state's compiled probes are tried in order (see cell_state.BEHAVIORS). The cell swaps states with the first
+        probed neighbor it weighs more than, or with one of a pair of neighbors it weighs more than both of, picked by
+        the matrix's 'rng'. A move into the neighbor to either side carries on along the row, up to the state's
+        'dispersion' cells in all, while the next cell along is lighter.
+
+        Both the cell and the neighbor it swaps with are stamped with the matrix's current tick, so neither is stepped
+        again until the next one.
 
         Args:
             matrix (list): The underlying list of elements found in the CellMatrix
+
+        Returns:
+            The coordinate of the neighbor the cell swapped with, or None if it didn't move
         """
 
-        neighbor = self.state.change_state(self.neighbors, matrix)
-        if neighbor is not None:
-            neighbor = matrix[neighbor.y][neighbor.x]
+        state = self.state
+        neighbors = self.neighbors
+        weight = state.weight
+        coord = None
+        for move in state.moves:
+            a = neighbors[move[0]]
+            if a is None or weight <= matrix[a.y][a.x].state.weight:
+                continue
+            if len(move) == 1:
+                coord = a
+                direction = move[0]
+                break
+            b = neighbors[move[1]]
+            if b is not None and weight > matrix[b.y][b.x].state.weight:
+                pick = matrix.rng.coin()
+                coord = (a, b)[pick]
+                direction = move[pick]
+                break
+
+        if coord is not None and state.dispersion > 1 and direction in SIDEWAYS:
+            cell = matrix[coord.y][coord.x]
+            for _ in range(state.dispersion - 1):
+                ahead = cell.neighbors[direction]
+                if ahead is None or weight <= matrix[ahead.y][ahead.x].state.weight:
+                    break
+                coord = ahead
+                cell = matrix[ahead.y][ahead.x]
+
+        if coord is not None:
+            neighbor = matrix[coord.y][coord.x]
             old_state = self.state
             self.state = neighbor.state
             neighbor.state = old_state
-            neighbor.updated = True
+            neighbor.updated = matrix.tick
 
-        self.updated = True
+        self.updated = matrix.tick
+        return coord
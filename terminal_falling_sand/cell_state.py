@@ -1,215 +1,81 @@
-"""Hosts the CellState class and its various subclasses"""
+"""Hosts the CellState class and the BEHAVIORS table of how each kind of element moves"""
 
-from random import randint
-from typing import Optional, Union
+from .coordinate import MooreNeighborhood
 
-from .coordinate import Coordinate, Neighbors
+# The probes of each kind of behavior: the neighbors a cell looks at, in order, when deciding where to move. A cell moves
+# to the first probed neighbor it weighs more than. A pair of names means it must weigh more than both, in which case one
+# of them is picked at random. A 'static' cell never moves
+BEHAVIORS: dict[str, tuple] = {
+    "static": (),
+    "solid": ("LOWER",),
+    "movable_solid": ("LOWER", ("LOWER_LEFT", "LOWER_RIGHT"), "LOWER_LEFT", "LOWER_RIGHT"),
+    "liquid": (
+        "LOWER",
+        ("LOWER_LEFT", "LOWER_RIGHT"),
+        "LOWER_LEFT",
+        "LOWER_RIGHT",
+        ("LEFT", "RIGHT"),
+        "LEFT",
+        "RIGHT",
+    ),
+}
 
+_DIRECTIONS = [member.name for member in MooreNeighborhood]
 
-class CellState:
-    """Base class for a cell's state
-
-    Attributes:
-        weight (int): Usually influences whether a cell should move in the direction it's looking. The usage of this
-                      attr can vary between subclasses
-        color (str): The color to render the cell as
-        ignore (bool): Should the change_state method run
-    """
-
-    def __init__(self, weight: Union[float, int], color: str) -> None:
-        """Initializes an instance of the CellState class
-
-        Args:
-            weight (int): The weight of the cell
-            color (str): The color of the cell
-        """
-        self.weight = weight
-        self.color = color
-        self.ignore = False
-
-    def change_state(self, neighbors: Neighbors, matrix: list) -> Optional[Coordinate]:
-        """Dictates the behavior of a cell's state
-
-        This should be filled out in subclass instances to dictate the desired behavior of a cell
-
-        If a cell changes state, the cell it's swapping with should be returned as a tuple of its coordinates and state
-
-        Args:
-            neighbors (dict[str, CellState]): A map of MooreNeighborhood variants to their respective cell's state
-        """
-
+# The index of each neighbor along the same row, in a Neighbors tuple
+SIDEWAYS = frozenset(i for i, member in enumerate(MooreNeighborhood) if member.value.y == 0)
 
-class Empty(CellState):
-    """Placeholder for empty values in a CellMatrix simulation.
 
-    This is functionally equivalent to the CellState class, but should preferred when representing Empty cells
+def compile_probes(probes: tuple) -> tuple[tuple[int, ...], ...]:
+    """Compiles the names in some probes into indices into a Neighbors tuple
 
-    Attributes:
-        weight (int): The cell's weight
-        color (str): The color to render the cell as
-        ignore (bool): Should the change_state method run
+    Args:
+        probes (tuple): Probes, as found in BEHAVIORS
 
+    Returns:
+        A tuple of indices per probe, one index per name
     """
+    moves = []
+    for probe in probes:
+        names = probe if isinstance(probe, tuple) else (probe,)
+        if not 1 <= len(names) <= 2:
+            raise ValueError(f"A probe looks at one or two neighbors, not {len(names)}")
+        moves.append(tuple(_DIRECTIONS.index(name) for name in names))
+    return tuple(moves)
 
-    def __init__(self, weight: int, color: str) -> None:
-        """Initializes an instance of the Empty class
-
-        Args:
-            weight (int): The weight of the cell
-            color (str): The color of the cell
-
-        """
-        super().__init__(weight, color)
-        self.ignore = True
-
-    def change_state(self, neighbors: Neighbors, matrix: list) -> Optional[Coordinate]:
-        """Defines the behavior of the Empty cell
-
-        The 'Empty' CellState has no behavior
-
-        Args:
-            neighbors (dict[str, CellState]): A map of MooreNeighborhood variants to their respective cell's state
-        """
 
+class CellState:
+    """The state of a cell: which element it holds, and in which color
 
-class Solid(CellState):
-    """Defines behavior for movable solids
+    States never change once created, so one is shared by every cell holding the same element in the same color (see
+    Element.shared_state). Cells move by swapping states with one another.
 
     Attributes:
-        weight (int): The cell's weight
+        element (type): The element type held. Since cells swap states rather than moving themselves, this (not the
+                        type of the cell) is what element a cell holds
+        weight (Union[float, int]): A cell only moves into a neighbor it weighs more than
         color (str): The color to render the cell as
-        ignore (bool): Should the change_state method run
+        ignore (bool): Whether the cell never moves, so stepping can skip it
+        moves (tuple[tuple[int, ...], ...]): The element's probes, compiled into indices into a Neighbors tuple
+        dispersion (int): How many cells along its row the cell travels when it moves sideways
     """
 
-    def __init__(self, weight: int, color: str):
-        """Initializes an instance of the MovableSolid class
-
-        Args:
-            weight (int): The weight of the cell
-            color (str): The color of the cell
-
-        """
-
-        super().__init__(weight, color)
-
-    def change_state(self, neighbors: Neighbors, matrix: list) -> Optional[Coordinate]:
-        """Defines the behavior of a MovableSolid
-
-        A MovableSolid's behavior can be defined as:
-            - If it weighs more than the cell below it, swap states
-            - Else if it weighs more than the cells below and diagonally left and right, pick one at random to swap with
-            - Else if it weighs more than of the neighbors below and diagonally left and right, swap states
-            - Else, retain state. Return None
-
-        Args:
-            neighbors (dict[str, CellState]): A map of MooreNeighborhood variants to their respective cell's state
-        """
-
-        if (
-            neighbors.LOWER is not None
-            and self.weight > matrix[neighbors.LOWER.y][neighbors.LOWER.x].weight
-        ):
-            return neighbors.LOWER
-
-
-class ImmovableSolid(CellState):
-    def __init__(self, color: str):
-        super().__init__(float("inf"), color)
-
+    __slots__ = ("element", "weight", "color", "ignore", "moves", "dispersion")
 
-class MovableSolid(CellState):
-    """Defines behavior for movable solids
-
-    Attributes:
-        weight (int): The cell's weight
-        color (str): The color to render the cell as
-        ignore (bool): Should the change_state method run
-    """
-
-    def __init__(self, weight: int, color: str):
-        """Initializes an instance of the MovableSolid class
+    def __init__(self, element: type, color: str) -> None:
+        """Initializes an instance of the CellState class
 
         Args:
-            weight (int): The weight of the cell
+            element (type): The element type held. Its 'spec' describes the element
             color (str): The color of the cell
-
-        """
-
-        super().__init__(weight, color)
-
-    def change_state(self, neighbors: Neighbors, matrix: list) -> Optional[Coordinate]:
-        """Defines the behavior of a MovableSolid
-
-        A MovableSolid's behavior can be defined as:
-            - If it weighs more than the cell below it, swap states
-            - Else if it weighs more than the cells below and diagonally left and right, pick one at random to swap with
-            - Else if it weighs more than of the neighbors below and diagonally left and right, swap states
-            - Else, retain state. Return None
-
-        Args:
-            neighbors (dict[str, CellState]): A map of MooreNeighborhood variants to their respective cell's state
-        """
-
-        for i in (
-            neighbors.LOWER,
-            (neighbors.LOWER_LEFT, neighbors.LOWER_RIGHT),
-            neighbors.LOWER_LEFT,
-            neighbors.LOWER_RIGHT,
-        ):
-            if isinstance(i, tuple):
-                candidates = []
-                for n in i:
-                    if n is not None and self.weight > matrix[n.y][n.x].state.weight:
-                        candidates.append(n)
-                    if len(candidates) == 2:
-                        return candidates[randint(0, 1)]
-            elif i is not None and self.weight > matrix[i.y][i.x].state.weight:
-                return i
-
-
-class Liquid(CellState):
-    """Defines behavior for liquids
-
-    Args:
-        weight (int): The weight of the cell
-    """
-
-    def __init__(self, weight: int, color: str):
-        """Initializes an instance of the Liquid class
-
-        Args:
-            weight (int): The weight of the cell
-
-        """
-        super().__init__(weight, color)
-
-    def change_state(self, neighbors: Neighbors, matrix: list) -> Optional[Coordinate]:
-        """Defines the behavior of a Liquid
-
-        A MovableSolid's behavior can be defined as:
-            - Explore all paths we would explore with the MovableSolid
-            - Else if none of these are available, look left and right for valid candidates to move to
-            - Else, retain state. Return None
-
-        Args:
-            neighbors (dict[str, CellState]): A map of MooreNeighborhood variants to their respective cell's state
         """
+        spec = element.spec
+        self.element = element
+        self.weight = spec.weight
+        self.color = color
+        self.ignore = spec.ignore
+        self.moves = spec.moves
+        self.dispersion = spec.dispersion
 
-        for i in (
-            neighbors.LOWER,
-            (neighbors.LOWER_LEFT, neighbors.LOWER_RIGHT),
-            neighbors.LOWER_LEFT,
-            neighbors.LOWER_RIGHT,
-            (neighbors.LEFT, neighbors.RIGHT),
-            neighbors.LEFT,
-            neighbors.RIGHT,
-        ):
-            if isinstance(i, tuple):
-                candidates = []
-                for n in i:
-                    if n is not None and self.weight > matrix[n.y][n.x].state.weight:
-                        candidates.append(n)
-                    if len(candidates) == 2:
-                        return candidates[randint(0, 1)]
-            elif i is not None and self.weight > matrix[i.y][i.x].state.weight:
-                return i
+    def __repr__(self) -> str:
+        return f"CellState({self.element.__name__}, {self.color!r})"
@@ -0,0 +1,137 @@
+"""Saves and restores the state of a Simulation in a compact binary format
+
+A checkpoint file is laid out as follows, little-endian throughout:
+
+    1. A fixed header: MAGIC, the format VERSION, the width and height of the grid, the tick and the length of the
+       metadata that follows (see HEADER)
+    2. The metadata, as UTF-8 JSON: the name of each element type and the color of each palette index used by the
+       arrays, the state of the simulation's random number generator, the engine the simulation was saved from, and the
+       size and index of each chunk awake for the next step (see the 'chunks' module)
+    3. The id of each cell's element type, as a [y, x] array of uint8
+    4. The index of each cell's color, as a [y, x] array of uint16
+    5. Whether each cell is asleep, as a [y, x] array of bits packed into uint8 (see numpy.packbits)
+
+All three arrays start on an ALIGNMENT byte boundary, so they can be memory-mapped straight from the file. Element ids
+and color indices are stored as the saving process numbered them, alongside the names and colors they stand for, and
+are renumbered on load only if the loading process numbers them differently.
+
+Weights and update stamps aren't stored: weights follow from element types, and stamps are only meaningful within a
+step. Neither are dirty chunks, as no chunk is dirty between steps.
+"""
+
+from __future__ import annotations
+
+import json
+import struct
+from os import PathLike
+from typing import TYPE_CHECKING, Optional, Union
+
+import numpy as np
+
+from .colors import PALETTE, color_index
+from .grid import ELEMENT_TYPES, element_id, element_type
+
+if TYPE_CHECKING:
+    from .simulation import Simulation
+
+MAGIC = b"TFSCKPT\x00"
+VERSION = 3
+HEADER = struct.Struct("<8sIIIQI")
+ALIGNMENT = 64
+
+
+def _aligned(offset: int) -> int:
+    """Rounds an offset in the file up to the next ALIGNMENT byte boundary"""
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def save(sim: Simulation, path: Union[str, PathLike]) -> None:
+    """Writes a simulation's state to a checkpoint file
+
+    Args:
+        sim (Simulation): The simulation to save
+        path (Union[str, PathLike]): The file to write to
+    """
+    matrix = sim.matrix
+    element = np.ascontiguousarray(matrix.element_ids(), dtype=np.uint8)
+    color = np.ascontiguousarray(matrix.color_indices(), dtype=np.uint16)
+    asleep = np.packbits(matrix.asleep_cells(), axis=None)
+    ymax, xmax = element.shape
+
+    metadata = json.dumps(
+        {
+            "engine": sim.engine,
+            "elements": [e.__name__ for e in ELEMENT_TYPES],
+            "palette": PALETTE[: int(color.max(initial=0)) + 1],
+            "rng": matrix.rng.getstate(),
+            "chunk_size": matrix.chunks.size,
+            "awake": sorted(matrix.chunks.awake),
+        }
+    ).encode("utf-8")
+
+    header = HEADER.pack(MAGIC, VERSION, xmax, ymax, matrix.tick, len(metadata))
+    element_offset = _aligned(len(header) + len(metadata))
+    color_offset = _aligned(element_offset + element.nbytes)
+    asleep_offset = _aligned(color_offset + color.nbytes)
+    with open(path, "wb") as f:
+        f.write(header)
+        f.write(metadata)
+        f.write(bytes(element_offset - f.tell()))
+        f.write(memoryview(element).cast("B"))
+        f.write(bytes(color_offset - f.tell()))
+        f.write(memoryview(color).cast("B"))
+        f.write(bytes(asleep_offset - f.tell()))
+        f.write(memoryview(asleep).cast("B"))
+
+
+def load(
+    path: Union[str, PathLike],
+    engine: Optional[str] = None,
+    workers: Optional[int] = None,
+) -> Simulation:
+    """Restores a simulation from a checkpoint file
+
+    On the 'numpy', 'vector' and 'jit' engines the arrays are memory-mapped copy-on-write: nothing is read from the file
+    until it's needed, and the file itself is never modified. The random number generator, the sleeping cells and the
+    awake chunks are restored to their saved state, so on the engine it was saved from, the restored simulation steps
+    exactly as the saved one would have.
+
+    Args:
+        path (Union[str, PathLike]): The file to read from
+        engine (str): The engine to restore the simulation on. Defaults to the engine it was saved from
+        workers (int): The number of worker processes for the 'parallel' engine. Defaults to the number of CPUs
+
+    Returns:
+        The restored simulation
+    """
+    from .simulation import Simulation
+
+    with open(path, "rb") as f:
+        magic, version, xmax, ymax, tick, metadata_length = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a checkpoint file")
+        if version != VERSION:
+            raise ValueError(f"{path} is a version {version} checkpoint. Only version {VERSION} is supported")
+        metadata = json.loads(f.read(metadata_length).decode("utf-8"))
+
+    element_offset = _aligned(HEADER.size + metadata_length)
+    color_offset = _aligned(element_offset + xmax * ymax)
+    asleep_offset = _aligned(color_offset + 2 * xmax * ymax)
+    element = np.memmap(path, dtype=np.uint8, mode="c", offset=element_offset, shape=(ymax, xmax))
+    color = np.memmap(path, dtype=np.uint16, mode="c", offset=color_offset, shape=(ymax, xmax))
+    packed = np.fromfile(path, dtype=np.uint8, count=-(-xmax * ymax // 8), offset=asleep_offset)
+    asleep = np.unpackbits(packed, count=xmax * ymax).astype(bool).reshape(ymax, xmax)
+
+    element_ids = np.array([element_id(element_type(name)) for name in metadata["elements"]], dtype=np.uint8)
+    if not np.array_equal(element_ids, np.arange(len(element_ids))):
+        element = element_ids[element]
+    color_indices = np.array([color_index(c) for c in metadata["palette"]], dtype=np.uint16)
+    if not np.array_equal(color_indices, np.arange(len(color_indices))):
+        color = color_indices[color]
+
+    sim = Simulation(xmax, ymax, engine=engine or metadata["engine"], workers=workers)
+    # Chunks are only restored if they're the same size as they were when saved; otherwise they're all woken
+    awake = metadata["awake"] if metadata["chunk_size"] == sim.matrix.chunks.size else None
+    sim.matrix.restore(element, color, tick, asleep, awake)
+    sim.matrix.rng.setstate(metadata["rng"])
+    return sim
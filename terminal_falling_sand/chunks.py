@@ -0,0 +1,186 @@
+"""Hosts the ChunkTracker class, used to skip settled regions of a grid when stepping"""
+
+from typing import Iterable
+
+import numpy as np
+
+CHUNK_SIZE = 16
+
+
+class ChunkTracker:
+    """Divides a grid into fixed-size square chunks and tracks which of them need stepping
+
+    A cell can only start moving if something in its Moore neighborhood changed, so a chunk in which nothing moved
+    during the last step, and which borders no chunk in which something moved, starts this step with nothing in it able
+    to move. Moves made during the step can still carry on into it, though: cells later in the step can move into a gap
+    left by one earlier in the step, so a chain of moves can cross several chunks in one step. Engines call 'wake_near'
+    for every cell that changes on the edge of a chunk (see 'edges'), or is carried into another chunk, which wakes any
+    sleeping chunk next to it for the rest of the step. With that, skipping chunks doesn't change the outcome of a step.
+
+    Chunks are numbered row by row: the chunk at chunk-column cx and chunk-row cy has the index cy * columns + cx.
+
+    Attributes:
+        size (int): The width and height of each chunk, in cells
+        columns (int): The number of chunks across the grid
+        rows (int): The number of chunks down the grid
+        awake (set[int]): The chunks to step this step. Every chunk is awake to begin with
+        dirty (set[int]): The chunks in which a cell moved this step
+        moved (set[int]): The chunks in which a cell moved during the last step, i.e. the last 'dirty' before 'advance'
+
+    """
+
+    def __init__(self, xmax: int, ymax: int, size: int = CHUNK_SIZE) -> None:
+        """Initializes an instance of the ChunkTracker class
+
+        Args:
+            xmax (int): The width of the grid
+            ymax (int): The height of the grid
+            size (int): The width and height of each chunk. Defaults to CHUNK_SIZE
+        """
+        self.size = size
+        self.columns = -(-xmax // size)
+        self.rows = -(-ymax // size)
+        self.awake = set(range(self.columns * self.rows))
+        self.dirty: set[int] = set()
+        self.moved: set[int] = set()
+
+        self._xmax = xmax
+        self._ymax = ymax
+        self._area = []
+        self._around = []
+        # The chunks holding a cell and its neighbors, by the cell's chunk and the sides of it the cell is on (see
+        # 'wake_near'): chunk * 9 + vertical side * 3 + horizontal side
+        self._near = []
+        for cy in range(self.rows):
+            for cx in range(self.columns):
+                for sy in (-1, 0, 1):
+                    for sx in (-1, 0, 1):
+                        self._near.append(
+                            tuple(
+                                ny * self.columns + nx
+                                for ny in range(max(cy + min(sy, 0), 0), min(cy + max(sy, 0), self.rows - 1) + 1)
+                                for nx in range(max(cx + min(sx, 0), 0), min(cx + max(sx, 0), self.columns - 1) + 1)
+                            )
+                        )
+                self._area.append(
+                    (min((cx + 1) * size, xmax) - cx * size) * (min((cy + 1) * size, ymax) - cy * size)
+                )
+                self._around.append(
+                    tuple(
+                        ny * self.columns + nx
+                        for ny in range(max(cy - 1, 0), min(cy + 2, self.rows))
+                        for nx in range(max(cx - 1, 0), min(cx + 2, self.columns))
+                    )
+                )
+
+    @property
+    def awake_count(self) -> int:
+        """The number of chunks awake for this step"""
+        return len(self.awake)
+
+    @property
+    def awake_cells(self) -> int:
+        """The number of cells in the chunks awake for this step"""
+        return sum(map(self._area.__getitem__, self.awake))
+
+    def chunk(self, x: int, y: int) -> int:
+        """Returns the index of the chunk containing the cell at x/y"""
+        return (y // self.size) * self.columns + x // self.size
+
+    def bounds(self, index: int) -> tuple[int, int, int, int]:
+        """Returns the (x0, y0, x1, y1) bounds of a chunk, in cells. x1 and y1 are exclusive"""
+        cy, cx = divmod(index, self.columns)
+        x0 = cx * self.size
+        y0 = cy * self.size
+        return (x0, y0, min(x0 + self.size, self._xmax), min(y0 + self.size, self._ymax))
+
+    def mark(self, x: int, y: int) -> None:
+        """Records that the cell at x/y moved (or was moved) this step"""
+        self.dirty.add((y // self.size) * self.columns + x // self.size)
+
+    def edges(self) -> np.ndarray:
+        """Returns a [y, x] mask of the cells with a neighbor in another chunk
+
+        A cell that changes can only wake another chunk if it's one of these, or if it was carried into another chunk
+        (see 'wake_near'), so engines only need to call 'wake_near' for those.
+        """
+
+        def crossing(n: np.ndarray, count: int) -> np.ndarray:
+            return ((n % self.size == 0) & (n > 0)) | ((n % self.size == self.size - 1) & (n < count - 1))
+
+        return crossing(np.arange(self._ymax), self._ymax)[:, None] | crossing(np.arange(self._xmax), self._xmax)
+
+    def wake_near(self, x: int, y: int) -> bool:
+        """Wakes the chunks holding the cell at x/y and its neighbors for the rest of this step, after the cell changed
+
+        Returns:
+            Whether any of those chunks was asleep
+        """
+        size = self.size
+        cx, rx = divmod(x, size)
+        cy, ry = divmod(y, size)
+        # Which side of its chunk the cell is on, along each axis: 0 for the first row or column, 2 for the last
+        side_y = (ry == size - 1) - (ry == 0) + 1
+        side_x = (rx == size - 1) - (rx == 0) + 1
+        near = self._near[(cy * self.columns + cx) * 9 + side_y * 3 + side_x]
+        awake = self.awake
+        if awake.issuperset(near):
+            return False
+        awake.update(near)
+        return True
+
+    def awake_around(self, indices: Iterable[int]) -> bool:
+        """Returns whether every chunk bordering the given chunks (or among them) is awake
+
+        If so, no change to a cell in those chunks can wake another chunk.
+        """
+        awake = self.awake
+        around = self._around
+        return all(awake.issuperset(around[index]) for index in indices)
+
+    def wake(self, x: int, y: int) -> None:
+        """Wakes the chunk containing the cell at x/y, and its neighbors, for the next step
+
+        Used when a cell is changed outside of a step, e.g. when an element is spawned.
+        """
+        self.awake.update(self._around[(y // self.size) * self.columns + x // self.size])
+
+    def wake_cells(self, xs: np.ndarray, ys: np.ndarray) -> None:
+        """Wakes the chunks containing the cells at many x/y coordinates, and their neighbors, for the next step
+
+        Used when many cells are changed at once, e.g. when an element is spawned into a region.
+
+        Args:
+            xs (np.ndarray): The column of each cell
+            ys (np.ndarray): The row of each cell
+        """
+        changed = np.zeros(self.columns * self.rows, dtype=bool)
+        changed[(ys // self.size) * self.columns + xs // self.size] = True
+        around = self._around
+        awake = self.awake
+        for index in np.flatnonzero(changed).tolist():
+            awake.update(around[index])
+
+    def wake_all(self) -> None:
+        """Wakes every chunk for the next step, e.g. after every cell in the grid was replaced"""
+        self.awake = set(range(self.columns * self.rows))
+        self.dirty = set()
+
+    def restore(self, awake: Iterable[int]) -> None:
+        """Sets which chunks are awake for the next step, e.g. when loading a checkpoint (see the 'checkpoint' module)
+
+        Args:
+            awake (Iterable[int]): The index of each chunk to wake. Every other chunk is put to sleep
+        """
+        self.awake = set(awake)
+        self.dirty = set()
+
+    def advance(self) -> None:
+        """Moves on to the next step: wakes every dirty chunk and its neighbors, and puts every other chunk to sleep"""
+        awake = set()
+        around = self._around
+        for index in self.dirty:
+            awake.update(around[index])
+        self.awake = awake
+        self.moved = self.dirty
+        self.dirty = set()
@@ -1,4 +1,12 @@
-"""Common colors used for cells"""
+"""Common colors used for cells
+
+Also hosts the PALETTE, which assigns every color used in a simulation an index. Engines that store cells in arrays, and
+renderers that compare frames, work with these indices rather than color strings. The colors defined here are assigned
+the first BUILTIN_COLORS indices up front; any other color is added the first time it's looked up.
+
+Colors are never removed from the PALETTE, since cells anywhere may still hold their indices, so it grows with every
+distinct color a process uses. It's capped at MAX_COLORS, the most a uint16 index can tell apart.
+"""
 
 SAND_COLORS = [
     "#f8f5f1",
@@ -63,5 +71,38 @@ SAND_COLORS = [
     "#050402",
 ]
 
+EMPTY_COLOR = "black"
+GLASS_COLOR = "#a7c7cb"
+
 WATER_COLORS = ["#44ddff", "#44bbff"]
 ROCK_COLORS = ["#8c837d", "#645b55", "#4d4740"]
+
+MAX_COLORS = 2**16
+
+PALETTE: list[str] = []
+
+_color_ids: dict[str, int] = {}
+
+
+def color_index(color: str) -> int:
+    """Returns the index of a color in the PALETTE, adding it if it hasn't been seen before
+
+    Args:
+        color (str): The color to look up. Hex or standard color names are acceptable here
+
+    Raises:
+        ValueError: If the color is new and the PALETTE already holds MAX_COLORS colors
+    """
+    index = _color_ids.get(color)
+    if index is None:
+        if len(PALETTE) == MAX_COLORS:
+            raise ValueError(f"The palette is full: at most {MAX_COLORS} distinct colors can be used")
+        index = _color_ids[color] = len(PALETTE)
+        PALETTE.append(color)
+    return index
+
+
+for _color in (EMPTY_COLOR, GLASS_COLOR, *SAND_COLORS, *WATER_COLORS, *ROCK_COLORS):
+    color_index(_color)
+
+BUILTIN_COLORS = len(PALETTE)
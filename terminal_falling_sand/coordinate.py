@@ -8,6 +8,7 @@ from __future__ import annotations
 from collections import namedtuple
 from dataclasses import dataclass
 from enum import Enum
+from functools import lru_cache
 
 
 @dataclass(eq=True, order=True, frozen=True, slots=True)
@@ -36,3 +37,36 @@ class MooreNeighborhood(Enum):
 
 
 Neighbors = namedtuple("Neighbors", [member.name for member in MooreNeighborhood])
+
+
+@lru_cache(maxsize=4)
+def neighbor_table(max_coord: Coordinate) -> list[list[Neighbors]]:
+    """Returns the Neighbors of every coordinate in a grid, indexed [y][x]
+
+    The table is built once per grid shape and shared by every cell in grids of that shape, including cells created
+    later on by spawning. Neighbors outside the grid are None. Each coordinate in the grid is a single Coordinate
+    instance, referenced from the Neighbors of each of the cells around it.
+
+    Args:
+        max_coord (Coordinate): The maximum valid coordinate in the grid
+    """
+    width = max_coord.x + 1
+    height = max_coord.y + 1
+    coords = [[Coordinate(x, y) for x in range(width)] for y in range(height)]
+    offsets = [(member.value.x, member.value.y) for member in MooreNeighborhood]
+
+    table = []
+    for y in range(height):
+        row = []
+        for x in range(width):
+            neighbors = []
+            for dx, dy in offsets:
+                nx = x + dx
+                ny = y + dy
+                if 0 <= nx < width and 0 <= ny < height:
+                    neighbors.append(coords[ny][nx])
+                else:
+                    neighbors.append(None)
+            row.append(Neighbors._make(neighbors))
+        table.append(row)
+    return table
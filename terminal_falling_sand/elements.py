@@ -1,162 +1,246 @@
 """This module defines elements used directly by the CellMatrix simulation
 
-The elements found in this module are derived from the Cell class. The CellMatrix simulation should consist only of
-elements from this module
+Every element type is defined once, as data: an ElementSpec registered with 'register', which gives the type an id and
+builds its Element class. Engines look elements up by id in ELEMENT_TYPES, so a new element only needs registering:
+
+    Lava = register("Lava", weight=1.5, behavior="liquid", colors=["#cf1020", "#e25822"], dispersion=2)
+
+The CellMatrix simulation should consist only of elements registered this way
 """
 
+import sys
+from dataclasses import dataclass, replace
 from random import randint
+from typing import TYPE_CHECKING, Optional, Sequence, Type, Union
 
-from . import cell_state
 from .cell import Cell
-from .cell_state import CellState
-from .colors import ROCK_COLORS, SAND_COLORS, WATER_COLORS
-from .coordinate import Coordinate
-
-
-class Element(Cell):
-    """Base class for an element
+from .cell_state import BEHAVIORS, CellState, compile_probes
+from .colors import EMPTY_COLOR, GLASS_COLOR, ROCK_COLORS, SAND_COLORS, WATER_COLORS
+from .coordinate import Coordinate, MooreNeighborhood
 
-    Attributes:
-        state (CellState): The state a cell is in
+if TYPE_CHECKING:
+    from .rng import BulkRandom
 
-    """
+MAX_ELEMENT_TYPES = 256
 
-    def __init__(
-        self, coord: Coordinate, max_coord: Coordinate, state: CellState
-    ) -> None:
-        """Initializes an instance of the Element class
 
-        Args:
-            coord (Coordinate): The coordinate of the cell
-            max_coord (Coordinate): The maximum possible coordinate for a cell. Used to identify valid neighbors
-            state (CellState): The CellState we should defer to for a cell's behavior
-
-        """
-        super().__init__(coord, max_coord, state)
-
-
-class ElementType:
-    """Reserved for type hinting Element types in the CellMatrix class from the cell_matrix module"""
-
-    def __init__(self, *args, **kwargs):
-        """Initializes an instance of the ElementType class"""
-        pass
-
-
-class Empty(Element, ElementType):
-    """An Empty element
+@dataclass(frozen=True, slots=True)
+class ElementSpec:
+    """Everything that defines an element type
 
     Attributes:
-        state (CellState): The state a cell is in
-
+        name (str): The name of the element, which is also the name of its class
+        id (int): The element's index in ELEMENT_TYPES. Engines store this per cell rather than the element itself
+        weight (Union[float, int]): A cell only moves into a neighbor it weighs more than
+        behavior (str): How cells of the element move, one of cell_state.BEHAVIORS
+        colors (tuple[str, ...]): The colors a cell of the element can be rendered as
+        ignore (bool): Whether cells of the element never move
+        moves (tuple[tuple[int, ...], ...]): The behavior's probes as indices into a Neighbors tuple, for the CellMatrix
+        offsets (tuple[tuple[tuple[int, int], ...], ...]): The behavior's probes as (dx, dy) offsets, for the CellGrid
+        dispersion (int): How many cells along its row a cell of the element travels when it moves sideways
     """
 
-    def __init__(self, coord: Coordinate, max_coord: Coordinate):
-        """Initializes an instance of the Empty class
-
-        - An Empty cell's color is set to "black" (the background of the terminal)
+    name: str
+    id: int
+    weight: Union[float, int]
+    behavior: str
+    colors: tuple[str, ...]
+    ignore: bool
+    moves: tuple[tuple[int, ...], ...]
+    offsets: tuple[tuple[tuple[int, int], ...], ...]
+    dispersion: int = 1
 
-        Args:
-            coord (Coordinate): The coordinate of the cell
-            max_coord (Coordinate): The maximum possible coordinate for a cell. Used to identify valid neighbors
-
-        """
-
-        state = cell_state.Empty(weight=0, color="black")
-        super().__init__(coord, max_coord, state)
 
+class Element(Cell):
+    """Base class for an element
 
-class Rock(Element, ElementType):
-    """A Sand element
+    The class attributes describe the element independently of any cell, so engines that don't build Cell instances
+    (see the 'grid' module) can spawn it too. Subclasses are built by 'register' rather than written by hand.
 
     Attributes:
         state (CellState): The state a cell is in
+        spec (ElementSpec): The element's definition
+        id (int): The element's index in ELEMENT_TYPES
+        weight (Union[float, int]): The weight of the element
+        colors (list[str]): The colors a cell of this element can be rendered as
 
     """
 
-    def __init__(self, coord: Coordinate, max_coord: Coordinate):
-        """Initializes an instance of the Sand class
-
-        - A Rock cell's color is set to one of those found among the ROCK_COLORS dict
+    __slots__ = ()
 
-        Args:
-            coord (Coordinate): The coordinate of the cell
-            max_coord (Coordinate): The maximum possible coordinate for a cell. Used to identify valid neighbors
-
-        """
+    spec: ElementSpec
+    id: int
+    weight: Union[float, int] = 0
+    colors: list[str] = [EMPTY_COLOR]
+    _states: dict[str, CellState]
 
-        color = ROCK_COLORS[randint(0, len(ROCK_COLORS) - 1)]
-        state = cell_state.Solid(weight=3, color=color)
-        super().__init__(coord, max_coord, state)
+    @classmethod
+    def pick_color(cls, rng: "BulkRandom") -> str:
+        """Picks a color for a new cell of this element, the way its constructor would if not given one
 
+        Matrices spawn cells with a color picked by their own BulkRandom, so the same seed picks the same colors.
 
-class Sand(Element, ElementType):
-    """A Sand element
+        Args:
+            rng (BulkRandom): The random number generator to pick with
+        """
+        return rng.choice(cls.colors)
 
-    Attributes:
-        state (CellState): The state a cell is in
+    @classmethod
+    def shared_state(cls, color: str) -> CellState:
+        """Returns the state of a cell of this element in the given color, shared by every such cell
 
-    """
-
-    def __init__(self, coord: Coordinate, max_coord: Coordinate):
-        """Initializes an instance of the Sand class
+        Args:
+            color (str): The color of the cell
+        """
+        state = cls._states.get(color)
+        if state is None:
+            state = cls._states[color] = CellState(cls, color)
+        return state
 
-        - A Sand cell's color is set to one of those found among the SAND_COLORS dict
+    def __init__(self, coord: Coordinate, max_coord: Coordinate, color: Optional[str] = None) -> None:
+        """Initializes an instance of the Element class
 
         Args:
             coord (Coordinate): The coordinate of the cell
             max_coord (Coordinate): The maximum possible coordinate for a cell. Used to identify valid neighbors
+            color (str): The color of the cell. Defaults to a random one of the element's colors
 
         """
+        if color is None:
+            color = self.colors[0] if len(self.colors) == 1 else self.colors[randint(0, len(self.colors) - 1)]
+        super().__init__(coord, max_coord, self.shared_state(color))
 
-        color = SAND_COLORS[randint(0, len(SAND_COLORS) - 1)]
-        state = cell_state.MovableSolid(weight=2, color=color)
-        super().__init__(coord, max_coord, state)
 
+class ElementType:
+    """Reserved for type hinting Element types in the CellMatrix class from the cell_matrix module"""
 
-class Water(Element, ElementType):
-    """A Water element
+    __slots__ = ()
+
+    def __init__(self, *args, **kwargs):
+        """Initializes an instance of the ElementType class"""
+        pass
 
-    Attributes:
-        state (CellState): The state a cell is in
 
+ELEMENT_TYPES: list[Type[ElementType]] = []
+ELEMENT_PROBES: list[tuple] = []
+ELEMENT_DISPERSION: list[int] = []
+
+
+def register(
+    name: str,
+    weight: Union[float, int],
+    behavior: str,
+    colors: Sequence[str],
+    doc: Optional[str] = None,
+    dispersion: int = 1,
+) -> Type[ElementType]:
+    """Defines a new element type
+
+    A cell that moves sideways (into the neighbor to its left or right) keeps going the same way, up to 'dispersion'
+    cells in all, until the next cell along isn't lighter than it. Liquids with a dispersion above 1 level out in far
+    fewer steps.
+
+    Args:
+        name (str): The name of the element. Must be unique
+        weight (Union[float, int]): A cell only moves into a neighbor it weighs more than
+        behavior (str): How cells of the element move, one of cell_state.BEHAVIORS
+        colors (Sequence[str]): The colors a cell of the element can be rendered as. Spawned cells pick one at random
+        doc (str): The docstring of the element's class. Defaults to none
+        dispersion (int): The furthest a cell of the element travels along its row in one step. Defaults to 1, a
+                          single neighbor
+
+    Returns:
+        The element's class, an 'ElementType' type
     """
+    if behavior not in BEHAVIORS:
+        raise ValueError(f"Unknown behavior {behavior!r}. Expected one of {tuple(BEHAVIORS)}")
+    if any(e.__name__ == name for e in ELEMENT_TYPES):
+        raise ValueError(f"An element named {name!r} is already registered")
+    if len(ELEMENT_TYPES) == MAX_ELEMENT_TYPES:
+        raise ValueError(f"At most {MAX_ELEMENT_TYPES} element types can be registered")
+    if not colors:
+        raise ValueError("An element needs at least one color")
+    if dispersion < 1:
+        raise ValueError(f"An element's dispersion must be at least 1, not {dispersion}")
+
+    probes = BEHAVIORS[behavior]
+    moves = compile_probes(probes)
+    directions = list(MooreNeighborhood)
+    offsets = tuple(tuple((directions[i].value.x, directions[i].value.y) for i in move) for move in moves)
+    spec = ElementSpec(
+        name, len(ELEMENT_TYPES), weight, behavior, tuple(colors), not probes, moves, offsets, dispersion
+    )
+
+    element = type(
+        name,
+        (Element, ElementType),
+        {
+            "__slots__": (),
+            "__doc__": doc,
+            "__module__": sys._getframe(1).f_globals.get("__name__", __name__),
+            "spec": spec,
+            "id": spec.id,
+            "weight": weight,
+            "colors": list(colors),
+            "_states": {},
+        },
+    )
+    ELEMENT_TYPES.append(element)
+    ELEMENT_PROBES.append(offsets)
+    ELEMENT_DISPERSION.append(dispersion)
+    return element
+
+
+def set_weight(element: Type[ElementType], weight: Union[float, int]) -> None:
+    """Changes the weight of a registered element type, e.g. to try out variations of it (see the 'sweep' module)
+
+    Only cells spawned afterwards, or restored from a checkpoint, take on the new weight: cells already in a matrix keep
+    the weight they were spawned with.
+
+    Args:
+        element (Type[ElementType]): The element type, as returned by 'register'
+        weight (Union[float, int]): Its new weight
+    """
+    element.spec = replace(element.spec, weight=weight)
+    element.weight = weight
+    element._states = {}
 
-    def __init__(self, coord: Coordinate, max_coord: Coordinate):
-        """Initializes an instance of the Water class
 
-        - A Water cell's color is set to one of those found among the WATER_COLORS dict
+def set_dispersion(element: Type[ElementType], dispersion: int) -> None:
+    """Changes how far a registered element type travels along its row in one step (see 'register')
 
-        Args:
-            coord (Coordinate): The coordinate of the cell
-            max_coord (Coordinate): The maximum possible coordinate for a cell. Used to identify valid neighbors
+    Used by 'tfs --dispersion' to let liquids level out faster, e.g. 'tfs --dispersion Water=5'. Engines other than
+    'list' look dispersion up every step, so cells already in their grids take it on too. On the 'list' engine only
+    cells spawned afterwards, or restored from a checkpoint, do.
 
-        """
+    Args:
+        element (Type[ElementType]): The element type, as returned by 'register'
+        dispersion (int): The furthest a cell of the element travels along its row in one step, at least 1
+    """
+    if dispersion < 1:
+        raise ValueError(f"An element's dispersion must be at least 1, not {dispersion}")
+    element.spec = replace(element.spec, dispersion=dispersion)
+    element._states = {}
+    ELEMENT_DISPERSION[element.id] = dispersion
 
-        color = WATER_COLORS[randint(0, len(WATER_COLORS) - 1)]
-        state = cell_state.Liquid(weight=1, color=color)
-        super().__init__(coord, max_coord, state)
 
+def prober_offsets(element_probes: list[tuple]) -> tuple[tuple[int, int], ...]:
+    """Returns where the cells that might probe a cell lie, relative to it
 
-class Glass(Element, ElementType):
-    """A Glass element
+    A cell that failed to move can only move once a neighbor it probes gets lighter, so these are the cells to wake
+    when a cell gets lighter (see CellMatrix.step).
 
-    Attributes:
-        state (CellState): The state a cell is in
+    Args:
+        element_probes (list[tuple]): The compiled probes of each element type, as found in ELEMENT_PROBES
 
+    Returns:
+        The (dx, dy) offset of each cell, in a fixed order
     """
+    return tuple(sorted({(-dx, -dy) for probes in element_probes for probe in probes for dx, dy in probe}))
 
-    def __init__(self, coord: Coordinate, max_coord: Coordinate):
-        """Initializes an instance of the Water class
-
-        - A Water cell's color is set to one of those found among the WATER_COLORS dict
-
-        Args:
-            coord (Coordinate): The coordinate of the cell
-            max_coord (Coordinate): The maximum possible coordinate for a cell. Used to identify valid neighbors
-
-        """
 
-        color = "#a7c7cb"
-        state = cell_state.ImmovableSolid(color)
-        super().__init__(coord, max_coord, state)
+Empty = register("Empty", 0, "static", [EMPTY_COLOR], "An Empty element, rendered as the background of the terminal")
+Rock = register("Rock", 3, "solid", ROCK_COLORS, "A Rock element, which falls straight down")
+Sand = register("Sand", 2, "movable_solid", SAND_COLORS, "A Sand element, which falls and piles up")
+Water = register("Water", 1, "liquid", WATER_COLORS, "A Water element, which falls and spreads out")
+Glass = register("Glass", float("inf"), "static", [GLASS_COLOR], "A Glass element, which never moves")
@@ -0,0 +1,203 @@
+"""Exports a running simulation (or a recording being played back) as a stream of images, e.g. to make a video
+
+Frames are built straight from the matrix's color indices, one pixel per cell (or a 'scale' x 'scale' block of pixels),
+without going through the terminal. Each frame is written in one of the FORMATS:
+
+    - 'rgb': raw 8-bit RGB, row by row, with no header. Frames follow one another with nothing in between
+    - 'ppm': a binary PPM (P6) image, i.e. the same pixels after a short text header
+    - 'png': a PNG image, compressed with zlib at the given level
+
+Frames go to a single file (or '-', standard output), one after another, or to a directory as one numbered file each. A
+stream of frames can be piped into a video encoder, e.g.:
+
+    tfs --no-render --refresh-rate 0 --duration 1000 --export - | ffmpeg -f image2pipe -c:v ppm -i - out.mp4
+
+The image buffers are allocated once and reused for every frame, so exporting a frame costs a palette lookup, a copy
+when scaling, and a write.
+
+If whatever reads the stream goes away early (e.g. 'tfs --export - | head -c 1000'), exporting stops quietly and the run
+carries on without it.
+"""
+
+import os
+import struct
+import sys
+import zlib
+from os import PathLike
+from typing import BinaryIO, Callable, Optional, Union
+
+import numpy as np
+from rich.color import Color
+
+from .colors import PALETTE
+
+FORMATS = ("rgb", "ppm", "png")
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+
+def _png_chunk(kind: bytes, data: bytes) -> bytes:
+    """Returns a PNG chunk: its length, type, data and CRC"""
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+
+class FrameExporter:
+    """Writes a matrix's frames as images as it steps
+
+    Use as a context manager: entering opens the output and writes a frame of the matrix as it is, exiting closes it.
+
+    Attributes:
+        matrix (Union[CellMatrix, CellGrid, Replay]): What's being exported. Anything with a 'max_coord' and a
+                                                      'color_indices' method
+        target (Union[str, PathLike]): Where frames are written: a file, '-' for standard output, or a directory
+        format (str): How frames are encoded, one of FORMATS
+        every (int): A frame is written every this many steps
+        scale (int): The width and height of the block of pixels each cell is drawn as
+        level (int): The zlib compression level of 'png' frames
+        frames (int): The number of frames written so far
+        closed (bool): Whether the reader of a streamed export went away, after which no more frames are written
+
+    """
+
+    def __init__(
+        self,
+        matrix,
+        target: Union[str, PathLike],
+        format: str = "ppm",
+        every: int = 1,
+        scale: int = 1,
+        level: int = 1,
+    ) -> None:
+        """Initializes an instance of the FrameExporter class
+
+        Args:
+            matrix (Union[CellMatrix, CellGrid, Replay]): What to export
+            target (Union[str, PathLike]): Where to write frames. An existing directory gets one file per frame, named
+                                           after the frame's number. Anything else is a file frames are streamed to,
+                                           overwritten if it exists, or standard output if '-'
+            format (str): How to encode frames, one of FORMATS. Defaults to 'ppm'
+            every (int): Writes a frame every this many steps. Defaults to 1, every step
+            scale (int): Draws each cell as a block of this many pixels across. Defaults to 1
+            level (int): The zlib compression level of 'png' frames. Defaults to 1, the fastest
+        """
+        if format not in FORMATS:
+            raise ValueError(f"Unknown format {format!r}. Expected one of {FORMATS}")
+        if every < 1:
+            raise ValueError("every must be at least 1")
+        if scale < 1:
+            raise ValueError("scale must be at least 1")
+        self.matrix = matrix
+        self.target = target
+        self.format = format
+        self.every = every
+        self.scale = scale
+        self.level = level
+        self.frames = 0
+        self.closed = False
+
+        self._file: Optional[BinaryIO] = None
+        self._directory = target != "-" and os.path.isdir(target)
+        self._steps = 0
+        # The RGB of each color in colors.PALETTE, repeated 'scale' times. Extended as colors are added to the palette
+        self._lut = np.zeros((0, 3 * scale), dtype=np.uint8)
+        self._image: Optional[np.ndarray] = None
+        self._blocks: Optional[np.ndarray] = None
+        self._header = b""
+
+    def __enter__(self) -> "FrameExporter":
+        max_coord = self.matrix.max_coord
+        width = max_coord.x + 1
+        height = max_coord.y + 1
+        scale = self.scale
+
+        # PNG rows each start with a filter type byte (0, none), so the pixels sit in a view past the first column. The
+        # view is split into blocks: a row of cells, drawn as 'scale' rows of pixels, each cell 'scale' pixels wide
+        pad = 1 if self.format == "png" else 0
+        self._image = np.zeros((height * scale, pad + width * scale * 3), dtype=np.uint8)
+        self._blocks = self._image[:, pad:].view()
+        self._blocks.shape = (height, scale, width, scale * 3)
+
+        if self.format == "ppm":
+            self._header = f"P6\n{width * scale} {height * scale}\n255\n".encode("ascii")
+        elif self.format == "png":
+            ihdr = struct.pack(">IIBBBBB", width * scale, height * scale, 8, 2, 0, 0, 0)
+            self._header = PNG_SIGNATURE + _png_chunk(b"IHDR", ihdr)
+
+        if not self._directory:
+            self._file = sys.stdout.buffer if self.target == "-" else open(self.target, "wb")
+        self._steps = 0
+        self.write()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        if self._file is not None:
+            try:
+                if self._file is sys.stdout.buffer:
+                    self._file.flush()
+                else:
+                    self._file.close()
+            except BrokenPipeError:
+                self._close_broken()
+            self._file = None
+
+    def _close_broken(self) -> None:
+        """Stops exporting once the reader of the stream has gone away
+
+        Standard output is pointed at os.devnull, so nothing left in its buffer fails to flush when Python exits.
+        """
+        self.closed = True
+        if self._file is sys.stdout.buffer:
+            devnull = os.open(os.devnull, os.O_WRONLY)
+            os.dup2(devnull, sys.stdout.fileno())
+            os.close(devnull)
+        else:
+            try:
+                self._file.close()
+            except BrokenPipeError:
+                pass
+        self._file = None
+
+    def step(self, step: Callable[[], None]) -> None:
+        """Steps the matrix with 'step', then writes a frame if one is due
+
+        Args:
+            step (Callable[[], None]): Steps the matrix forward once
+        """
+        step()
+        self._steps += 1
+        if self._steps % self.every == 0:
+            self.write()
+
+    def write(self) -> None:
+        """Writes a frame of the matrix as it is now, unless the export is closed"""
+        if self.closed:
+            return
+        colors = self.matrix.color_indices()
+        if len(self._lut) < len(PALETTE):
+            added = np.array([Color.parse(color).get_truecolor() for color in PALETTE[len(self._lut) :]], np.uint8)
+            self._lut = np.concatenate([self._lut, np.tile(added, (1, self.scale))])
+
+        # Looking up a whole row of a block per color draws the first row of pixels of each row of cells, which is then
+        # copied down. Much faster than repeating each pixel
+        blocks = self._blocks
+        np.take(self._lut, colors, axis=0, out=blocks[:, 0], mode="clip")
+        if self.scale > 1:
+            blocks[:, 1:] = blocks[:, :1]
+
+        if self.format == "png":
+            idat = zlib.compress(self._image.data, self.level)
+            data = (self._header, _png_chunk(b"IDAT", idat), _png_chunk(b"IEND", b""))
+        else:
+            data = (self._header, self._image.data)
+
+        if self._directory:
+            path = os.path.join(self.target, f"frame_{self.frames:06d}.{self.format}")
+            with open(path, "wb") as f:
+                f.writelines(data)
+        else:
+            try:
+                self._file.writelines(data)
+            except BrokenPipeError:
+                self._close_broken()
+                return
+        self.frames += 1
@@ -0,0 +1,601 @@
+"""Hosts the CellGrid class, a NumPy array-backed alternative to the CellMatrix
+
+Rather than a Cell object per cell, a CellGrid stores each cell's element id, weight, color index and update stamp in
+typed NumPy arrays: 10 bytes a cell. Behavior is read from ELEMENT_PROBES, the compiled probes of each registered element
+(see elements.register), and cells are visited in the same order as a CellMatrix, so both step through identical
+worlds.
+"""
+
+from typing import Iterable, Optional, Type
+
+import numpy as np
+from rich.console import Console, ConsoleOptions, RenderResult
+
+from .chunks import ChunkTracker
+from .colors import color_index
+from .coordinate import Coordinate, MooreNeighborhood
+from .elements import ELEMENT_DISPERSION, ELEMENT_PROBES, ELEMENT_TYPES, ElementType, prober_offsets
+from .matrix import scan_order
+from .palette import RICH_PALETTE
+from .regions import around
+from .rng import BulkRandom
+
+
+def element_id(element: Type[ElementType]) -> int:
+    """Returns the id of an element type: its index in ELEMENT_TYPES. See elements.register
+
+    Args:
+        element (ElementType): An 'ElementType' type
+    """
+    return element.id
+
+
+def element_type(name: str) -> Type[ElementType]:
+    """Returns the registered element type with the given name
+
+    Used to resolve the element names stored in files (see the 'checkpoint' and 'recording' modules).
+
+    Args:
+        name (str): The name of an 'ElementType' type
+    """
+    for element in ELEMENT_TYPES:
+        if element.__name__ == name:
+            return element
+    raise ValueError(f"Unknown element type {name!r}")
+
+
+class CellGrid:
+    """A grid of cells backed by typed NumPy arrays
+
+    Every array is indexed [y, x]. A freshly initialized grid is all zeros, which is an Empty cell: element id 0, weight 0
+    and color index 0 ('black').
+
+    Attributes:
+        max_coord (Coordinate): The maximum valid coordinate found in the grid
+        midpoint (int): The midpoint of the grid
+        scan_order (list[int]): The order columns are visited in for each row when stepping
+        element (np.ndarray): The id of each cell's element type. See ELEMENT_TYPES
+        weight (np.ndarray): The weight of each cell
+        color (np.ndarray): The index of each cell's color. See colors.PALETTE
+        updated (np.ndarray): The stamp of the tick each cell was last updated in (see '_advance_tick')
+        asleep (np.ndarray): Whether each cell failed to move when last visited, and nothing it probes got lighter since
+        chunks (ChunkTracker): Tracks which chunks of the grid need stepping
+        tick (int): The number of steps taken. Cells are stamped with it wrapped to fit 'updated' (see '_advance_tick')
+        rng (BulkRandom): Breaks ties between two valid neighbors and picks the colors of spawned cells
+        counters (StepCounters): What to count while stepping, if anything. None (the default) counts nothing. See the
+                                 'metrics' module
+
+    """
+
+    def __init__(self, xmax: int, ymax: int, seed: Optional[int] = None) -> None:
+        """Initializes a CellGrid instance
+
+        Generates a new grid full of 'Empty' elements
+
+        Args:
+            xmax (int): The maximum x value in the grid
+            ymax (int): The maximum y value in the grid
+            seed (int): The seed for the grid's random number generator. Defaults to None, which seeds from the OS
+
+        """
+        self.max_coord = Coordinate(xmax - 1, ymax - 1)
+        self.midpoint = self.max_coord.x // 2
+        if self.midpoint % 2 == 1:
+            self.midpoint += 1
+        self.scan_order = scan_order(xmax)
+
+        self.element = np.zeros((ymax, xmax), dtype=np.uint8)
+        self.weight = np.zeros((ymax, xmax), dtype=np.float32)
+        self.color = np.zeros((ymax, xmax), dtype=np.uint16)
+        self.updated = np.zeros((ymax, xmax), dtype=np.uint16)
+        self.asleep = np.zeros((ymax, xmax), dtype=bool)
+        self.chunks = ChunkTracker(xmax, ymax)
+        self.tick = 0
+        self.rng = BulkRandom(seed)
+        self.counters = None
+
+        self._order = np.array(self.scan_order, dtype=np.intp)
+        self._scan_chunks = self._order // self.chunks.size
+        self._visit = np.arange(ymax, dtype=np.intp)[:, None] * xmax + self._order
+        self._edges = self.chunks.edges()
+
+    def _awake_chunks(self) -> np.ndarray:
+        """Returns a [cy, cx] mask of the chunks awake for this step"""
+        chunks = self.chunks
+        awake = np.zeros(chunks.rows * chunks.columns, dtype=bool)
+        awake[list(chunks.awake)] = True
+        return awake.reshape(chunks.rows, chunks.columns)
+
+    def _awake_cells(self, awake: np.ndarray, x0: int = 0, x1: Optional[int] = None) -> np.ndarray:
+        """Returns the flat index of every cell in an awake chunk, in the order CellMatrix.step would visit them
+
+        Args:
+            awake (np.ndarray): A [cy, cx] mask of the chunks awake for this step
+            x0 (int): Only include cells in this column or to the right of it. Defaults to 0
+            x1 (int): Only include cells to the left of this column. Defaults to the width of the grid
+        """
+        chunks = self.chunks
+        in_range = (self._order >= x0) & (self._order < (self.max_coord.x + 1 if x1 is None else x1))
+        visit = []
+        for cy in np.flatnonzero(awake.any(axis=1))[::-1].tolist():
+            columns = awake[cy][self._scan_chunks] & in_range
+            rows = self._visit[cy * chunks.size : (cy + 1) * chunks.size]
+            visit.append(rows[::-1, columns].ravel())
+        return np.concatenate(visit) if visit else np.empty(0, dtype=np.intp)
+
+    def _revisit(
+        self, visit: np.ndarray, i: int, awake: np.ndarray, x0: int = 0, x1: Optional[int] = None
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Returns the cells left to visit after cell 'i', once a chunk woke up partway through a step
+
+        Args:
+            visit (np.ndarray): The flat index of each cell that was to be visited, in order, 'i' among them
+            i (int): The flat index of the cell just visited
+            awake (np.ndarray): A [cy, cx] mask of the chunks awake now
+            x0 (int): The first column 'visit' was limited to. Defaults to 0
+            x1 (int): The column after the last 'visit' was limited to. Defaults to the width of the grid
+
+        Returns:
+            The cells after 'i' in 'visit', and the cells after 'i' in every chunk awake now, both in order
+        """
+        rebuilt = self._awake_cells(awake, x0, x1)
+        return (visit[int(np.flatnonzero(visit == i)[0]) + 1 :], rebuilt[int(np.flatnonzero(rebuilt == i)[0]) + 1 :])
+
+    def _advance_tick(self) -> int:
+        """Moves on to the next tick and returns the stamp to mark cells updated during it with
+
+        A cell was updated this step if its 'updated' stamp equals the step's stamp, so nothing is cleared between
+        steps. The stamp is the tick wrapped into 1-65535, as 'updated' holds uint16s (0 is never a stamp, so a cleared
+        array marks nothing as updated). Only when the stamp wraps around is the whole array cleared, once every 65535
+        steps. 'tick' itself keeps counting, as CellMatrix.tick does.
+        """
+        self.tick += 1
+        stamp = (self.tick - 1) % np.iinfo(self.updated.dtype).max + 1
+        if stamp == 1:
+            self.updated.fill(0)
+        return stamp
+
+    def step(self) -> None:
+        """Steps every cell in the grid forward once
+
+        Mirrors CellMatrix.step: rows of awake chunks are visited bottom to top, columns in 'scan_order', and a cell that
+        already moved (or was moved) this step is skipped. Cells whose element has no probes (Empty, Glass) can
+        never move, so they're filtered out up front rather than visited.
+
+        """
+        tick = self._advance_tick()
+        self._step_cells(
+            self._awake_cells(self._awake_chunks()), tick, ELEMENT_PROBES, ELEMENT_DISPERSION, self.chunks.dirty
+        )
+        self.chunks.advance()
+
+    def _step_cells(
+        self,
+        visit: np.ndarray,
+        tick: int,
+        element_probes: list[tuple],
+        element_dispersion: list[int],
+        dirty: set[int],
+        x0: int = 0,
+        x1: Optional[int] = None,
+    ) -> None:
+        """Steps the given cells forward, in order
+
+        The arrays are read and written through flat memoryviews in the loop, since indexing a memoryview is much
+        cheaper than indexing a NumPy array one item at a time.
+
+        Cells are put to sleep and woken the same way CellMatrix.step does. Whether a cell is asleep is checked when
+        it's reached rather than up front, so a cell woken earlier in the same step is still visited. Chunks are woken
+        the same way too: when a move wakes a chunk, the cells left to visit are rebuilt to take its cells in.
+
+        Args:
+            visit (np.ndarray): The flat index of each cell to visit, in order: every cell in an awake chunk, between
+                                'x0' and 'x1'
+            tick (int): The current tick's stamp, see '_advance_tick'
+            element_probes (list[tuple]): The compiled probes of each element type, indexed by element id
+            element_dispersion (list[int]): The dispersion of each element type, indexed by element id
+            dirty (set[int]): The set to add the index of every chunk in which a cell moved to
+            x0 (int): The first column 'visit' is limited to. Defaults to 0
+            x1 (int): The column after the last 'visit' is limited to. Defaults to the width of the grid
+        """
+        width = self.max_coord.x + 1
+        height = self.max_coord.y + 1
+        element = self.element.reshape(-1).data
+        weight = self.weight.reshape(-1).data
+        color = self.color.reshape(-1).data
+        updated = self.updated.reshape(-1).data
+        asleep = self.asleep.reshape(-1).data
+        size = self.chunks.size
+        columns = self.chunks.columns
+        coin = self.rng.coin
+        counters = self.counters
+        wake_near = self.chunks.wake_near
+        edges = self._edges.reshape(-1).data
+
+        flat_element = self.element.reshape(-1)
+        movable = np.array([len(p) > 0 for p in element_probes])
+        cells = visit[movable[flat_element[visit]]].tolist()
+        if counters is not None:
+            counters.evaluated += len(cells)
+            swaps = counters.swaps
+        probers = prober_offsets(element_probes)
+        # Whether each row, padded with a row above and below the grid, might have a sleeping cell in it
+        sleepy = [False, *self.asleep.any(axis=1).tolist(), False]
+        while cells:
+            for i in cells:
+                if asleep[i]:
+                    if counters is not None:
+                        counters.evaluated -= 1
+                    continue
+                if updated[i] == tick:
+                    continue
+                updated[i] = tick
+
+                y, x = divmod(i, width)
+                w = weight[i]
+                e = element[i]
+                target = -1
+                for probe in element_probes[e]:
+                    candidates = []
+                    for dx, dy in probe:
+                        nx = x + dx
+                        ny = y + dy
+                        if 0 <= nx < width and 0 <= ny < height:
+                            j = ny * width + nx
+                            if w > weight[j]:
+                                candidates.append(j)
+                    if len(candidates) == len(probe):
+                        target = candidates[0] if len(candidates) == 1 else candidates[coin()]
+                        break
+
+                if target == -1:
+                    asleep[i] = True
+                    sleepy[y + 1] = True
+                    continue
+
+                reach = element_dispersion[e]
+                if reach > 1 and target // width == y:
+                    # Moving sideways: carry on along the row while the next cell is lighter, as Cell.change_state
+                    # does
+                    dx = target - i
+                    for _ in range(reach - 1):
+                        nx = target - i + x + dx
+                        if not 0 <= nx < width or w <= weight[target + dx]:
+                            break
+                        target += dx
+
+                element[i], element[target] = element[target], element[i]
+                weight[i], weight[target] = weight[target], w
+                color[i], color[target] = color[target], color[i]
+                updated[target] = tick
+                if counters is not None:
+                    swaps[element[target]] = swaps.get(element[target], 0) + 1
+
+                ty, tx = divmod(target, width)
+                source_chunk = (y // size) * columns + x // size
+                target_chunk = (ty // size) * columns + tx // size
+                dirty.add(source_chunk)
+                dirty.add(target_chunk)
+
+                # Wake the target, and whatever probes the source, as CellMatrix.step does. Only rows that might have
+                # a sleeping cell in them need looking at
+                if sleepy[y] or sleepy[y + 1] or sleepy[y + 2]:
+                    asleep[target] = False
+                    for dx, dy in probers:
+                        nx = x + dx
+                        ny = y + dy
+                        if 0 <= nx < width and 0 <= ny < height:
+                            asleep[ny * width + nx] = False
+
+                if (edges[i] or edges[target] or source_chunk != target_chunk) and (
+                    wake_near(x, y) | wake_near(tx, ty)
+                ):
+                    break
+            else:
+                break
+            # A chunk woke up: carry on with its cells taken in
+            rest, visit = self._revisit(visit, i, self._awake_chunks(), x0, x1)
+            cells = visit[movable[flat_element[visit]]].tolist()
+            if counters is not None:
+                counters.evaluated += len(cells) - int(movable[flat_element[rest]].sum())
+
+    def spawn(self, element: Type[ElementType], coord: Coordinate) -> None:
+        """Spawns an element at a given x/y coordinate
+
+        The element's color is picked by the grid's 'rng', the same way a CellMatrix picks it.
+
+        Args:
+            element (ElementType): An 'ElementType' type
+            coord (Coordinate): The coordinate to spawn the element at
+        """
+        color = element.pick_color(self.rng)
+
+        self.element[coord.y, coord.x] = element_id(element)
+        self.weight[coord.y, coord.x] = element.weight
+        self.color[coord.y, coord.x] = color_index(color)
+        self.updated[coord.y, coord.x] = 0
+        self.asleep[max(coord.y - 1, 0) : coord.y + 2, max(coord.x - 1, 0) : coord.x + 2] = False
+        self.chunks.wake(coord.x, coord.y)
+
+    def spawn_cells(self, element: Type[ElementType], xs: np.ndarray, ys: np.ndarray) -> None:
+        """Spawns an element at many x/y coordinates at once
+
+        Colors are picked in one draw from the grid's 'rng', the same draw a CellMatrix makes, and every array is
+        written with a single fancy-indexed assignment to its flattened view.
+
+        Args:
+            element (ElementType): An 'ElementType' type
+            xs (np.ndarray): The column of each cell to spawn. Every cell must be inside the grid
+            ys (np.ndarray): The row of each cell to spawn
+        """
+        colors = np.array([color_index(c) for c in element.colors], dtype=np.uint16)
+        picks = self.rng.indices(len(colors), len(xs))
+
+        cells = ys * (self.max_coord.x + 1) + xs
+        self.element.reshape(-1)[cells] = element_id(element)
+        self.weight.reshape(-1)[cells] = element.weight
+        self.color.reshape(-1)[cells] = colors[picks]
+        self.updated.reshape(-1)[cells] = 0
+        nxs, nys = around(xs, ys, self.max_coord.x + 1, self.max_coord.y + 1)
+        self.asleep[nys, nxs] = False
+        self.chunks.wake_cells(xs, ys)
+
+    def color_indices(self, x0: int = 0, y0: int = 0, x1: Optional[int] = None, y1: Optional[int] = None) -> np.ndarray:
+        """Returns the index of each cell's color in the colors.PALETTE, indexed [y, x]
+
+        This is a view of the grid's own 'color' array rather than a copy.
+
+        Args:
+            x0 (int): The first column to include. Defaults to 0
+            y0 (int): The first row to include. Defaults to 0
+            x1 (int): The column after the last to include. Defaults to the width of the grid
+            y1 (int): The row after the last to include. Defaults to the height of the grid
+        """
+        return self.color[y0:y1, x0:x1]
+
+    def element_ids(self, x0: int = 0, y0: int = 0, x1: Optional[int] = None, y1: Optional[int] = None) -> np.ndarray:
+        """Returns the id of each cell's element type, indexed [y, x]. See ELEMENT_TYPES
+
+        This is a view of the grid's own 'element' array rather than a copy. Takes the same bounds as 'color_indices'.
+        """
+        return self.element[y0:y1, x0:x1]
+
+    def wake_all(self) -> None:
+        """Wakes every cell and every chunk, so the next step visits every cell (see CellMatrix.step)"""
+        self.asleep.fill(False)
+        self.chunks.wake_all()
+
+    def asleep_cells(self) -> np.ndarray:
+        """Returns whether each cell is asleep (see CellMatrix.step), indexed [y, x]
+
+        This is a view of the grid's own 'asleep' array rather than a copy.
+        """
+        return self.asleep
+
+    def restore(
+        self,
+        element: np.ndarray,
+        color: np.ndarray,
+        tick: int,
+        asleep: Optional[np.ndarray] = None,
+        awake: Optional[Iterable[int]] = None,
+    ) -> None:
+        """Replaces every cell in the grid, e.g. when loading a checkpoint (see the 'checkpoint' module)
+
+        The arrays are adopted rather than copied, so memory-mapped arrays stay memory-mapped until they're written to.
+        Weights are looked up from each cell's element type and update stamps are cleared.
+
+        Args:
+            element (np.ndarray): The id of each cell's element type, indexed [y, x]. See ELEMENT_TYPES
+            color (np.ndarray): The index of each cell's color in the colors.PALETTE, indexed [y, x]
+            tick (int): The tick to resume from
+            asleep (np.ndarray): Whether each cell is asleep, indexed [y, x]. Defaults to None, waking every cell
+            awake (Iterable[int]): The index of each chunk awake for the next step. Defaults to None, waking every chunk
+        """
+        self.element = element
+        self.weight = np.array([e.weight for e in ELEMENT_TYPES], dtype=np.float32)[element]
+        self.color = color
+        self.updated = np.zeros_like(self.updated)
+        self.asleep = np.zeros_like(self.asleep) if asleep is None else np.array(asleep, dtype=bool)
+        if awake is None:
+            self.chunks.wake_all()
+        else:
+            self.chunks.restore(awake)
+        self.tick = tick
+
+    def __rich_console__(
+        self, console: Console, options: ConsoleOptions
+    ) -> RenderResult:
+        """Renders each cell in the grid using the Rich Console Protocol
+
+        Renders identically to CellMatrix.__rich_console__, with Segments cached by the RICH_PALETTE.
+
+        Yields:
+            2 cells in the grid, row by row, until all cells have been rendered.
+        """
+        yield from RICH_PALETTE.segments(self.color)
+
+
+class BatchedCellGrid(CellGrid):
+    """A CellGrid that steps each row with whole-row array operations
+
+    Rather than visiting cells one at a time, every movable cell in a row picks its target at once from the same
+    probes a CellGrid uses. Conflicts are then resolved so each cell moves at most once:
+
+        - A cell can't move into a cell that is moving itself this round
+        - When several cells pick the same target, the one visited first in 'scan_order' wins
+        - A cell dispersing along its row stops short of any cell moving this round
+
+    Cells that lost a conflict, or whose neighborhood changed because of another cell's move, get another look in a
+    follow-up round (up to MAX_ROUNDS per row). Rows are still stepped bottom to top, so a falling column moves as one,
+    and only cells in awake chunks (including chunks woken by a move earlier in the step) are considered.
+
+    The result follows the same rules as a CellGrid, but it isn't identical cell for cell: ties are broken with NumPy's
+    random generator in bulk, and cells in a row decide simultaneously rather than left -> middle; right -> middle.
+
+    """
+
+    MAX_ROUNDS = 3
+
+    def __init__(self, xmax: int, ymax: int, seed: Optional[int] = None) -> None:
+        """Initializes a BatchedCellGrid instance
+
+        Args:
+            xmax (int): The maximum x value in the grid
+            ymax (int): The maximum y value in the grid
+            seed (int): The seed for the grid's random number generator. Defaults to None, which seeds from the OS
+
+        """
+        super().__init__(xmax, ymax, seed)
+        self._order = np.array(self.scan_order, dtype=np.intp)
+        self._directions = [member.value for member in MooreNeighborhood]
+        # Tie-breaking coins are drawn a row at a time, only for rows that need them, into these
+        self._coin_draws = np.empty(xmax, dtype=np.float64)
+        self._coins = np.empty(xmax, dtype=bool)
+
+    def step(self) -> None:
+        """Steps every cell in the grid forward once, one row at a time"""
+        width = self.max_coord.x + 1
+        height = self.max_coord.y + 1
+
+        behaviors = list(dict.fromkeys(ELEMENT_PROBES))
+        movable_table = np.array([len(p) > 0 for p in ELEMENT_PROBES])
+        dispersion_table = np.array(ELEMENT_DISPERSION, dtype=np.intp)
+        behavior_table = np.array([behaviors.index(p) for p in ELEMENT_PROBES], dtype=np.intp)
+        direction_ids = {(d.x, d.y): i for i, d in enumerate(self._directions)}
+        programs = [
+            [tuple(direction_ids[offset] for offset in probe) for probe in probes] for probes in behaviors
+        ]
+        used = sorted({d for program in programs for probe in program for d in probe})
+        dx = np.array([d.x for d in self._directions] + [0], dtype=np.intp)
+        dy = np.array([d.y for d in self._directions] + [0], dtype=np.intp)
+        none = len(self._directions)
+
+        element = self.element.reshape(-1)
+        weight = self.weight.reshape(-1)
+        color = self.color.reshape(-1)
+        updated = self.updated.reshape(-1)
+        tick = self._advance_tick()
+        generator = self.rng.generator
+        lighter = {d: np.empty(width, dtype=bool) for d in used}
+
+        chunks = self.chunks
+        size = chunks.size
+        columns = chunks.columns
+        dirty = chunks.dirty
+        awake = self._awake_chunks()
+        awake_columns = np.repeat(awake, size, axis=1)[:, :width]
+        awake_rows = awake.any(axis=1).tolist()
+        counters = self.counters
+
+        # Rows above the one being stepped don't change until it's their turn, so which have movable cells is known up
+        # front. Whether they're in an awake chunk isn't: a move can wake a chunk for the rest of the step
+        rows = np.flatnonzero(movable_table[self.element].any(axis=1))[::-1]
+        for y in rows.tolist():
+            if not awake_rows[y // size]:
+                continue
+            if counters is not None:
+                counters.evaluated += int((movable_table[self.element[y]] & awake_columns[y // size]).sum())
+            start = y * width
+            coin = None
+            for _ in range(self.MAX_ROUNDS):
+                row_element = self.element[y]
+                row_weight = self.weight[y]
+                pending = movable_table[row_element] & (self.updated[y] != tick) & awake_columns[y // size]
+                if not pending.any():
+                    break
+
+                for d in used:
+                    ny = y + dy[d]
+                    out = lighter[d]
+                    if not 0 <= ny < height:
+                        out.fill(False)
+                    elif dx[d] == 0:
+                        np.greater(row_weight, self.weight[ny], out=out)
+                    elif dx[d] == 1:
+                        np.greater(row_weight[:-1], self.weight[ny][1:], out=out[:-1])
+                        out[-1] = False
+                    else:
+                        np.greater(row_weight[1:], self.weight[ny][:-1], out=out[1:])
+                        out[0] = False
+
+                direction = np.full(width, none, dtype=np.intp)
+                row_behavior = behavior_table[row_element]
+                for b, program in enumerate(programs):
+                    undecided = pending & (row_behavior == b)
+                    for probe in program:
+                        if not undecided.any():
+                            break
+                        if len(probe) == 1:
+                            hit = undecided & lighter[probe[0]]
+                            direction[hit] = probe[0]
+                        else:
+                            hit = undecided & lighter[probe[0]] & lighter[probe[1]]
+                            if not hit.any():
+                                continue
+                            if coin is None:
+                                # Each cell keeps the same coin through every round of its row
+                                coin = np.less(generator.random(out=self._coin_draws), 0.5, out=self._coins)
+                            direction[hit] = np.where(coin, probe[0], probe[1])[hit]
+                        undecided &= ~hit
+
+                moving = direction != none
+                sources = self._order[moving[self._order]]
+                if len(sources) == 0:
+                    break
+                d = direction[sources]
+                tx = sources + dx[d]
+                ty = y + dy[d]
+                reach = np.where(ty == y, dispersion_table[row_element[sources]], 1)
+                going = reach > 1
+                for step in range(1, int(reach.max())):
+                    # Cells moving sideways carry on along the row while the next cell is lighter and staying put
+                    nx = tx + dx[d]
+                    going &= (step < reach) & (nx >= 0) & (nx < width)
+                    ahead = np.clip(nx, 0, width - 1)
+                    going &= (row_weight[sources] > row_weight[ahead]) & ~moving[ahead]
+                    if not going.any():
+                        break
+                    tx = np.where(going, nx, tx)
+                free = (ty != y) | ~moving[tx]
+                sources = sources[free]
+                targets = (ty * width + tx)[free]
+                _, first = np.unique(targets, return_index=True)
+                first.sort()
+                sources = sources[first] + start
+                targets = targets[first]
+                if len(sources) == 0:
+                    break
+
+                for array in (element, weight, color):
+                    displaced = array[targets]
+                    array[targets] = array[sources]
+                    array[sources] = displaced
+                updated[sources] = tick
+                updated[targets] = tick
+                if counters is not None:
+                    counts = np.bincount(element[targets])
+                    for eid in np.flatnonzero(counts).tolist():
+                        counters.swaps[eid] = counters.swaps.get(eid, 0) + int(counts[eid])
+                changed_chunks = set()
+                for cells in (sources, targets):
+                    changed_chunks.update(((cells // width // size) * columns + cells % width // size).tolist())
+                dirty.update(changed_chunks)
+
+                if chunks.awake_around(changed_chunks):
+                    continue
+                # Wake any sleeping chunk next to a cell that changed, as ChunkTracker.wake_near does. A cell's
+                # neighbors lie in at most 2x2 chunks, so checking the chunks of its corner neighbors is enough
+                changed = np.concatenate([sources, targets])
+                cx, cy = changed % width, changed // width
+                cx0, cx1 = np.maximum(cx - 1, 0) // size, np.minimum(cx + 1, width - 1) // size
+                cy0, cy1 = np.maximum(cy - 1, 0) // size, np.minimum(cy + 1, height - 1) // size
+                near = ~(awake[cy0, cx0] & awake[cy0, cx1] & awake[cy1, cx0] & awake[cy1, cx1])
+                if near.any():
+                    for cell in changed[near].tolist():
+                        chunks.wake_near(cell % width, cell // width)
+                    awake = self._awake_chunks()
+                    awake_columns = np.repeat(awake, size, axis=1)[:, :width]
+                    awake_rows = awake.any(axis=1).tolist()
+
+        self.chunks.advance()
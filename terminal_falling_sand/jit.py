@@ -0,0 +1,288 @@
+"""Hosts the JitCellGrid class, a CellGrid whose step loop is compiled with Numba when it's installed
+
+The loop in CellGrid._step_cells spends nearly all of its time in the interpreter: reading neighbors, comparing weights
+and swapping cells. '_step_kernel' is the same loop over plain arrays, which Numba compiles to machine code the first
+time a JitCellGrid steps (and caches on disk for later runs). It visits the same cells in the same order and uses the
+same coins from the grid's BulkRandom, so a JitCellGrid steps through a world identical to a CellGrid's.
+
+Numba is optional. Without it, JitCellGrid falls back to stepping exactly as a CellGrid does. Install it with the 'jit'
+extra, e.g. 'pip install terminal_falling_sand[jit]'.
+"""
+
+import warnings
+from typing import Optional
+
+import numpy as np
+
+from .elements import prober_offsets
+from .grid import CellGrid
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+JIT_AVAILABLE = njit is not None
+
+
+def _step_kernel(
+    visit,
+    element,
+    weight,
+    color,
+    updated,
+    asleep,
+    tick,
+    width,
+    height,
+    size,
+    columns,
+    probe_count,
+    probe_length,
+    probe_dx,
+    probe_dy,
+    dispersion,
+    probers,
+    sleepy,
+    coins,
+    dirty,
+    awake,
+    edges,
+    swaps,
+):
+    """Steps the given cells forward, in order, exactly as CellGrid._step_cells does
+
+    Every array is flat. Element behavior comes in as tables indexed by element id (then probe, then neighbor), and
+    ties are broken with 'coins', in order. The kernel stops early in two cases:
+
+        - A move wakes a chunk (marking it in 'awake'): it stops after that cell, so the cells left to visit can be
+          rebuilt to take the chunk's cells in
+        - A cell needs a coin and none are left: it stops before that cell, leaving it as it was, so it can be visited
+          again with more coins
+
+    Returns:
+        The number of coins used, the number of cells skipped for being asleep, the position in 'visit' of the cell it
+        stopped at (or -1 if it visited every cell), and whether it stopped because a chunk woke up
+    """
+    used = 0
+    skipped = 0
+    for n in range(visit.shape[0]):
+        i = visit[n]
+        if asleep[i]:
+            skipped += 1
+            continue
+        stamp = updated[i]
+        if stamp == tick:
+            continue
+        updated[i] = tick
+
+        y = i // width
+        x = i - y * width
+        w = weight[i]
+        e = element[i]
+        target = -1
+        for p in range(probe_count[e]):
+            length = probe_length[e, p]
+            found = 0
+            first = -1
+            second = -1
+            for k in range(length):
+                nx = x + probe_dx[e, p, k]
+                ny = y + probe_dy[e, p, k]
+                if 0 <= nx < width and 0 <= ny < height:
+                    j = ny * width + nx
+                    if w > weight[j]:
+                        if found == 0:
+                            first = j
+                        else:
+                            second = j
+                        found += 1
+            if found == length:
+                if length == 1:
+                    target = first
+                else:
+                    if used == coins.shape[0]:
+                        updated[i] = stamp
+                        return used, skipped, n, False
+                    target = second if coins[used] else first
+                    used += 1
+                break
+
+        if target == -1:
+            asleep[i] = True
+            sleepy[y + 1] = True
+            continue
+
+        reach = dispersion[e]
+        if reach > 1 and target // width == y:
+            dx = target - i
+            for _ in range(reach - 1):
+                nx = target - i + x + dx
+                if not 0 <= nx < width or w <= weight[target + dx]:
+                    break
+                target += dx
+
+        element[i], element[target] = element[target], element[i]
+        weight[i], weight[target] = weight[target], w
+        color[i], color[target] = color[target], color[i]
+        updated[target] = tick
+        swaps[element[target]] += 1
+
+        ty = target // width
+        tx = target - ty * width
+        source_chunk = (y // size) * columns + x // size
+        target_chunk = (ty // size) * columns + tx // size
+        dirty[source_chunk] = True
+        dirty[target_chunk] = True
+
+        # Wake the chunks holding the source, the target and their neighbors, as ChunkTracker.wake_near does
+        woke = False
+        if edges[i] or edges[target] or source_chunk != target_chunk:
+            for px, py in ((x, y), (tx, ty)):
+                for cy in range(max(py - 1, 0) // size, min(py + 1, height - 1) // size + 1):
+                    for cx in range(max(px - 1, 0) // size, min(px + 1, width - 1) // size + 1):
+                        if not awake[cy * columns + cx]:
+                            awake[cy * columns + cx] = True
+                            woke = True
+
+        if sleepy[y] or sleepy[y + 1] or sleepy[y + 2]:
+            asleep[target] = False
+            for q in range(probers.shape[0]):
+                nx = x + probers[q, 0]
+                ny = y + probers[q, 1]
+                if 0 <= nx < width and 0 <= ny < height:
+                    asleep[ny * width + nx] = False
+        if woke:
+            return used, skipped, n, True
+    return used, skipped, -1, False
+
+
+if JIT_AVAILABLE:
+    _step_kernel = njit(cache=True, nogil=True)(_step_kernel)
+
+
+class JitCellGrid(CellGrid):
+    """A CellGrid stepped by a compiled kernel
+
+    Behaves exactly like a CellGrid, cell for cell. If Numba isn't installed, a RuntimeWarning is issued when the grid is
+    created and it steps with CellGrid's own loop.
+
+    Attributes:
+        compiled (bool): Whether the grid steps with the compiled kernel
+    """
+
+    def __init__(self, xmax: int, ymax: int, seed: Optional[int] = None) -> None:
+        """Initializes a JitCellGrid instance
+
+        Args:
+            xmax (int): The maximum x value in the grid
+            ymax (int): The maximum y value in the grid
+            seed (int): The seed for the grid's random number generator. Defaults to None, which seeds from the OS
+
+        """
+        super().__init__(xmax, ymax, seed)
+        self.compiled = JIT_AVAILABLE
+        if not self.compiled:
+            warnings.warn("Numba isn't installed, so the 'jit' engine steps like the 'numpy' engine", RuntimeWarning)
+        self._tables: Optional[tuple] = None
+        self._tables_key: Optional[tuple] = None
+
+    def _behavior_tables(self, element_probes: list[tuple], element_dispersion: list[int]) -> tuple:
+        """Returns the kernel's tables of element behavior, rebuilt only when an element type is registered"""
+        key = (len(element_probes), tuple(element_dispersion))
+        if self._tables_key != key:
+            depth = max(1, max(len(probes) for probes in element_probes))
+            probe_count = np.array([len(probes) for probes in element_probes], dtype=np.intp)
+            probe_length = np.zeros((len(element_probes), depth), dtype=np.intp)
+            probe_dx = np.zeros((len(element_probes), depth, 2), dtype=np.intp)
+            probe_dy = np.zeros((len(element_probes), depth, 2), dtype=np.intp)
+            for e, probes in enumerate(element_probes):
+                for p, probe in enumerate(probes):
+                    probe_length[e, p] = len(probe)
+                    for k, (dx, dy) in enumerate(probe):
+                        probe_dx[e, p, k] = dx
+                        probe_dy[e, p, k] = dy
+            dispersion = np.array(element_dispersion, dtype=np.intp)
+            probers = np.array(prober_offsets(element_probes), dtype=np.intp).reshape(-1, 2)
+            self._tables = (probe_count, probe_length, probe_dx, probe_dy, dispersion, probers)
+            self._tables_key = key
+        return self._tables
+
+    def _step_cells(
+        self,
+        visit: np.ndarray,
+        tick: int,
+        element_probes: list[tuple],
+        element_dispersion: list[int],
+        dirty: set[int],
+        x0: int = 0,
+        x1: Optional[int] = None,
+    ) -> None:
+        """Steps the given cells forward, in order, with the compiled kernel. See CellGrid._step_cells
+
+        The kernel is handed the coins left in the grid's BulkRandom buffer (see BulkRandom.pending_coins), and only the
+        ones it used are drawn afterwards. If it runs out, the buffer is refilled and the kernel carries on from the
+        cell that needed one.
+        """
+        if not self.compiled:
+            return super()._step_cells(visit, tick, element_probes, element_dispersion, dirty, x0, x1)
+
+        chunks = self.chunks
+        flat_element = self.element.reshape(-1)
+        movable = np.array([len(p) > 0 for p in element_probes])
+        sleepy = np.zeros(self.max_coord.y + 3, dtype=bool)
+        sleepy[1:-1] = self.asleep.any(axis=1)
+        changed = np.zeros(chunks.rows * chunks.columns, dtype=bool)
+        awake = self._awake_chunks()
+        swaps = np.zeros(len(element_probes), dtype=np.int64)
+        evaluated = 0
+
+        cells = visit[movable[flat_element[visit]]]
+        evaluated += len(cells)
+        start = 0
+        coins = self.rng.pending_coins()
+        while True:
+            used, skipped, stopped, woke = _step_kernel(
+                cells[start:],
+                flat_element,
+                self.weight.reshape(-1),
+                self.color.reshape(-1),
+                self.updated.reshape(-1),
+                self.asleep.reshape(-1),
+                tick,
+                self.max_coord.x + 1,
+                self.max_coord.y + 1,
+                chunks.size,
+                chunks.columns,
+                *self._behavior_tables(element_probes, element_dispersion),
+                sleepy,
+                coins,
+                changed,
+                awake.reshape(-1),
+                self._edges.reshape(-1),
+                swaps,
+            )
+            self.rng.skip_coins(used)
+            evaluated -= skipped
+            if stopped == -1:
+                break
+            if not woke:
+                # Out of coins: carry on from the cell that needed one
+                start += stopped
+                coins = self.rng.pending_coins(refill=True)
+                continue
+            # A chunk woke up: carry on with its cells taken in, as CellGrid._step_cells does
+            rest, visit = self._revisit(visit, int(cells[start + stopped]), awake, x0, x1)
+            cells = visit[movable[flat_element[visit]]]
+            start = 0
+            coins = self.rng.pending_coins()
+            evaluated += len(cells) - int(movable[flat_element[rest]].sum())
+
+        chunks.awake.update(np.flatnonzero(awake).tolist())
+        dirty.update(np.flatnonzero(changed).tolist())
+
+        counters = self.counters
+        if counters is not None:
+            counters.evaluated += evaluated
+            for eid in np.flatnonzero(swaps).tolist():
+                counters.swaps[eid] = counters.swaps.get(eid, 0) + int(swaps[eid])
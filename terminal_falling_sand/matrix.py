@@ -1,11 +1,39 @@
 """Hosts the CellMatrix class used to run the simulation"""
 
+from typing import Iterable, Optional, Type
+
+import numpy as np
 from rich.console import Console, ConsoleOptions, RenderResult
 from rich.segment import Segment
-from rich.style import Style
 
+from .chunks import ChunkTracker
+from .colors import PALETTE, color_index
 from .coordinate import Coordinate
-from .elements import Empty
+from .elements import ELEMENT_PROBES, ELEMENT_TYPES, ElementType, Empty, prober_offsets
+from .palette import RICH_PALETTE
+from .regions import around
+from .rng import BulkRandom
+
+
+def scan_order(xmax: int) -> list[int]:
+    """Returns the order in which the columns of a row are stepped through
+
+    Columns are visited "middle out": left -> middle, then right -> middle. See CellMatrix.step for why. Each column is
+    listed at most once, in the position it is first visited.
+
+    Args:
+        xmax (int): The width of the grid
+    """
+    max_x = xmax - 1
+    midpoint = max_x // 2
+    if midpoint % 2 == 1:
+        midpoint += 1
+
+    order = list(range(midpoint + 1))
+    midpoint_offset = max_x - midpoint
+    for x in range(midpoint, max_x + 1):
+        order.append((midpoint_offset - x) % xmax)
+    return list(dict.fromkeys(order))
 
 
 class CellMatrix(list):
@@ -18,10 +46,16 @@ class CellMatrix(list):
     Attributes:
         max_coord (Coordinate): The maximum valid coordinate found in the grid
         midpoint (Coordinate): The midpoint of the grid.
+        scan_order (list[int]): The order columns are visited in for each row when stepping
+        chunks (ChunkTracker): Tracks which chunks of the matrix need stepping
+        tick (int): The number of steps taken so far. Cells updated in the current step carry this as their stamp
+        rng (BulkRandom): Breaks ties between two valid neighbors and picks the colors of spawned cells
+        counters (StepCounters): What to count while stepping, if anything. None (the default) counts nothing. See the
+                                 'metrics' module
 
     """
 
-    def __init__(self, xmax: int, ymax: int) -> None:
+    def __init__(self, xmax: int, ymax: int, seed: Optional[int] = None) -> None:
         """Initializes a CellMatrix instance
 
         Generates a new grid full of 'Empty' elements
@@ -29,6 +63,7 @@ class CellMatrix(list):
         Args:
             xmax (int): The maximum x value in the grid
             ymax (int): The maximum y value in the grid
+            seed (int): The seed for the matrix's random number generator. Defaults to None, which seeds from the OS
 
         """
         matrix = []
@@ -36,6 +71,13 @@ class CellMatrix(list):
         self.midpoint = self.max_coord.x // 2
         if self.midpoint % 2 == 1:
             self.midpoint += 1
+        self.scan_order = scan_order(xmax)
+        self._sleepers = [0] * ymax
+        self.chunks = ChunkTracker(xmax, ymax)
+        self._edges = self.chunks.edges().tolist()
+        self.tick = 0
+        self.rng = BulkRandom(seed)
+        self.counters = None
 
         for y in range(ymax):
             matrix.append([])
@@ -44,6 +86,230 @@ class CellMatrix(list):
                 matrix[coord.y].append(Empty(coord, self.max_coord))
         super().__init__(matrix)
 
+    def step(self) -> None:
+        """Steps every cell in the matrix forward once
+
+        Explores every element in the simulation by working bottom to top, then left -> middle; right -> middle for each
+        row. Each step in the simulation calls the 'change_state' method of each cell that can move, which looks up where
+        to move in its state's compiled probes and modifies the CellMatrix accordingly.
+
+        Issue:
+            When we step each element from left -> right or right -> left, the elements on the trailing end exhibit odd
+            behavior. Specifically, elements will move diagonally and to the left (or right) depending on the order
+            we're stepping them in. Unsure of the exact cause of this, but for now, working "middle out" in either
+            direction visually solves the problem. This probably means there's some odd behavior in the middle of the
+            matrix for each step, but it's not visually identifiable. Working "middle out" is an acceptable workaround
+            for now.
+
+        Only cells in chunks the ChunkTracker considers awake are visited. Cells that move, and the cells they swap
+        with, are reported back to it, and wake any sleeping chunk next to them for the rest of the step.
+
+        A cell has already been updated this step if its 'updated' stamp equals the current tick, so nothing needs to
+        be cleared once the step is over.
+
+        A cell that fails to move is put to sleep, and skipped until a neighbor it probes gets lighter, by swapping or
+        being spawned over. Failing to move draws nothing from the 'rng' and only depends on the weights the cell
+        probes, so sleeping cells are skipped without changing how the matrix steps. Swaps only look for cells to wake
+        near rows with sleeping cells in them.
+        """
+        self.tick += 1
+        tick = self.tick
+        chunks = self.chunks
+        awake = chunks.awake
+        counters = self.counters
+        width = self.max_coord.x + 1
+        height = self.max_coord.y + 1
+        scan_chunks = [x // chunks.size for x in self.scan_order]
+        sleepers = self._sleepers
+        edges = self._edges
+        size = chunks.size
+        probers = prober_offsets(ELEMENT_PROBES)
+        for cy in range(chunks.rows - 1, -1, -1):
+            base = cy * chunks.columns
+            order = [x for x, cx in zip(self.scan_order, scan_chunks) if base + cx in awake]
+            if not order:
+                continue
+            for y in range(min((cy + 1) * chunks.size, self.max_coord.y + 1) - 1, cy * chunks.size - 1, -1):
+                row = self[y]
+                row_edges = edges[y]
+                near = any(sleepers[max(y - 1, 0) : y + 2])
+                if counters is not None:
+                    counters.evaluated += sum(row[x].state.ignore is False for x in order)
+                rest = order
+                while rest:
+                    for x in rest:
+                        element = row[x]
+                        if element.state.ignore is True or element.updated == tick:
+                            continue
+                        if element.asleep:
+                            if counters is not None:
+                                counters.evaluated -= 1
+                            continue
+                        coord = element.change_state(self)
+                        if coord is None:
+                            element.asleep = True
+                            sleepers[y] += 1
+                            near = True
+                            continue
+                        chunks.mark(x, y)
+                        chunks.mark(coord.x, coord.y)
+                        if counters is not None:
+                            eid = self[coord.y][coord.x].state.element.id
+                            counters.swaps[eid] = counters.swaps.get(eid, 0) + 1
+
+                        if near:
+                            # Wake the target, and whatever probes the source, which got lighter. The target only got
+                            # heavier, so nothing probing it can move now that couldn't before
+                            neighbor = self[coord.y][coord.x]
+                            if neighbor.asleep:
+                                neighbor.asleep = False
+                                sleepers[coord.y] -= 1
+                            for dx, dy in probers:
+                                nx = x + dx
+                                ny = y + dy
+                                if 0 <= nx < width and 0 <= ny < height:
+                                    neighbor = self[ny][nx]
+                                    if neighbor.asleep:
+                                        neighbor.asleep = False
+                                        sleepers[ny] -= 1
+
+                        if (row_edges[x] or edges[coord.y][coord.x] or x // size != coord.x // size) and (
+                            chunks.wake_near(x, y) | chunks.wake_near(coord.x, coord.y)
+                        ):
+                            break
+                    else:
+                        break
+                    # A chunk woke up, so the rest of this row (and the rows above it) visit its cells too
+                    unvisited = rest[rest.index(x) + 1 :]
+                    order = [x for x, cx in zip(self.scan_order, scan_chunks) if base + cx in awake]
+                    rest = order[order.index(x) + 1 :]
+                    if counters is not None:
+                        counters.evaluated += sum(row[x].state.ignore is False for x in rest) - sum(
+                            row[x].state.ignore is False for x in unvisited
+                        )
+
+        chunks.advance()
+
+    def spawn(self, element: Type[ElementType], coord: Coordinate) -> None:
+        """Spawns an element at a given x/y coordinate
+
+        The element's color is picked by the matrix's 'rng'.
+
+        Args:
+            element (ElementType): An 'ElementType' type
+            coord (Coordinate): The coordinate to spawn the element at
+        """
+        self._wake(max(coord.x - 1, 0), max(coord.y - 1, 0), coord.x + 2, coord.y + 2)
+        self[coord.y][coord.x] = element(coord, self.max_coord, element.pick_color(self.rng))
+        self.chunks.wake(coord.x, coord.y)
+
+    def spawn_cells(self, element: Type[ElementType], xs: np.ndarray, ys: np.ndarray) -> None:
+        """Spawns an element at many x/y coordinates at once
+
+        Colors are picked in one draw from the matrix's 'rng' (the same draw a CellGrid makes), but every cell still
+        needs its own Cell object.
+
+        Args:
+            element (ElementType): An 'ElementType' type
+            xs (np.ndarray): The column of each cell to spawn. Every cell must be inside the matrix
+            ys (np.ndarray): The row of each cell to spawn
+        """
+        colors = element.colors
+        picks = self.rng.indices(len(colors), len(xs))
+        max_coord = self.max_coord
+        for x, y in zip(*(a.tolist() for a in around(xs, ys, max_coord.x + 1, max_coord.y + 1))):
+            self._wake(x, y, x + 1, y + 1)
+        for x, y, pick in zip(xs.tolist(), ys.tolist(), picks.tolist()):
+            self[y][x] = element(Coordinate(x, y), max_coord, colors[pick])
+        self.chunks.wake_cells(xs, ys)
+
+    def _wake(self, x0: int, y0: int, x1: int, y1: int) -> None:
+        """Wakes every sleeping cell in a rectangle, e.g. before cells in or next to it are spawned over
+
+        Args:
+            x0 (int): The first column of the rectangle
+            y0 (int): The first row of the rectangle
+            x1 (int): The column after the last of the rectangle
+            y1 (int): The row after the last of the rectangle
+        """
+        sleepers = self._sleepers
+        for y, row in enumerate(self[y0:y1], y0):
+            if sleepers[y]:
+                for cell in row[x0:x1]:
+                    if cell.asleep:
+                        cell.asleep = False
+                        sleepers[y] -= 1
+
+    def color_indices(self, x0: int = 0, y0: int = 0, x1: Optional[int] = None, y1: Optional[int] = None) -> np.ndarray:
+        """Returns the index of each cell's color in the colors.PALETTE, indexed [y, x]
+
+        Args:
+            x0 (int): The first column to include. Defaults to 0
+            y0 (int): The first row to include. Defaults to 0
+            x1 (int): The column after the last to include. Defaults to the width of the matrix
+            y1 (int): The row after the last to include. Defaults to the height of the matrix
+        """
+        return np.array(
+            [[color_index(element.state.color) for element in row[x0:x1]] for row in self[y0:y1]], dtype=np.uint16
+        )
+
+    def element_ids(self, x0: int = 0, y0: int = 0, x1: Optional[int] = None, y1: Optional[int] = None) -> np.ndarray:
+        """Returns the id of each cell's element type, indexed [y, x]. See elements.ELEMENT_TYPES
+
+        Takes the same bounds as 'color_indices'.
+        """
+        return np.array(
+            [[element.state.element.id for element in row[x0:x1]] for row in self[y0:y1]], dtype=np.uint8
+        )
+
+    def wake_all(self) -> None:
+        """Wakes every cell and every chunk, so the next step visits every cell (see 'step')"""
+        for y, sleepers in enumerate(self._sleepers):
+            if sleepers:
+                for element in self[y]:
+                    element.asleep = False
+                self._sleepers[y] = 0
+        self.chunks.wake_all()
+
+    def asleep_cells(self) -> np.ndarray:
+        """Returns whether each cell is asleep (see 'step'), indexed [y, x]"""
+        return np.array([[element.asleep for element in row] for row in self], dtype=bool)
+
+    def restore(
+        self,
+        element: np.ndarray,
+        color: np.ndarray,
+        tick: int,
+        asleep: Optional[np.ndarray] = None,
+        awake: Optional[Iterable[int]] = None,
+    ) -> None:
+        """Replaces every cell in the matrix, e.g. when loading a checkpoint (see the 'checkpoint' module)
+
+        Every cell is rebuilt as an instance of its element type, colored as given.
+
+        Args:
+            element (np.ndarray): The id of each cell's element type, indexed [y, x]. See elements.ELEMENT_TYPES
+            color (np.ndarray): The index of each cell's color in the colors.PALETTE, indexed [y, x]
+            tick (int): The tick to resume from
+            asleep (np.ndarray): Whether each cell is asleep, indexed [y, x]. Defaults to None, waking every cell
+            awake (Iterable[int]): The index of each chunk awake for the next step. Defaults to None, waking every chunk
+        """
+        max_coord = self.max_coord
+        self._sleepers = [0] * (max_coord.y + 1)
+        for y, (elements, colors) in enumerate(zip(element.tolist(), color.tolist())):
+            row = self[y]
+            for x, (eid, cid) in enumerate(zip(elements, colors)):
+                row[x] = ELEMENT_TYPES[eid](Coordinate(x, y), max_coord, PALETTE[cid])
+        if asleep is not None:
+            for y, x in zip(*np.nonzero(asleep)):
+                self[y][x].asleep = True
+                self._sleepers[y] += 1
+        if awake is None:
+            self.chunks.wake_all()
+        else:
+            self.chunks.restore(awake)
+        self.tick = tick
+
     def __rich_console__(
         self, console: Console, options: ConsoleOptions
     ) -> RenderResult:
@@ -53,12 +319,14 @@ class CellMatrix(list):
         actually occupies 2 rows in the terminal. I picked up this trick from rich's __main__ module. Run
         'python -m rich and observe the color palette at the top of stdout for another example of what this refers to.
 
+        The Segment for each pair of colors is built once and cached by the RICH_PALETTE, so rendering a frame doesn't
+        construct any Styles or parse any colors.
+
         Yields:
             2 cells in the simulation, row by row, until all cell states have been rendered.
         """
+        segment = RICH_PALETTE.segment
         for y in range(self.max_coord.y)[::2]:
-            for x in range(self.max_coord.x + 1):
-                bg = self[y][x].state.color
-                fg = self[y + 1][x].state.color
-                yield Segment("▄", Style(color=fg, bgcolor=bg))
+            for upper, lower in zip(self[y], self[y + 1]):
+                yield segment(color_index(upper.state.color), color_index(lower.state.color))
             yield Segment.line()
@@ -0,0 +1,167 @@
+"""Collects per-tick metrics from a running simulation, to see where the tick and frame budget goes
+
+Metrics are opt-in, see Simulation.run. Each tick produces a TickMetrics with:
+
+    1. The time spent stepping, and rendering any frames drawn after the step
+    2. The number of cells evaluated by the step: the movable cells in awake chunks that aren't asleep
+    3. The number of swaps made by cells of each element type
+    4. The size of the active region: the number of awake chunks stepped, and the cells inside them
+
+Each TickMetrics is handed to a callback, or written as a line of JSON to a metrics file.
+
+Matrices only count cells and swaps while their 'counters' attribute is set to a StepCounters, which a MetricsRecorder
+does for the length of a run. When metrics are off 'counters' is None, nothing is timed or wrapped, and stepping only
+pays for checking 'counters' once per step (and once per swap).
+"""
+
+import json
+from dataclasses import asdict, dataclass, field
+from os import PathLike
+from time import perf_counter
+from typing import Callable, Optional, TypeVar, Union
+
+from .elements import ELEMENT_TYPES
+
+T = TypeVar("T")
+
+
+@dataclass(slots=True)
+class StepCounters:
+    """What a matrix counted while stepping
+
+    Attributes:
+        evaluated (int): The number of cells evaluated
+        swaps (dict[int, int]): The number of swaps made by cells of each element type, by element id. See
+                                elements.ELEMENT_TYPES
+    """
+
+    evaluated: int = 0
+    swaps: dict[int, int] = field(default_factory=dict)
+
+    def merge(self, other: "StepCounters") -> None:
+        """Adds another set of counts to this one, e.g. one counted by a worker process"""
+        self.evaluated += other.evaluated
+        for eid, count in other.swaps.items():
+            self.swaps[eid] = self.swaps.get(eid, 0) + count
+
+
+@dataclass(slots=True)
+class TickMetrics:
+    """What one tick of a simulation cost
+
+    Attributes:
+        tick (int): The matrix's tick after the step
+        step_time (float): The time spent stepping, in seconds
+        render_time (float): The time spent drawing frames after the step, in seconds. When frames are drawn on a
+                             separate thread, only the time spent capturing them
+        frames (int): The number of frames drawn after the step
+        evaluated (int): The number of cells evaluated by the step
+        swaps (dict[str, int]): The number of swaps made by cells of each element type, by name
+        awake_chunks (int): The number of chunks stepped
+        active_cells (int): The number of cells in the chunks stepped
+    """
+
+    tick: int
+    step_time: float
+    render_time: float = 0.0
+    frames: int = 0
+    evaluated: int = 0
+    swaps: dict[str, int] = field(default_factory=dict)
+    awake_chunks: int = 0
+    active_cells: int = 0
+
+
+class MetricsRecorder:
+    """Times the steps and frames of a run and collects the matrix's counters into a TickMetrics per tick
+
+    Use as a context manager around the run: entering turns the matrix's counters on, exiting turns them back off and
+    closes the metrics file. The metrics of a tick are emitted once the next tick starts (or the run ends), so they
+    include the frames drawn in between.
+
+    Attributes:
+        matrix (Union[CellMatrix, CellGrid]): The matrix being stepped
+    """
+
+    def __init__(self, matrix, sink: Union[str, PathLike, Callable[[TickMetrics], None]]) -> None:
+        """Initializes an instance of the MetricsRecorder class
+
+        Args:
+            matrix (Union[CellMatrix, CellGrid]): The matrix being stepped
+            sink (Union[str, PathLike, Callable[[TickMetrics], None]]): A callback to hand each tick's metrics to, or a
+                                                                       file to write them to as JSON lines
+        """
+        self.matrix = matrix
+        self._sink = sink
+        self._file = None
+        self._emit: Optional[Callable[[TickMetrics], None]] = None
+        self._pending: Optional[TickMetrics] = None
+
+    def __enter__(self) -> "MetricsRecorder":
+        if callable(self._sink):
+            self._emit = self._sink
+        else:
+            self._file = open(self._sink, "w", encoding="utf-8")
+            self._emit = self._write
+        self.matrix.counters = StepCounters()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._flush()
+        self.matrix.counters = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def step(self, step: Callable[[], None]) -> None:
+        """Steps the matrix, timing the step and collecting what it counted
+
+        Args:
+            step (Callable[[], None]): Steps the matrix once
+        """
+        self._flush()
+        matrix = self.matrix
+        counters = matrix.counters
+        counters.evaluated = 0
+        counters.swaps = {}
+        chunks = matrix.chunks
+        awake_chunks = chunks.awake_count
+        active_cells = chunks.awake_cells
+
+        start = perf_counter()
+        step()
+        step_time = perf_counter() - start
+
+        self._pending = TickMetrics(
+            matrix.tick,
+            step_time,
+            evaluated=counters.evaluated,
+            swaps={ELEMENT_TYPES[eid].__name__: count for eid, count in sorted(counters.swaps.items())},
+            awake_chunks=awake_chunks,
+            active_cells=active_cells,
+        )
+
+    def draw(self, draw: Callable[[], T]) -> T:
+        """Draws a frame, timing it against the last tick
+
+        Args:
+            draw (Callable[[], T]): Draws a frame. May return False if it had to skip the frame
+
+        Returns:
+            Whatever 'draw' returned
+        """
+        start = perf_counter()
+        drawn = draw()
+        if self._pending is not None:
+            self._pending.render_time += perf_counter() - start
+            if drawn is not False:
+                self._pending.frames += 1
+        return drawn
+
+    def _flush(self) -> None:
+        """Emits the metrics of the last tick, if any"""
+        if self._pending is not None:
+            self._emit(self._pending)
+            self._pending = None
+
+    def _write(self, metrics: TickMetrics) -> None:
+        self._file.write(json.dumps(asdict(metrics)) + "\n")
@@ -0,0 +1,125 @@
+"""Hosts the Palette class, which caches what renderers need to draw each color in colors.PALETTE
+
+Renderers draw two cells per glyph (see CellMatrix.__rich_console__), so what they need is keyed by the pair of colors
+being drawn: a rich Segment for the rich renderer, SGR escape parameters for the DiffRenderer. Building and parsing these
+once per pair, rather than once per glyph per frame, keeps color handling out of the render loop.
+"""
+
+from collections import OrderedDict
+from typing import Iterator
+
+import numpy as np
+from rich.color import Color, ColorSystem
+from rich.segment import Segment
+from rich.style import Style
+
+from .colors import BUILTIN_COLORS, PALETTE
+
+GLYPH = "▄"
+
+
+class Palette:
+    """Caches rich Segments and SGR escape parameters for colors in the colors.PALETTE
+
+    Pairs of builtin colors (see colors.BUILTIN_COLORS) are cached for good: there are only a few thousand of them. Pairs
+    involving a color added at runtime are kept in a least-recently-used cache of at most 'maxsize' pairs, so a
+    simulation spawning many one-off colors can't grow the cache without bound.
+
+    Only the pairs are bounded that way. Each color's parsed form and escape parameters are kept for as long as the
+    color is in the PALETTE, which is for good, so they grow with it, up to colors.MAX_COLORS entries.
+
+    Attributes:
+        color_system (ColorSystem): The color system escape parameters are downgraded to
+        maxsize (int): The maximum number of pairs involving runtime colors to cache
+
+    """
+
+    def __init__(self, color_system: ColorSystem = ColorSystem.TRUECOLOR, maxsize: int = 1024) -> None:
+        """Initializes an instance of the Palette class
+
+        Args:
+            color_system (ColorSystem): The color system to downgrade escape parameters to. Defaults to TRUECOLOR
+            maxsize (int): The maximum number of pairs involving runtime colors to cache. Defaults to 1024
+        """
+        self.color_system = color_system
+        self.maxsize = maxsize
+        self._colors: list[Color] = []
+        self._foreground: list[str] = []
+        self._background: list[str] = []
+        self._segments: dict[int, Segment] = {}
+        self._runtime_segments: OrderedDict[int, Segment] = OrderedDict()
+        self._update()
+
+    def _update(self) -> None:
+        """Parses any colors added to the PALETTE since the last call"""
+        for color in PALETTE[len(self._colors) :]:
+            color = Color.parse(color)
+            downgraded = color.downgrade(self.color_system)
+            self._colors.append(color)
+            self._foreground.append(";".join(downgraded.get_ansi_codes(foreground=True)))
+            self._background.append(";".join(downgraded.get_ansi_codes(foreground=False)))
+
+    def foreground(self, index: int) -> str:
+        """Returns the SGR parameters setting the foreground to a color
+
+        Args:
+            index (int): The color's index in the PALETTE
+        """
+        if index >= len(self._foreground):
+            self._update()
+        return self._foreground[index]
+
+    def background(self, index: int) -> str:
+        """Returns the SGR parameters setting the background to a color
+
+        Args:
+            index (int): The color's index in the PALETTE
+        """
+        if index >= len(self._background):
+            self._update()
+        return self._background[index]
+
+    def segment(self, bg: int, fg: int) -> Segment:
+        """Returns a Segment drawing a glyph with the lower cell colored fg and the upper cell colored bg
+
+        Args:
+            bg (int): The index of the upper cell's color in the PALETTE
+            fg (int): The index of the lower cell's color in the PALETTE
+        """
+        key = bg << 16 | fg
+        segment = self._segments.get(key)
+        if segment is not None:
+            return segment
+        if bg < BUILTIN_COLORS and fg < BUILTIN_COLORS:
+            segment = self._segments[key] = self._make_segment(bg, fg)
+            return segment
+
+        segment = self._runtime_segments.get(key)
+        if segment is not None:
+            self._runtime_segments.move_to_end(key)
+            return segment
+        segment = self._runtime_segments[key] = self._make_segment(bg, fg)
+        if len(self._runtime_segments) > self.maxsize:
+            self._runtime_segments.popitem(last=False)
+        return segment
+
+    def segments(self, colors: np.ndarray) -> Iterator[Segment]:
+        """Yields the Segments drawing an array of color indices, two rows of cells per line of the terminal
+
+        Args:
+            colors (np.ndarray): The index of each cell's color in the PALETTE, indexed [y, x]
+        """
+        segment = self.segment
+        for y in range(colors.shape[0] - 1)[::2]:
+            for bg, fg in zip(colors[y].tolist(), colors[y + 1].tolist()):
+                yield segment(bg, fg)
+            yield Segment.line()
+
+    def _make_segment(self, bg: int, fg: int) -> Segment:
+        """Builds the Segment for a pair of colors"""
+        if max(bg, fg) >= len(self._colors):
+            self._update()
+        return Segment(GLYPH, Style(color=self._colors[fg], bgcolor=self._colors[bg]))
+
+
+RICH_PALETTE = Palette()
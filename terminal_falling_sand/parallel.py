@@ -0,0 +1,183 @@
+"""Hosts the ParallelCellGrid class, which steps a CellGrid across a pool of worker processes
+
+The grid's arrays live in shared memory, so workers step their part of the grid in place. The grid is split into
+vertical strips, and each step runs in two phases: first every other strip is stepped, each by a different worker, then
+the strips in between. A cell at the edge of a strip can move into (or look at) the columns next to it, which belong to a
+strip of the other phase. A cell that moves can also wake a cell in those columns (see CellGrid._step_cells), so the
+'asleep' array is shared too. No two workers ever touch the same cell at the same time.
+"""
+
+import os
+import weakref
+from multiprocessing import get_all_start_methods, get_context
+from multiprocessing.pool import Pool
+from multiprocessing.shared_memory import SharedMemory
+from typing import Iterable, Optional
+
+import numpy as np
+
+from .grid import ELEMENT_DISPERSION, ELEMENT_PROBES, ELEMENT_TYPES, CellGrid
+from .metrics import StepCounters
+from .rng import BulkRandom
+
+MIN_STRIP_WIDTH = 4
+SHARED_ARRAYS = ("element", "weight", "color", "updated", "asleep")
+
+_worker_grid: Optional[CellGrid] = None
+_worker_memory: list[SharedMemory] = []
+
+
+def _attach(xmax: int, ymax: int, names: list[str]) -> None:
+    """Initializes a worker process: builds a CellGrid over the shared arrays
+
+    Args:
+        xmax (int): The width of the grid
+        ymax (int): The height of the grid
+        names (list[str]): The names of the shared memory blocks, in the order of SHARED_ARRAYS
+    """
+    global _worker_grid
+
+    _worker_grid = CellGrid(xmax, ymax)
+    for attr, name in zip(SHARED_ARRAYS, names):
+        memory = SharedMemory(name=name)
+        _worker_memory.append(memory)
+        array = getattr(_worker_grid, attr)
+        setattr(_worker_grid, attr, np.ndarray(array.shape, dtype=array.dtype, buffer=memory.buf))
+
+
+def _step_strip(task: tuple) -> tuple[set[int], Optional[StepCounters]]:
+    """Steps the cells of one strip of the grid in a worker process
+
+    Args:
+        task (tuple): The tick, the strip's first column and the column after its last, the [cy, cx] mask of awake
+                      chunks, the compiled probes and dispersion of each element type, the seed to break ties with,
+                      and whether to count what the step does (see the 'metrics' module)
+
+    Returns:
+        The index of every chunk in which a cell moved, and what was counted, if anything
+    """
+    tick, x0, x1, awake, element_probes, element_dispersion, seed, counting = task
+    dirty: set[int] = set()
+    _worker_grid.rng = BulkRandom(seed)
+    _worker_grid.counters = StepCounters() if counting else None
+    _worker_grid.chunks.awake = set(np.flatnonzero(awake).tolist())
+    visit = _worker_grid._awake_cells(awake, x0, x1)
+    _worker_grid._step_cells(visit, tick, element_probes, element_dispersion, dirty, x0, x1)
+    return (dirty, _worker_grid.counters)
+
+
+def _release(pool: Pool, memory: list[SharedMemory]) -> None:
+    """Shuts down a ParallelCellGrid's pool and frees its shared memory"""
+    pool.terminate()
+    pool.join()
+    for block in memory:
+        block.close()
+        block.unlink()
+
+
+class ParallelCellGrid(CellGrid):
+    """A CellGrid stepped in vertical strips by a pool of worker processes
+
+    Each step, the grid is split into up to twice as many strips as there are workers (but none narrower than
+    MIN_STRIP_WIDTH), and the strips are stepped in two phases. Within a strip, cells are visited as a CellGrid would
+    visit them. On every other step the strip boundaries are shifted by half a strip, so the seams between strips don't
+    stay put.
+
+    The result follows the same rules as a CellGrid, but it isn't identical cell for cell: strips are stepped one after
+    another rather than the whole grid at once, and each strip breaks ties with its own random generator. Those are
+    seeded from the grid's 'rng', so the same seed still gives the same result, whichever worker steps which strip.
+
+    The pool and shared memory are released when the grid is garbage collected, or explicitly with 'close'.
+
+    Attributes:
+        workers (int): The number of worker processes
+
+    """
+
+    def __init__(self, xmax: int, ymax: int, workers: Optional[int] = None, seed: Optional[int] = None) -> None:
+        """Initializes a ParallelCellGrid instance
+
+        Args:
+            xmax (int): The maximum x value in the grid
+            ymax (int): The maximum y value in the grid
+            workers (int): The number of worker processes. Defaults to the number of CPUs
+            seed (int): The seed for the grid's random number generator. Defaults to None, which seeds from the OS
+
+        """
+        super().__init__(xmax, ymax, seed)
+        self.workers = workers or os.cpu_count() or 1
+
+        memory = []
+        for attr in SHARED_ARRAYS:
+            array = getattr(self, attr)
+            block = SharedMemory(create=True, size=array.nbytes)
+            memory.append(block)
+            shared = np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)
+            shared[...] = array
+            setattr(self, attr, shared)
+
+        context = get_context("fork" if "fork" in get_all_start_methods() else "spawn")
+        self._pool = context.Pool(self.workers, initializer=_attach, initargs=(xmax, ymax, [m.name for m in memory]))
+        self._finalizer = weakref.finalize(self, _release, self._pool, memory)
+
+    def close(self) -> None:
+        """Shuts down the worker pool and frees the shared memory. The grid can't be stepped afterwards"""
+        self._finalizer()
+
+    def restore(
+        self,
+        element: np.ndarray,
+        color: np.ndarray,
+        tick: int,
+        asleep: Optional[np.ndarray] = None,
+        awake: Optional[Iterable[int]] = None,
+    ) -> None:
+        """Replaces every cell in the grid. See CellGrid.restore
+
+        Unlike a CellGrid, the arrays are copied into shared memory, where the workers can see them.
+        """
+        self.element[...] = element
+        self.weight[...] = np.array([e.weight for e in ELEMENT_TYPES], dtype=np.float32)[element]
+        self.color[...] = color
+        self.updated.fill(0)
+        self.asleep[...] = False if asleep is None else asleep
+        if awake is None:
+            self.chunks.wake_all()
+        else:
+            self.chunks.restore(awake)
+        self.tick = tick
+
+    def _strips(self) -> list[tuple[int, int]]:
+        """Returns the (x0, x1) bounds of each strip for this step, left to right. x1 is exclusive
+
+        A cell dispersing along its row reaches up to max(ELEMENT_DISPERSION) columns past the edge of its strip, so
+        strips are at least twice that wide: a strip of one phase keeps the two strips of the other phase on either
+        side of it from reaching the same cell.
+        """
+        width = self.max_coord.x + 1
+        min_width = max(MIN_STRIP_WIDTH, 2 * max(ELEMENT_DISPERSION))
+        count = max(min(2 * self.workers, width // min_width), 1)
+        strip_width = -(-width // count)
+        offset = strip_width // 2 if self.tick % 2 else 0
+        bounds = sorted({0, width, *range(offset, width, strip_width)})
+        return list(zip(bounds, bounds[1:]))
+
+    def step(self) -> None:
+        """Steps every cell in the grid forward once, in two phases of strips"""
+        tick = self._advance_tick()
+        awake = self._awake_chunks()
+        element_probes = list(ELEMENT_PROBES)
+        element_dispersion = list(ELEMENT_DISPERSION)
+        strips = self._strips()
+        seeds = self.rng.generator.integers(0, 2**63, len(strips)).tolist()
+        counting = self.counters is not None
+        for phase in (slice(0, None, 2), slice(1, None, 2)):
+            tasks = [
+                (tick, x0, x1, awake, element_probes, element_dispersion, seed, counting)
+                for (x0, x1), seed in zip(strips[phase], seeds[phase])
+            ]
+            for dirty, counters in self._pool.map(_step_strip, tasks):
+                self.chunks.dirty.update(dirty)
+                if counting:
+                    self.counters.merge(counters)
+        self.chunks.advance()
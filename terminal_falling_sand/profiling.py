@@ -0,0 +1,291 @@
+"""Profiles a running simulation, either exhaustively with cProfile or cheaply by sampling
+
+PROFILERS are:
+
+    - 'cprofile': traces every function call with cProfile, then prints the costliest functions, sorted, and can save the
+      profile as a pstats file (e.g. to open with 'python -m pstats' or snakeviz). Exact call counts, but tracing every
+      call slows the simulation down two or three times, and the cheapest, most frequent calls the most
+    - 'sample': looks at what the simulation is doing every 'interval' seconds from a background thread, see
+      SamplingProfiler. Costs next to nothing, so big worlds can be profiled running as they would otherwise
+
+The simulation's own thread is the only one profiled. Frames drawn on a separate thread (see scheduler.RenderThread)
+only show up as the time spent handing them over.
+"""
+
+import cProfile
+import dis
+import json
+import os
+import pstats
+import sys
+import threading
+from collections import Counter
+from os import PathLike
+from time import perf_counter
+from types import CodeType, FrameType
+from typing import Callable, Optional, TypeVar, Union
+
+from .elements import ELEMENT_TYPES
+
+T = TypeVar("T")
+
+PROFILERS = ("cprofile", "sample")
+
+# How long a SamplingProfiler waits for the GIL before making the sampled thread let go of it, in seconds. A thread that
+# lets go of its own accord (e.g. while NumPy copies a big array) can be sampled straight away, so the longer the wait,
+# the more samples land on those calls rather than wherever the time is actually going
+SWITCH_INTERVAL = 0.0001
+
+_PACKAGE = os.path.dirname(os.path.abspath(__file__))
+
+# Anything happening under one of these is drawing a frame: building it (__rich_console__), or handing it to the
+# terminal (the draw callbacks passed to a Scheduler by simulation.schedule)
+RENDER_FUNCTIONS = frozenset(
+    {
+        "CellMatrix.__rich_console__",
+        "CellGrid.__rich_console__",
+        "Viewport.__rich_console__",
+        "Snapshot.__rich_console__",
+        "DiffRenderer.render",
+        "RenderThread.submit",
+        "schedule.<locals>.draw",
+    }
+)
+STEP_FUNCTIONS = frozenset({"Simulation.step", "Replay.step"})
+# Waiting for the next tick or frame to fall due, when nothing else is on the stack
+WAIT_FUNCTIONS = frozenset({"Scheduler.run"})
+
+
+def _cell_element(f_locals: dict) -> str:
+    """Returns the element of the cell being stepped by Cell.change_state, from before it swapped"""
+    state = f_locals.get("state") or f_locals["self"].state
+    return state.element.__name__
+
+
+def _grid_element(f_locals: dict) -> Optional[str]:
+    """Returns the element of the cell being stepped by CellGrid._step_cells, from before it swapped"""
+    e = f_locals.get("e")
+    return None if e is None else ELEMENT_TYPES[e].__name__
+
+
+# How to tell which element type the cell being stepped holds, by the function stepping it
+ELEMENT_OF = {"Cell.change_state": _cell_element, "CellGrid._step_cells": _grid_element}
+
+
+class SamplingProfiler:
+    """Samples what a thread is doing, at regular intervals, from a background thread
+
+    Each sample walks the thread's stack and attributes it to:
+
+        1. A phase: 'step' (under Simulation.step), 'render' (drawing a frame, see RENDER_FUNCTIONS), 'wait' (in the
+           Scheduler itself, mostly sleeping until the next tick or frame) or 'other' (e.g. recording or exporting)
+        2. The innermost function of this package on the stack, followed by the library it's calling into if any, e.g.
+           'Cell.change_state' or 'schedule.<locals>.draw > rich'
+        3. When stepping a cell, the element type the cell holds (see ELEMENT_OF)
+
+    Samples can only be taken while the sampled thread has let go of the GIL. While sampling, the interpreter's switch
+    interval is lowered to SWITCH_INTERVAL, so a sample is taken promptly when due rather than whenever the thread next
+    lets go by itself. It still only lets go as it enters a function or loops, so the time spent in a short function
+    with no loop in it (e.g. Cell.change_state) is partly put down to the function it returns to.
+
+    Use as a context manager around what's being profiled.
+
+    Attributes:
+        interval (float): The time between samples, in seconds
+        samples (int): The number of samples taken
+        elapsed (float): The time spent sampling, in seconds
+        phases (Counter): The number of samples taken in each phase
+        functions (dict[str, Counter]): The number of samples taken in each function, by phase
+        elements (Counter): The number of samples taken stepping a cell of each element type, by name
+    """
+
+    def __init__(self, interval: float = 0.005) -> None:
+        """Initializes an instance of the SamplingProfiler class
+
+        Args:
+            interval (float): The time between samples, in seconds. Defaults to 0.005
+        """
+        self.interval = interval
+        self.samples = 0
+        self.elapsed = 0.0
+        self.phases: Counter = Counter()
+        self.functions: dict[str, Counter] = {}
+        self.elements: Counter = Counter()
+
+        self._target: Optional[int] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._start = 0.0
+        self._switch_interval = sys.getswitchinterval()
+        self._codes: dict[CodeType, tuple[str, bool, int]] = {}
+
+    def __enter__(self) -> "SamplingProfiler":
+        self._switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(min(self._switch_interval, SWITCH_INTERVAL))
+        self._target = threading.get_ident()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="SamplingProfiler", daemon=True)
+        self._start = perf_counter()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._stop.set()
+        self._thread.join()
+        self.elapsed += perf_counter() - self._start
+        sys.setswitchinterval(self._switch_interval)
+
+    def _run(self) -> None:
+        """Samples the target thread until stopped"""
+        current_frames = sys._current_frames
+        while not self._stop.wait(self.interval):
+            frame = current_frames().get(self._target)
+            if frame is not None:
+                self._sample(frame)
+
+    def _describe(self, code: CodeType) -> tuple[str, bool, int]:
+        """Returns a function's qualified name, whether it's part of this package, and the offset of its entry"""
+        described = self._codes.get(code)
+        if described is None:
+            inside = os.path.dirname(os.path.abspath(code.co_filename)) == _PACKAGE
+            entry = next((i.offset for i in dis.get_instructions(code) if i.opname == "RESUME"), -1)
+            described = self._codes[code] = (code.co_qualname, inside, entry)
+        return described
+
+    def _sample(self, frame: FrameType) -> None:
+        """Attributes a sample of the stack ending in 'frame'
+
+        A thread only lets go of the GIL as it enters a function or jumps back to the top of a loop, so a sample lands on
+        the first of those after the time being sampled. A function caught on entry hasn't done anything yet: the time
+        was its caller's.
+        """
+        name, _, entry = self._describe(frame.f_code)
+        if frame.f_lasti <= entry and frame.f_back is not None:
+            frame = frame.f_back
+            name, _, _ = self._describe(frame.f_code)
+        waiting = name in WAIT_FUNCTIONS
+        rendering = stepping = False
+        function = None
+        library = None
+        element = None
+        while frame is not None:
+            name, inside, _ = self._describe(frame.f_code)
+            if not inside:
+                if function is None:
+                    library = frame.f_globals.get("__name__", "?").partition(".")[0]
+            else:
+                if function is None:
+                    function = name
+                if name in RENDER_FUNCTIONS:
+                    rendering = True
+                elif name in STEP_FUNCTIONS:
+                    stepping = True
+                elif element is None and name in ELEMENT_OF:
+                    element = ELEMENT_OF[name](frame.f_locals)
+            frame = frame.f_back
+
+        phase = "wait" if waiting else "render" if rendering else "step" if stepping else "other"
+        if function is None:
+            function = library or "?"
+        elif library is not None:
+            function = f"{function} > {library}"
+        self.samples += 1
+        self.phases[phase] += 1
+        self.functions.setdefault(phase, Counter())[function] += 1
+        if element is not None and phase == "step":
+            self.elements[element] += 1
+
+    def report(self) -> dict:
+        """Returns what was sampled, as a dict of plain types (see 'format_report')"""
+        return {
+            "interval": self.interval,
+            "samples": self.samples,
+            "elapsed": self.elapsed,
+            "phases": {
+                phase: {"samples": count, "functions": dict(self.functions[phase].most_common())}
+                for phase, count in self.phases.most_common()
+            },
+            "elements": dict(self.elements.most_common()),
+        }
+
+
+def format_report(report: dict, limit: int = 10) -> str:
+    """Formats a SamplingProfiler's report as a table, each phase broken down into its costliest functions
+
+    Args:
+        report (dict): The report, as returned by SamplingProfiler.report
+        limit (int): The most functions to list per phase. Defaults to 10
+
+    Returns:
+        The table
+    """
+    total = report["samples"] or 1
+    elapsed = report["elapsed"]
+    lines = [f"{report['samples']} samples over {elapsed:.2f}s, every {report['interval'] * 1000:g}ms"]
+    for phase, breakdown in report["phases"].items():
+        share = breakdown["samples"] / total
+        lines.append(f"{phase:<48} {share:7.1%} {share * elapsed:8.2f}s")
+        for function, count in list(breakdown["functions"].items())[:limit]:
+            lines.append(f"    {function:<44} {count / total:7.1%} {count / total * elapsed:8.2f}s")
+
+    stepped = sum(report["elements"].values())
+    if stepped:
+        lines.append("Stepping cells, by element type")
+        for element, count in report["elements"].items():
+            lines.append(f"    {element:<44} {count / stepped:7.1%} {count / total * elapsed:8.2f}s")
+    return "\n".join(lines)
+
+
+def profile(
+    run: Callable[[], T],
+    profiler: str = "cprofile",
+    output: Optional[Union[str, PathLike]] = None,
+    sort: str = "cumulative",
+    interval: float = 0.005,
+    limit: int = 30,
+) -> T:
+    """Runs something under a profiler, then reports where the time went
+
+    The report is written even if the run is interrupted or fails.
+
+    Args:
+        run (Callable[[], T]): What to profile
+        profiler (str): One of PROFILERS. Defaults to 'cprofile'
+        output (Union[str, PathLike]): For 'cprofile', a file to save the profile to as pstats. For 'sample', a file to
+                                       write the report to, as JSON if its name ends in '.json'. Defaults to None,
+                                       which only prints the report
+        sort (str): For 'cprofile', what to sort functions by, as accepted by pstats.Stats.sort_stats. Defaults to
+                    'cumulative'
+        interval (float): For 'sample', the time between samples, in seconds. Defaults to 0.005
+        limit (int): The most functions to print. Defaults to 30
+
+    Returns:
+        Whatever 'run' returned
+    """
+    if profiler not in PROFILERS:
+        raise ValueError(f"Unknown profiler {profiler!r}. Expected one of {PROFILERS}")
+
+    if profiler == "cprofile":
+        traced = cProfile.Profile()
+        try:
+            return traced.runcall(run)
+        finally:
+            pstats.Stats(traced, stream=sys.stderr).sort_stats(sort).print_stats(limit)
+            if output is not None:
+                traced.dump_stats(output)
+
+    sampler = SamplingProfiler(interval)
+    try:
+        with sampler:
+            return run()
+    finally:
+        report = sampler.report()
+        if output is None:
+            print(format_report(report, limit), file=sys.stderr)
+        else:
+            with open(output, "w", encoding="utf-8") as f:
+                if os.fspath(output).endswith(".json"):
+                    json.dump(report, f, indent=2)
+                    f.write("\n")
+                else:
+                    f.write(format_report(report, limit) + "\n")
@@ -0,0 +1,384 @@
+"""Records simulations as a stream of per-tick changes, and plays them back
+
+A recording is an append-only file: a fixed HEADER (MAGIC, the format VERSION, the width and height of the grid and the
+keyframe interval), followed by records. Each record is a RECORD header (its kind, tick and payload length) and a
+zlib-compressed payload:
+
+    - KEYFRAME: the id of every cell's element type (uint8) then the index of every cell's color (uint16), row by row
+    - DELTA: the cells that changed during a tick. Their flat indices, as gaps from the previous index (uint32), then
+      their new element ids (uint8) and color indices (uint16)
+    - NAMES: the names of element types and colors numbered since the last NAMES record, as UTF-8 JSON. Written before
+      the first record that uses them
+
+Ticks are counted from the start of the recording, which is always a keyframe. There's one KEYFRAME or DELTA record per
+tick, and a KEYFRAME every 'keyframe_interval' ticks, so playback can seek to any tick by loading the keyframe before it
+and applying at most keyframe_interval - 1 deltas.
+
+Play a recording back with 'tfs replay', or 'python -m terminal_falling_sand.recording'. See 'tfs replay --help'.
+"""
+
+import argparse
+import json
+import struct
+import sys
+import zlib
+from bisect import bisect_right
+from contextlib import ExitStack
+from functools import partial
+from os import PathLike
+from typing import BinaryIO, Callable, Optional, Union
+
+import numpy as np
+
+from .colors import PALETTE, color_index
+from .coordinate import Coordinate
+from .grid import ELEMENT_TYPES, element_id, element_type
+
+MAGIC = b"TFSREC\x00\x00"
+VERSION = 1
+HEADER = struct.Struct("<8sIIII")
+RECORD = struct.Struct("<BQI")
+
+KEYFRAME = 1
+DELTA = 2
+NAMES = 3
+
+
+class Recorder:
+    """Writes a matrix's changes to a recording as it steps
+
+    Only cells in chunks that were awake before or after a tick can have changed during it (see the 'chunks' module), so
+    only the box bounding those chunks is compared against the last recorded state. Changes made between ticks, e.g. by
+    spawning elements, are picked up too, since spawning wakes the chunk spawned in.
+
+    Use as a context manager: entering creates the file and writes a keyframe of the matrix as it is, exiting closes it.
+
+    Attributes:
+        matrix (Union[CellMatrix, CellGrid]): The matrix being recorded
+        path (Union[str, PathLike]): The file being written
+        keyframe_interval (int): The number of ticks between keyframes
+        tick (int): The number of ticks recorded so far
+        level (int): The zlib compression level
+
+    """
+
+    def __init__(
+        self, matrix, path: Union[str, PathLike], keyframe_interval: int = 300, level: int = 1
+    ) -> None:
+        """Initializes an instance of the Recorder class
+
+        Args:
+            matrix (Union[CellMatrix, CellGrid]): The matrix to record
+            path (Union[str, PathLike]): The file to write. Overwritten if it exists
+            keyframe_interval (int): The number of ticks between keyframes. Defaults to 300
+            level (int): The zlib compression level. Defaults to 1, the fastest
+        """
+        if keyframe_interval < 1:
+            raise ValueError("keyframe_interval must be at least 1")
+        self.matrix = matrix
+        self.path = path
+        self.keyframe_interval = keyframe_interval
+        self.level = level
+        self.tick = 0
+
+        self._file: Optional[BinaryIO] = None
+        self._element: Optional[np.ndarray] = None
+        self._color: Optional[np.ndarray] = None
+        self._elements_written = 0
+        self._colors_written = 0
+
+    def __enter__(self) -> "Recorder":
+        max_coord = self.matrix.max_coord
+        self._file = open(self.path, "wb")
+        self._file.write(HEADER.pack(MAGIC, VERSION, max_coord.x + 1, max_coord.y + 1, self.keyframe_interval))
+        self.tick = 0
+        self._keyframe()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._file.close()
+
+    def step(self, step: Callable[[], None]) -> None:
+        """Steps the matrix with 'step', then records what changed
+
+        Args:
+            step (Callable[[], None]): Steps the matrix forward once
+        """
+        chunks = self.matrix.chunks
+        awake = set(chunks.awake)
+        step()
+        awake |= chunks.awake
+        self.tick += 1
+        if self.tick % self.keyframe_interval == 0:
+            self._keyframe()
+        elif awake:
+            x0, y0, x1, y1 = zip(*(chunks.bounds(index) for index in awake))
+            self._delta(min(x0), min(y0), max(x1), max(y1))
+        else:
+            self._write(DELTA, b"")
+
+    def _keyframe(self) -> None:
+        """Records the whole matrix"""
+        self._element = np.array(self.matrix.element_ids(), dtype=np.uint8)
+        self._color = np.array(self.matrix.color_indices(), dtype=np.uint16)
+        self._write_names()
+        self._write(KEYFRAME, self._element.tobytes() + self._color.tobytes())
+
+    def _delta(self, x0: int, y0: int, x1: int, y1: int) -> None:
+        """Records the cells within the given bounds that changed since they were last recorded"""
+        element = self.matrix.element_ids(x0, y0, x1, y1)
+        color = self.matrix.color_indices(x0, y0, x1, y1)
+        recorded_element = self._element[y0:y1, x0:x1]
+        recorded_color = self._color[y0:y1, x0:x1]
+
+        changed = (element != recorded_element) | (color != recorded_color)
+        ys, xs = np.nonzero(changed)
+        indices = ((ys + y0) * self._element.shape[1] + xs + x0).astype(np.uint32)
+        recorded_element[changed] = new_element = element[changed]
+        recorded_color[changed] = new_color = color[changed]
+
+        self._write_names()
+        gaps = np.diff(indices, prepend=np.uint32(0)).astype(np.uint32)
+        payload = gaps.tobytes() + new_element.astype(np.uint8).tobytes() + new_color.astype(np.uint16).tobytes()
+        self._write(DELTA, payload)
+
+    def _write_names(self) -> None:
+        """Records any element types and colors numbered since the last NAMES record"""
+        if self._elements_written == len(ELEMENT_TYPES) and self._colors_written == len(PALETTE):
+            return
+        names = {
+            "elements": [e.__name__ for e in ELEMENT_TYPES[self._elements_written :]],
+            "palette": PALETTE[self._colors_written :],
+        }
+        self._elements_written = len(ELEMENT_TYPES)
+        self._colors_written = len(PALETTE)
+        self._write(NAMES, json.dumps(names).encode("utf-8"))
+
+    def _write(self, kind: int, payload: bytes) -> None:
+        """Appends a record to the file"""
+        payload = zlib.compress(payload, self.level)
+        self._file.write(RECORD.pack(kind, self.tick, len(payload)))
+        self._file.write(payload)
+
+
+class Replay:
+    """Plays a recording back, standing in for the matrix it was recorded from
+
+    Exposes the same max_coord, step, color_indices and element_ids as a matrix, so it can be drawn through a Viewport
+    by either renderer. Element ids and color indices are renumbered to this process's numbering as they're read.
+
+    Attributes:
+        path (Union[str, PathLike]): The recording being played
+        max_coord (Coordinate): The maximum valid coordinate found in the recorded grid
+        keyframe_interval (int): The number of ticks between keyframes
+        ticks (int): The number of ticks in the recording, not counting the starting keyframe
+        tick (int): The tick currently shown
+        element (np.ndarray): The id of each cell's element type as of 'tick', indexed [y, x]
+        color (np.ndarray): The index of each cell's color as of 'tick', indexed [y, x]
+
+    """
+
+    def __init__(self, path: Union[str, PathLike]) -> None:
+        """Initializes an instance of the Replay class, showing the first tick of the recording
+
+        Args:
+            path (Union[str, PathLike]): The recording to play
+        """
+        self.path = path
+        self._file = open(path, "rb")
+        magic, version, xmax, ymax, self.keyframe_interval = HEADER.unpack(self._file.read(HEADER.size))
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a recording")
+        if version != VERSION:
+            raise ValueError(f"{path} is a version {version} recording. Only version {VERSION} is supported")
+        self.max_coord = Coordinate(xmax - 1, ymax - 1)
+        self.element = np.zeros((ymax, xmax), dtype=np.uint8)
+        self.color = np.zeros((ymax, xmax), dtype=np.uint16)
+
+        element_ids: list[int] = []
+        color_indices: list[int] = []
+        self._records: list[tuple[int, int, int]] = []
+        self._keyframes: list[int] = []
+        offset = HEADER.size
+        while True:
+            header = self._file.read(RECORD.size)
+            if len(header) < RECORD.size:
+                break
+            kind, tick, length = RECORD.unpack(header)
+            offset += RECORD.size
+            if kind == NAMES:
+                names = json.loads(zlib.decompress(self._file.read(length)).decode("utf-8"))
+                element_ids.extend(element_id(element_type(name)) for name in names["elements"])
+                color_indices.extend(color_index(color) for color in names["palette"])
+            else:
+                if kind == KEYFRAME:
+                    self._keyframes.append(tick)
+                self._records.append((kind, offset, length))
+                self._file.seek(length, 1)
+            offset += length
+
+        if not self._keyframes or self._keyframes[0] != 0:
+            raise ValueError(f"{path} doesn't start with a keyframe")
+        self._element_ids = np.array(element_ids, dtype=np.uint8)
+        self._color_indices = np.array(color_indices, dtype=np.uint16)
+        self.ticks = len(self._records) - 1
+        self.tick = 0
+        self._apply(0)
+
+    def __enter__(self) -> "Replay":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Closes the recording"""
+        self._file.close()
+
+    def _apply(self, tick: int) -> None:
+        """Applies the record of a tick on top of what's shown"""
+        kind, offset, length = self._records[tick]
+        self._file.seek(offset)
+        payload = zlib.decompress(self._file.read(length))
+        if kind == KEYFRAME:
+            cells = self.element.size
+            shape = self.element.shape
+            self.element[...] = self._element_ids[np.frombuffer(payload, np.uint8, cells).reshape(shape)]
+            self.color[...] = self._color_indices[np.frombuffer(payload, np.uint16, cells, cells).reshape(shape)]
+        elif payload:
+            count = len(payload) // 7
+            indices = np.cumsum(np.frombuffer(payload, np.uint32, count), dtype=np.intp)
+            self.element.reshape(-1)[indices] = self._element_ids[np.frombuffer(payload, np.uint8, count, 4 * count)]
+            self.color.reshape(-1)[indices] = self._color_indices[np.frombuffer(payload, np.uint16, count, 5 * count)]
+        self.tick = tick
+
+    def seek(self, tick: int) -> None:
+        """Shows the given tick, by loading the keyframe before it and applying the deltas since
+
+        Args:
+            tick (int): The tick to show, between 0 and 'ticks'
+        """
+        tick = max(min(tick, self.ticks), 0)
+        keyframe = self._keyframes[bisect_right(self._keyframes, tick) - 1]
+        start = self.tick + 1 if keyframe <= self.tick <= tick else keyframe
+        for t in range(start, tick + 1):
+            self._apply(t)
+
+    def step(self) -> None:
+        """Shows the next tick, if there is one"""
+        if self.tick < self.ticks:
+            self._apply(self.tick + 1)
+
+    def color_indices(self, x0: int = 0, y0: int = 0, x1: Optional[int] = None, y1: Optional[int] = None) -> np.ndarray:
+        """Returns the index of each cell's color as of 'tick', indexed [y, x]. See CellGrid.color_indices"""
+        return self.color[y0:y1, x0:x1]
+
+    def element_ids(self, x0: int = 0, y0: int = 0, x1: Optional[int] = None, y1: Optional[int] = None) -> np.ndarray:
+        """Returns the id of each cell's element type as of 'tick', indexed [y, x]. See CellGrid.element_ids"""
+        return self.element[y0:y1, x0:x1]
+
+
+parser = argparse.ArgumentParser(prog="tfs replay", description="Plays back a recording made with 'tfs --record'")
+parser.add_argument("path", help="The recording to play")
+parser.add_argument(
+    "-r",
+    "--refresh-rate",
+    type=int,
+    default=60,
+    help="The number of ticks per second to play. 0 for as fast as possible",
+)
+parser.add_argument(
+    "-f",
+    "--frame-rate",
+    type=int,
+    default=0,
+    help="The number of frames per second to render. 0 renders after every tick",
+)
+parser.add_argument("--seek", type=int, default=0, help="The tick to start playing from")
+parser.add_argument(
+    "-d",
+    "--duration",
+    type=int,
+    default=0,
+    help="The number of ticks to play. 0 plays to the end of the recording",
+)
+parser.add_argument(
+    "-n",
+    "--no-render",
+    dest="render",
+    action="store_false",
+    default=True,
+    help="Plays the recording headless, e.g. to time it",
+)
+parser.add_argument("--renderer", choices=["rich", "diff"], default="rich", help="How to render to the terminal")
+parser.add_argument(
+    "-t",
+    "--threaded",
+    action="store_true",
+    default=False,
+    help="Renders frames on a separate thread",
+)
+parser.add_argument("-z", "--scale", type=int, default=1, help="Renders an overview of the recording at this scale")
+parser.add_argument(
+    "--export",
+    default=None,
+    help="Exports frames as images: streamed to this file ('-' for standard output), or one file per frame if this is "
+    "a directory. See 'tfs --help'",
+)
+parser.add_argument(
+    "--export-format", choices=["rgb", "ppm", "png"], default="ppm", help="When exporting, how frames are encoded"
+)
+parser.add_argument("--export-every", type=int, default=1, help="When exporting, the number of ticks between frames")
+parser.add_argument(
+    "--export-scale", type=int, default=1, help="When exporting, the number of pixels across each cell is drawn as"
+)
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    """Plays back a recording from the command line"""
+    from rich.console import Console
+
+    from .simulation import schedule
+    from .viewport import Viewport
+
+    options = parser.parse_args(argv)
+    with ExitStack() as stack:
+        replay = stack.enter_context(Replay(options.path))
+        replay.seek(options.seek)
+        remaining = replay.ticks - replay.tick
+        duration = min(options.duration, remaining) if options.duration else remaining
+
+        viewport = None
+        if options.render:
+            console = Console()
+            width = min(console.width, replay.max_coord.x + 1)
+            height = min(console.height * 2, replay.max_coord.y + 1)
+            viewport = Viewport(replay, width, height, scale=options.scale or 1)
+
+        step = replay.step
+        if options.export is not None:
+            from .export import FrameExporter
+
+            exporter = stack.enter_context(
+                FrameExporter(replay, options.export, options.export_format, options.export_every, options.export_scale)
+            )
+            step = partial(exporter.step, step)
+
+        stats = schedule(
+            step,
+            viewport,
+            duration,
+            options.refresh_rate,
+            options.renderer,
+            options.frame_rate,
+            options.threaded,
+        )
+    print(
+        f"{stats.ticks} ticks at {stats.ticks_per_second:.1f}/s, "
+        f"{stats.frames} frames at {stats.frames_per_second:.1f}/s ({stats.skipped_frames} skipped)",
+        file=sys.stderr,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""Turns regions of a grid into the coordinates of the cells inside them, for spawning elements in bulk
+
+Every function returns the cells as a pair of int arrays (xs, ys), clipped to a 'xmax' x 'ymax' grid. See
+Simulation.spawn_rect and the like.
+"""
+
+from typing import Iterable, Sequence, Union
+
+import numpy as np
+
+from .coordinate import Coordinate
+
+Cells = tuple[np.ndarray, np.ndarray]
+
+
+def rect(x0: int, y0: int, x1: int, y1: int, xmax: int, ymax: int) -> Cells:
+    """Returns the cells of a rectangle
+
+    Args:
+        x0 (int): The first column of the rectangle
+        y0 (int): The first row of the rectangle
+        x1 (int): The column after the last of the rectangle
+        y1 (int): The row after the last of the rectangle
+        xmax (int): The width of the grid
+        ymax (int): The height of the grid
+    """
+    x0, x1 = max(x0, 0), min(x1, xmax)
+    y0, y1 = max(y0, 0), min(y1, ymax)
+    if x0 >= x1 or y0 >= y1:
+        return (np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp))
+    ys, xs = np.mgrid[y0:y1, x0:x1]
+    return (xs.reshape(-1), ys.reshape(-1))
+
+
+def mask(mask: np.ndarray, x: int, y: int, xmax: int, ymax: int) -> Cells:
+    """Returns the cells set in a boolean mask
+
+    Args:
+        mask (np.ndarray): The mask, indexed [y, x]
+        x (int): The column of the grid the left edge of the mask lies on
+        y (int): The row of the grid the top edge of the mask lies on
+        xmax (int): The width of the grid
+        ymax (int): The height of the grid
+    """
+    ys, xs = np.nonzero(mask)
+    return _clip(xs + x, ys + y, xmax, ymax)
+
+
+def polygon(vertices: Sequence[tuple[float, float]], xmax: int, ymax: int) -> Cells:
+    """Returns the cells whose centers lie inside a polygon, by the even-odd rule
+
+    Args:
+        vertices (Sequence[tuple[float, float]]): The x/y corners of the polygon, in order. The last connects back to
+                                                  the first
+        xmax (int): The width of the grid
+        ymax (int): The height of the grid
+    """
+    corners = np.asarray(vertices, dtype=np.float64).reshape(-1, 2)
+    if len(corners) < 3:
+        raise ValueError("A polygon needs at least 3 vertices")
+    x0, y0 = np.floor(corners.min(axis=0)).astype(int)
+    x1, y1 = np.ceil(corners.max(axis=0)).astype(int) + 1
+    xs, ys = rect(x0, y0, x1, y1, xmax, ymax)
+    cx = xs + 0.5
+    cy = ys + 0.5
+
+    inside = np.zeros(len(xs), dtype=bool)
+    for (ax, ay), (bx, by) in zip(corners, np.roll(corners, -1, axis=0)):
+        if ay == by:
+            continue
+        crosses = (ay > cy) != (by > cy)
+        inside ^= crosses & (cx < ax + (cy - ay) * (bx - ax) / (by - ay))
+    return (xs[inside], ys[inside])
+
+
+def coords(coords: Union[np.ndarray, Iterable[Union[Coordinate, tuple[int, int]]]], xmax: int, ymax: int) -> Cells:
+    """Returns the cells at some coordinates, in the order given
+
+    Args:
+        coords (Union[np.ndarray, Iterable]): The coordinates, as an [n, 2] array of x/y pairs, or an iterable of
+                                              Coordinates or (x, y) tuples
+        xmax (int): The width of the grid
+        ymax (int): The height of the grid
+    """
+    if not isinstance(coords, np.ndarray):
+        coords = [(c.x, c.y) if isinstance(c, Coordinate) else c for c in coords]
+    pairs = np.asarray(coords, dtype=np.intp).reshape(-1, 2)
+    return _clip(pairs[:, 0], pairs[:, 1], xmax, ymax)
+
+
+def around(xs: np.ndarray, ys: np.ndarray, xmax: int, ymax: int) -> Cells:
+    """Returns the cells next to or at any of some cells: their 3x3 neighborhoods, each cell once
+
+    Args:
+        xs (np.ndarray): The column of each cell. Every cell must be inside the grid
+        ys (np.ndarray): The row of each cell
+        xmax (int): The width of the grid
+        ymax (int): The height of the grid
+    """
+    if not len(xs):
+        return (xs, ys)
+    x0, x1 = max(int(xs.min()) - 1, 0), min(int(xs.max()) + 2, xmax)
+    y0, y1 = max(int(ys.min()) - 1, 0), min(int(ys.max()) + 2, ymax)
+    marked = np.zeros((y1 - y0 + 2, x1 - x0 + 2), dtype=bool)
+    marked[ys - y0 + 1, xs - x0 + 1] = True
+    grown = marked[1:-1, 1:-1].copy()
+    for dy in (-1, 0, 1):
+        for dx in (-1, 0, 1):
+            grown |= marked[1 + dy : marked.shape[0] - 1 + dy, 1 + dx : marked.shape[1] - 1 + dx]
+    ys, xs = np.nonzero(grown)
+    return (xs + x0, ys + y0)
+
+
+def _clip(xs: np.ndarray, ys: np.ndarray, xmax: int, ymax: int) -> Cells:
+    """Drops the cells outside the grid"""
+    inside = (xs >= 0) & (xs < xmax) & (ys >= 0) & (ys < ymax)
+    if inside.all():
+        return (xs, ys)
+    return (xs[inside], ys[inside])
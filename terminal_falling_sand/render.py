@@ -0,0 +1,124 @@
+"""Hosts the DiffRenderer class, which redraws only the parts of the terminal that changed since the last frame
+
+Rendering through rich.live.Live rewrites the whole screen every frame, even if only a handful of cells moved. The
+DiffRenderer instead keeps the last frame it drew, and writes cursor-positioned escape sequences for the glyphs that
+changed since then.
+"""
+
+import sys
+from typing import Optional, TextIO, Union
+
+import numpy as np
+from rich.color import ColorSystem
+from rich.console import COLOR_SYSTEMS, Console
+
+from .grid import CellGrid
+from .matrix import CellMatrix
+from .palette import GLYPH, Palette
+
+MAX_GAP = 3
+
+
+class DiffRenderer:
+    """Renders a matrix to the terminal, writing only the glyphs that changed since the last frame
+
+    Like CellMatrix.__rich_console__, each glyph draws two cells: the upper one as its background and the lower one as its
+    foreground. Changed glyphs on the same line are merged into runs, each of which costs one cursor move. Gaps of up to
+    MAX_GAP unchanged glyphs are redrawn rather than jumped over, since that's no more expensive than moving the cursor.
+    Within a run, colors are only written when they differ from the previous glyph's.
+
+    Use as a context manager: entering switches to the terminal's alternate screen, exiting restores it.
+
+    Attributes:
+        file (TextIO): The file frames are written to
+        color_system (ColorSystem): The color system colors are downgraded to
+        palette (Palette): Caches the escape parameters for each color
+        frame_bytes (int): The number of bytes written for the last frame
+        total_bytes (int): The number of bytes written for every frame so far
+
+    """
+
+    def __init__(self, file: Optional[TextIO] = None, color_system: Optional[ColorSystem] = None) -> None:
+        """Initializes an instance of the DiffRenderer class
+
+        Args:
+            file (TextIO): The file to write frames to. Defaults to stdout
+            color_system (ColorSystem): The color system to use. Defaults to the one rich detects for the terminal
+        """
+        self.file = sys.stdout if file is None else file
+        if color_system is None:
+            detected = Console(file=self.file, force_terminal=True).color_system
+            color_system = COLOR_SYSTEMS.get(detected, ColorSystem.STANDARD)
+        self.color_system = color_system
+        self.palette = Palette(color_system)
+        self.frame_bytes = 0
+        self.total_bytes = 0
+
+        self._previous: Optional[np.ndarray] = None
+
+    def __enter__(self) -> "DiffRenderer":
+        self._previous = None
+        self.file.write("\x1b[?1049h\x1b[?25l\x1b[2J")
+        self.file.flush()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.file.write("\x1b[0m\x1b[?25h\x1b[?1049l")
+        self.file.flush()
+
+    def render(self, matrix: Union[CellMatrix, CellGrid]) -> int:
+        """Writes the glyphs that changed since the last frame
+
+        The first frame, and any frame after the matrix changes shape, is drawn in full.
+
+        Args:
+            matrix (Union[CellMatrix, CellGrid]): The matrix to render
+
+        Returns:
+            The number of bytes written
+        """
+        colors = matrix.color_indices()
+        height = colors.shape[0] // 2 * 2
+        pairs = (colors[0:height:2].astype(np.uint32) << 16) | colors[1:height:2]
+        if self._previous is None or self._previous.shape != pairs.shape:
+            changed = np.ones(pairs.shape, dtype=bool)
+        else:
+            changed = pairs != self._previous
+        self._previous = pairs
+
+        foreground = self.palette.foreground
+        background = self.palette.background
+        out = []
+        for y in np.flatnonzero(changed.any(axis=1)).tolist():
+            columns = np.flatnonzero(changed[y])
+            breaks = np.flatnonzero(np.diff(columns) > MAX_GAP + 1)
+            starts = columns[np.concatenate(([0], breaks + 1))].tolist()
+            ends = columns[np.concatenate((breaks, [-1]))].tolist()
+            row = pairs[y]
+            for start, end in zip(starts, ends):
+                out.append(f"\x1b[{y + 1};{start + 1}H")
+                last_bg = last_fg = -1
+                for pair in row[start : end + 1].tolist():
+                    bg = pair >> 16
+                    fg = pair & 0xFFFF
+                    if bg != last_bg and fg != last_fg:
+                        out.append(f"\x1b[{background(bg)};{foreground(fg)}m")
+                    elif bg != last_bg:
+                        out.append(f"\x1b[{background(bg)}m")
+                    elif fg != last_fg:
+                        out.append(f"\x1b[{foreground(fg)}m")
+                    last_bg = bg
+                    last_fg = fg
+                    out.append(GLYPH)
+
+        if not out:
+            self.frame_bytes = 0
+            return 0
+
+        out.append("\x1b[0m")
+        frame = "".join(out)
+        self.file.write(frame)
+        self.file.flush()
+        self.frame_bytes = len(frame.encode("utf-8"))
+        self.total_bytes += self.frame_bytes
+        return self.frame_bytes
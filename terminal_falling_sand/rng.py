@@ -0,0 +1,193 @@
+"""Hosts the BulkRandom class, the seedable source of randomness behind each simulation
+
+Stepping a simulation draws a random number for every tie between two valid neighbors, and spawning draws one for every
+color picked. Drawing these one at a time from the 'random' module costs a few hundred nanoseconds each and can't be
+seeded per simulation. A BulkRandom instead generates them in bulk with NumPy and hands them out one by one.
+"""
+
+from itertools import islice
+from typing import Any, Callable, Iterator, Optional, Sequence, TypeVar
+
+import numpy as np
+
+BUFFER_SIZE = 4096
+
+T = TypeVar("T")
+
+
+class _Buffer:
+    """Hands out values generated BUFFER_SIZE at a time, remembering enough to rebuild its position"""
+
+    def __init__(
+        self, generator: np.random.Generator, fill: Callable[[np.random.Generator], np.ndarray], dtype: type
+    ) -> None:
+        self.generator = generator
+        self.fill = fill
+        self.array = np.empty(0, dtype=dtype)
+        self.items: list = []
+        self.values: Iterator = iter(())
+        self.refill_state: Optional[dict] = None
+
+    def refill(self) -> None:
+        self.refill_state = self.generator.bit_generator.state
+        self.array = self.fill(self.generator)
+        self.items = self.array.tolist()
+        self.values = iter(self.items)
+
+    def position(self) -> int:
+        return BUFFER_SIZE - self.values.__length_hint__() if self.refill_state is not None else 0
+
+
+class BulkRandom:
+    """A seedable random number generator serving single draws from pre-generated buffers
+
+    Two BulkRandoms created with the same seed, and asked for the same draws in the same order, return the same values.
+    Since every bit of randomness in a simulation comes from its BulkRandom, the same seed builds and steps the same
+    world.
+
+    Attributes:
+        seed (Optional[int]): The seed the generator was created with. None if it was seeded from the OS
+        generator (np.random.Generator): The underlying NumPy generator. Can be drawn from directly for draws that are
+                                         already in bulk, e.g. by BatchedCellGrid
+
+    """
+
+    def __init__(self, seed: Optional[int] = None) -> None:
+        """Initializes an instance of the BulkRandom class
+
+        Args:
+            seed (int): The seed. Defaults to None, which seeds from the OS
+        """
+        self.seed = seed
+        self.generator = np.random.default_rng(seed)
+        self._coins = _Buffer(self.generator, lambda g: g.integers(0, 2, BUFFER_SIZE, dtype=np.uint8), np.uint8)
+        self._words = _Buffer(self.generator, lambda g: g.integers(0, 2**32, BUFFER_SIZE, dtype=np.uint64), np.uint64)
+        self._floats = _Buffer(self.generator, lambda g: g.random(BUFFER_SIZE), np.float64)
+
+    def coin(self) -> int:
+        """Returns 0 or 1 with equal probability"""
+        try:
+            return next(self._coins.values)
+        except StopIteration:
+            self._coins.refill()
+            return next(self._coins.values)
+
+    def index(self, n: int) -> int:
+        """Returns an integer from 0 up to (but not including) n
+
+        Args:
+            n (int): The number of possible values. At most 2**32
+        """
+        try:
+            return next(self._words.values) % n
+        except StopIteration:
+            self._words.refill()
+            return next(self._words.values) % n
+
+    def random(self) -> float:
+        """Returns a float from 0 up to (but not including) 1"""
+        try:
+            return next(self._floats.values)
+        except StopIteration:
+            self._floats.refill()
+            return next(self._floats.values)
+
+    def choice(self, seq: Sequence[T]) -> T:
+        """Returns an item of a sequence. Doesn't draw anything if the sequence only has one item
+
+        Args:
+            seq (Sequence): A non-empty sequence
+        """
+        return seq[self.index(len(seq))] if len(seq) > 1 else seq[0]
+
+    def indices(self, n: int, size: int) -> np.ndarray:
+        """Returns an array of 'size' integers from 0 up to (but not including) n, drawn at once
+
+        Like 'choice', doesn't draw anything if n is 1.
+
+        Args:
+            n (int): The number of possible values
+            size (int): The number of integers
+        """
+        if n == 1:
+            return np.zeros(size, dtype=np.intp)
+        return self.generator.integers(0, n, size, dtype=np.intp)
+
+    def pending_coins(self, refill: bool = False) -> np.ndarray:
+        """Returns the results of 'coin' left in its current buffer, in order, without drawing them
+
+        Lets code that can't call 'coin' (e.g. a compiled kernel) use the same coins, then draw however many it used
+        with 'skip_coins'. Once they run out, it can ask again with 'refill' set: the buffer is refilled only if it's
+        empty, and only when asked to, just as 'coin' refills it only once a coin is actually drawn. Nothing else is
+        drawn from the generator in between, so draws of other kinds stay the same too.
+
+        Args:
+            refill (bool): Whether to refill the buffer if it's empty. Defaults to False
+
+        Returns:
+            A view of the coins left in the buffer, which may be empty unless 'refill' is set
+        """
+        buffer = self._coins
+        if refill and not buffer.values.__length_hint__():
+            buffer.refill()
+        return buffer.array[buffer.position() :]
+
+    def skip_coins(self, n: int) -> None:
+        """Draws n coins, as n calls to 'coin' would, and throws them away
+
+        Args:
+            n (int): The number of coins
+        """
+        buffer = self._coins
+        while n:
+            left = buffer.values.__length_hint__()
+            if not left:
+                buffer.refill()
+                left = BUFFER_SIZE
+            taken = min(n, left)
+            next(islice(buffer.values, taken, taken), None)
+            n -= taken
+
+    def sample(self, size: int, density: float) -> np.ndarray:
+        """Returns a boolean array of 'size' values, each True with probability 'density', drawn at once
+
+        Doesn't draw anything if density is 0 or 1.
+
+        Args:
+            size (int): The number of values
+            density (float): The probability of each being True
+        """
+        if density >= 1:
+            return np.ones(size, dtype=bool)
+        if density <= 0:
+            return np.zeros(size, dtype=bool)
+        return self.generator.random(size) < density
+
+    def getstate(self) -> dict[str, Any]:
+        """Returns the state of the generator as JSON-serializable values, to be passed to 'setstate'
+
+        Rather than the unused part of each buffer, the generator's state when the buffer was filled is kept, along with
+        how far into it the generator has got.
+        """
+        return {
+            "seed": self.seed,
+            "generator": self.generator.bit_generator.state,
+            "buffers": [[b.refill_state, b.position()] for b in (self._coins, self._words, self._floats)],
+        }
+
+    def setstate(self, state: dict[str, Any]) -> None:
+        """Restores a state returned by 'getstate'
+
+        Args:
+            state (dict[str, Any]): The state to restore
+        """
+        self.seed = state["seed"]
+        for buffer, (refill_state, position) in zip((self._coins, self._words, self._floats), state["buffers"]):
+            if refill_state is None:
+                buffer.values = iter(())
+                buffer.refill_state = None
+                continue
+            self.generator.bit_generator.state = refill_state
+            buffer.refill()
+            next(islice(buffer.values, position, position), None)
+        self.generator.bit_generator.state = state["generator"]
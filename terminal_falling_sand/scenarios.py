@@ -1,52 +1,105 @@
-"""A module for storing commonly used scenarios"""
+"""A module for storing commonly used scenarios
 
-import random
+Every scenario is registered in SCENARIOS by name, and only builds its world when called. Importing this module is
+cheap: the simulation itself (and with it NumPy and rich) is only imported once a scenario is built.
 
-from rich.console import Console
+Every scenario takes the same keyword arguments: the 'engine' (and 'workers') to run on, the grid's size ('xmax' and
+'ymax', defaulting to the terminal's), the 'seed', and a 'density' that scales how densely the scenario fills its
+regions of sand and water. scenario_2 spawns single cells, so ignores 'density'.
+"""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Callable, Optional
 
 from . import elements
 from .coordinate import Coordinate
-from .simulation import Simulation
 
+if TYPE_CHECKING:
+    from .simulation import Simulation
+
+SCENARIOS: dict[str, Callable[..., Simulation]] = {}
+
+
+def register(scenario: Callable[..., Simulation]) -> Callable[..., Simulation]:
+    """Registers a scenario in SCENARIOS under its function's name"""
+    SCENARIOS[scenario.__name__] = scenario
+    return scenario
+
+
+def build(name: str, **kwargs) -> Simulation:
+    """Builds a registered scenario
+
+    Args:
+        name (str): The scenario's name in SCENARIOS
+        **kwargs: Passed on to the scenario (engine, workers, xmax, ymax, seed, density)
 
-def get_console_parameters():
-    """Gets the xmax and ymax for the terminal's dimensions"""
-    console = Console()
-    xmax = console.width
-    ymax = console.height * 2
+    Returns:
+        The scenario's simulation
+    """
+    try:
+        scenario = SCENARIOS[name]
+    except KeyError:
+        raise ValueError(f"Unknown scenario {name!r}. Expected one of {tuple(SCENARIOS)}") from None
+    return scenario(**kwargs)
+
+
+def get_console_parameters(xmax: Optional[int] = None, ymax: Optional[int] = None) -> tuple[int, int]:
+    """Gets the xmax and ymax for the terminal's dimensions, unless given explicitly"""
+    if xmax is None or ymax is None:
+        from rich.console import Console
+
+        console = Console()
+        if xmax is None:
+            xmax = console.width
+        if ymax is None:
+            ymax = console.height * 2
     return (xmax, ymax)
 
 
-def scenario_1() -> Simulation:
+def _simulation(xmax: int, ymax: int, engine: str, workers: Optional[int], seed: Optional[int]) -> Simulation:
+    """Creates an empty Simulation, importing the simulation module on first use"""
+    from .simulation import Simulation
+
+    return Simulation(xmax, ymax, engine=engine, workers=workers, seed=seed)
+
+
+@register
+def scenario_1(
+    engine: str = "list",
+    workers: Optional[int] = None,
+    xmax: Optional[int] = None,
+    ymax: Optional[int] = None,
+    seed: Optional[int] = None,
+    density: float = 1.0,
+) -> Simulation:
     """Two small hills with some water"""
-    xmax, ymax = get_console_parameters()
-    sim = Simulation()
-
-    for x in range(xmax // 4, int(xmax * 0.5)):
-        for y in range(int(ymax * 0.6), ymax):
-            if random.randint(0, 1) == 1:
-                c = Coordinate(x, y)
-                sim.spawn(elements.Sand, c)
-
-    for x in range(int(xmax * 0.5), int(xmax * 0.75)):
-        for y in range(int(ymax * 0.4), int(ymax * 0.6)):
-            if random.randint(0, 1) == 1:
-                c = Coordinate(x, y)
-                sim.spawn(elements.Sand, c)
-
-    for x in range(xmax // 4, int(xmax * 0.5)):
-        for y in range(int(ymax * 0.4), int(ymax * 0.6)):
-            if random.randint(0, 1) == 1:
-                c = Coordinate(x, y)
-                sim.spawn(elements.Water, c)
+    xmax, ymax = get_console_parameters(xmax, ymax)
+    sim = _simulation(xmax, ymax, engine, workers, seed)
+
+    sim.spawn_rect(elements.Sand, xmax // 4, int(ymax * 0.6), int(xmax * 0.5), ymax, density=0.5 * density)
+    sim.spawn_rect(
+        elements.Sand, int(xmax * 0.5), int(ymax * 0.4), int(xmax * 0.75), int(ymax * 0.6), density=0.5 * density
+    )
+    sim.spawn_rect(
+        elements.Water, xmax // 4, int(ymax * 0.4), int(xmax * 0.5), int(ymax * 0.6), density=0.5 * density
+    )
 
     return sim
 
 
-def scenario_2() -> Simulation:
+@register
+def scenario_2(
+    engine: str = "list",
+    workers: Optional[int] = None,
+    xmax: Optional[int] = None,
+    ymax: Optional[int] = None,
+    seed: Optional[int] = None,
+    density: float = 1.0,
+) -> Simulation:
     """A single cell of water with one available space for movement"""
-    xmax, ymax = get_console_parameters()
-    sim = Simulation()
+    xmax, ymax = get_console_parameters(xmax, ymax)
+    sim = _simulation(xmax, ymax, engine, workers, seed)
     rock_coords = [
         Coordinate(xmax // 2, ymax - 1),
         Coordinate(xmax // 2 + 3, ymax - 1),
@@ -59,10 +112,18 @@ def scenario_2() -> Simulation:
     return sim
 
 
-def scenario_3() -> Simulation:
+@register
+def scenario_3(
+    engine: str = "list",
+    workers: Optional[int] = None,
+    xmax: Optional[int] = None,
+    ymax: Optional[int] = None,
+    seed: Optional[int] = None,
+    density: float = 1.0,
+) -> Simulation:
     """Spawns an hourglass with water flowing down"""
-    xmax, ymax = get_console_parameters()
-    sim = Simulation(xmax, ymax)
+    xmax, ymax = get_console_parameters(xmax, ymax)
+    sim = _simulation(xmax, ymax, engine, workers, seed)
 
     xmin_left = xmax // 4
     xmax_left = xmax // 2 - 2
@@ -72,68 +133,92 @@ def scenario_3() -> Simulation:
     top = 6
     bottom = ymax
 
+    glass = []
     x = xmin_left
     while x < xmax_left:
-        sim.spawn(
-            elements.Glass,
-            Coordinate(x, bottom - 1),
-        )
-        sim.spawn(
-            elements.Glass,
-            Coordinate(x, bottom - 2),
-        )
-
-        sim.spawn(
-            elements.Glass,
-            Coordinate(xmax - x - 2, bottom - 1),
-        )
-        sim.spawn(
-            elements.Glass,
-            Coordinate(xmax - x - 2, bottom - 2),
-        )
-
-        sim.spawn(
-            elements.Glass,
-            Coordinate(x, top),
-        )
-        sim.spawn(
-            elements.Glass,
-            Coordinate(x, top - 1),
-        )
-
-        sim.spawn(
-            elements.Glass,
-            Coordinate(xmax - x - 2, top),
-        )
-        sim.spawn(
-            elements.Glass,
-            Coordinate(xmax - x - 2, top - 1),
-        )
+        glass += [
+            (x, bottom - 1),
+            (x, bottom - 2),
+            (xmax - x - 2, bottom - 1),
+            (xmax - x - 2, bottom - 2),
+            (x, top),
+            (x, top - 1),
+            (xmax - x - 2, top),
+            (xmax - x - 2, top - 1),
+        ]
 
         x += 1
         bottom -= 1
         top += 1
 
-    for x in range(xmin_left, xmax_right + 7):
-        sim.spawn(elements.Glass, Coordinate(xmax - x - 3, ymax - 1))
+    glass += [(xmax - x - 3, ymax - 1) for x in range(xmin_left, xmax_right + 7)]
+    sim.spawn_coords(elements.Glass, glass)
 
     # parameters for water coords
     top = 5
     x_start = xmax // 2 - 34
     x_end = xmax // 2 + 33
-    y_start = top
-    y_end = ymax // 2 - 5
+    rows = min(ymax // 2 - 5 - top, (x_end - x_start + 1) // 2)
 
-    # Spawn water at the top of the hourglass
-    for y in range(y_start, y_end):
-        for x in range(x_start, x_end):
-            sim.spawn(elements.Water, Coordinate(x, y))
-        x_start += 1
-        x_end -= 1
+    # Spawn water at the top of the hourglass, narrowing by a cell on each side per row
+    for r in range(rows):
+        sim.spawn_rect(elements.Water, x_start + r, top + r, x_end - r, top + r + 1, density)
 
     return sim
 
 
-SCENARIO_1 = scenario_1()
-SCENARIO_2 = scenario_2()
-SCENARIO_3 = scenario_3()
+@register
+def full_sand(
+    engine: str = "list",
+    workers: Optional[int] = None,
+    xmax: Optional[int] = None,
+    ymax: Optional[int] = None,
+    seed: Optional[int] = None,
+    density: float = 1.0,
+) -> Simulation:
+    """The top half of the grid is solid sand, falling into the empty bottom half"""
+    xmax, ymax = get_console_parameters(xmax, ymax)
+    sim = _simulation(xmax, ymax, engine, workers, seed)
+
+    sim.spawn_rect(elements.Sand, 0, 0, xmax, ymax // 2, density)
+
+    return sim
+
+
+@register
+def full_water(
+    engine: str = "list",
+    workers: Optional[int] = None,
+    xmax: Optional[int] = None,
+    ymax: Optional[int] = None,
+    seed: Optional[int] = None,
+    density: float = 1.0,
+) -> Simulation:
+    """The top half of the grid is solid water, falling into the empty bottom half"""
+    xmax, ymax = get_console_parameters(xmax, ymax)
+    sim = _simulation(xmax, ymax, engine, workers, seed)
+
+    sim.spawn_rect(elements.Water, 0, 0, xmax, ymax // 2, density)
+
+    return sim
+
+
+@register
+def sparse_rain(
+    engine: str = "list",
+    workers: Optional[int] = None,
+    xmax: Optional[int] = None,
+    ymax: Optional[int] = None,
+    seed: Optional[int] = None,
+    density: float = 1.0,
+) -> Simulation:
+    """Scattered drops of water and grains of sand falling onto a floor of rock"""
+    xmax, ymax = get_console_parameters(xmax, ymax)
+    sim = _simulation(xmax, ymax, engine, workers, seed)
+
+    sim.spawn_rect(elements.Rock, 0, ymax - 1, xmax, ymax)
+    sim.spawn_rect(elements.Water, 0, 0, xmax, ymax - 1, density=0.025 * density)
+    sim.spawn_rect(elements.Sand, 0, 0, xmax, ymax - 1, density=0.025 * density)
+
+    return sim
+
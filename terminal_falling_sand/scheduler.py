@@ -0,0 +1,240 @@
+"""Hosts the Scheduler class, which paces a simulation's physics and rendering independently of one another"""
+
+from dataclasses import dataclass
+from threading import Event, Thread
+from time import perf_counter, sleep
+from typing import Callable, Optional, Union
+
+import numpy as np
+from rich.console import Console, ConsoleOptions, RenderResult
+
+from .palette import RICH_PALETTE
+
+
+@dataclass(slots=True)
+class SchedulerStats:
+    """What a Scheduler achieved over a run
+
+    Attributes:
+        ticks (int): The number of times the simulation was stepped
+        frames (int): The number of frames drawn
+        skipped_frames (int): The number of frames that were due but skipped, so the physics could catch up
+        elapsed (float): The wall clock time the run took, in seconds
+    """
+
+    ticks: int = 0
+    frames: int = 0
+    skipped_frames: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def ticks_per_second(self) -> float:
+        """The achieved tick rate"""
+        return self.ticks / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def frames_per_second(self) -> float:
+        """The achieved frame rate"""
+        return self.frames / self.elapsed if self.elapsed else 0.0
+
+
+class Snapshot:
+    """A copy of a matrix's colors, which can be drawn while the matrix itself keeps stepping
+
+    Renders the same way a CellGrid does, and exposes the same color_indices method, so anything that can draw a
+    matrix can draw a Snapshot.
+
+    Attributes:
+        matrix (Union[CellMatrix, CellGrid]): The matrix snapshots are taken of
+        max_coord (Coordinate): The maximum valid coordinate found in the matrix
+        color (np.ndarray): The index of each cell's color, as of the last capture
+    """
+
+    def __init__(self, matrix) -> None:
+        """Initializes an instance of the Snapshot class
+
+        Args:
+            matrix (Union[CellMatrix, CellGrid]): The matrix to take snapshots of
+        """
+        self.matrix = matrix
+        self.max_coord = matrix.max_coord
+        self.color = np.array(matrix.color_indices(), dtype=np.uint16)
+
+    def capture(self) -> None:
+        """Copies the matrix's current colors into the snapshot's buffer"""
+        np.copyto(self.color, self.matrix.color_indices())
+
+    def color_indices(self) -> np.ndarray:
+        """Returns the index of each cell's color as of the last capture, indexed [y, x]"""
+        return self.color
+
+    def __rich_console__(self, console: Console, options: ConsoleOptions) -> RenderResult:
+        """Renders the snapshot using the Rich Console Protocol. See CellMatrix.__rich_console__"""
+        yield from RICH_PALETTE.segments(self.color)
+
+
+class RenderThread(Thread):
+    """Draws snapshots of a matrix on a background thread
+
+    The physics only pays for copying the matrix's colors into a Snapshot. If the previous snapshot is still being
+    drawn when the next frame is due, that frame is skipped rather than waited for.
+
+    If drawing a snapshot raises, the thread stops, and the exception is raised again from the next 'submit' or 'stop'.
+    """
+
+    def __init__(self, matrix, draw: Callable[[Snapshot], None]) -> None:
+        """Initializes an instance of the RenderThread class
+
+        Args:
+            matrix (Union[CellMatrix, CellGrid]): The matrix to draw snapshots of
+            draw (Callable[[Snapshot], None]): Draws a snapshot
+        """
+        super().__init__(daemon=True)
+        self.snapshot = Snapshot(matrix)
+        self._draw = draw
+        self._pending = Event()
+        self._idle = Event()
+        self._idle.set()
+        self._stopping = False
+        self._error: Optional[BaseException] = None
+
+    def submit(self) -> bool:
+        """Captures a snapshot and hands it to the thread to draw
+
+        Returns:
+            False if the thread was still drawing the last snapshot (or has stopped), in which case nothing is captured
+
+        Raises:
+            BaseException: Whatever drawing the last snapshot raised, if it did
+        """
+        self._raise_error()
+        if not self._idle.is_set() or not self.is_alive():
+            return False
+        self.snapshot.capture()
+        self._idle.clear()
+        self._pending.set()
+        return True
+
+    def stop(self) -> None:
+        """Waits for the snapshot being drawn, if any, then stops the thread
+
+        Raises:
+            BaseException: Whatever drawing the last snapshot raised, if it did and 'submit' hasn't raised it already
+        """
+        self._idle.wait()
+        self._stopping = True
+        self._pending.set()
+        self.join()
+        self._raise_error()
+
+    def _raise_error(self) -> None:
+        """Raises what drawing a snapshot raised, once"""
+        error, self._error = self._error, None
+        if error is not None:
+            raise error
+
+    def run(self) -> None:
+        while True:
+            self._pending.wait()
+            self._pending.clear()
+            if self._stopping:
+                return
+            try:
+                self._draw(self.snapshot)
+            except BaseException as error:
+                self._error = error
+                return
+            finally:
+                self._idle.set()
+
+
+class Scheduler:
+    """Steps a simulation at a fixed tick rate, and draws it at its own frame rate
+
+    Ticks are scheduled against the clock rather than slept for, so the time spent stepping and drawing doesn't slow
+    the simulation down. If the physics falls behind it's allowed to catch up by stepping back to back, at most
+    'max_catch_up' ticks at a time before the backlog is dropped. While it's catching up, frames that fall due are
+    skipped, up to 'max_frame_skip' in a row so the screen doesn't freeze entirely.
+
+    Attributes:
+        tick_rate (float): The number of ticks per second. 0 runs the physics as fast as possible
+        frame_rate (float): The number of frames per second. 0 draws a frame after every tick
+        max_catch_up (int): The largest backlog of ticks the physics will try to catch up on
+        max_frame_skip (int): The largest number of consecutive frames that can be skipped
+        stats (SchedulerStats): What the scheduler achieved over its last run
+    """
+
+    def __init__(
+        self,
+        step: Callable[[], None],
+        draw: Optional[Callable[[], Optional[bool]]] = None,
+        tick_rate: float = 0,
+        frame_rate: float = 0,
+        max_catch_up: int = 5,
+        max_frame_skip: int = 5,
+    ) -> None:
+        """Initializes an instance of the Scheduler class
+
+        Args:
+            step (Callable[[], None]): Steps the simulation once
+            draw (Callable[[], Optional[bool]]): Draws a frame. May return False if it had to skip the frame (see
+                                                 RenderThread.submit). Defaults to None, which draws nothing
+            tick_rate (float): The number of ticks per second. Defaults to 0 (as fast as possible)
+            frame_rate (float): The number of frames per second. Defaults to 0 (after every tick)
+            max_catch_up (int): The largest backlog of ticks to catch up on. Defaults to 5
+            max_frame_skip (int): The largest number of consecutive frames to skip. Defaults to 5
+        """
+        self._step = step
+        self._draw = draw
+        self.tick_rate = tick_rate
+        self.frame_rate = frame_rate
+        self.max_catch_up = max_catch_up
+        self.max_frame_skip = max_frame_skip
+        self.stats = SchedulerStats()
+
+    def run(self, duration: Union[float, int] = float("inf")) -> SchedulerStats:
+        """Runs the simulation until it has been stepped 'duration' times, or until interrupted with Ctrl+C
+
+        Args:
+            duration (Union[float, int]): The number of ticks to run for. Defaults to infinity
+
+        Returns:
+            What the scheduler achieved over the run
+        """
+        stats = self.stats = SchedulerStats()
+        tick_period = 1 / self.tick_rate if self.tick_rate else 0.0
+        frame_period = 1 / self.frame_rate if self.frame_rate else 0.0
+        start = perf_counter()
+        next_tick = next_frame = start
+        frame_tick = 0
+        skipped_in_row = 0
+
+        try:
+            while stats.ticks < duration:
+                now = perf_counter()
+                if now >= next_tick:
+                    self._step()
+                    stats.ticks += 1
+                    next_tick = max(next_tick + tick_period, now - tick_period * self.max_catch_up)
+
+                if self._draw is not None and now >= next_frame and frame_tick != stats.ticks:
+                    behind = tick_period > 0 and perf_counter() >= next_tick
+                    if (behind and skipped_in_row < self.max_frame_skip) or self._draw() is False:
+                        stats.skipped_frames += 1
+                        skipped_in_row += 1
+                    else:
+                        stats.frames += 1
+                        skipped_in_row = 0
+                    frame_tick = stats.ticks
+                    next_frame = max(next_frame + frame_period, now)
+
+                wait = next_tick - perf_counter()
+                if self._draw is not None and frame_tick != stats.ticks:
+                    wait = min(wait, next_frame - perf_counter())
+                if wait > 0:
+                    sleep(wait)
+        except KeyboardInterrupt:
+            pass
+
+        stats.elapsed = perf_counter() - start
+        return stats
@@ -1,37 +1,94 @@
 from __future__ import annotations
 
-from time import sleep
-from typing import Optional, Type, Union
+from contextlib import ExitStack
+from functools import partial
+from os import PathLike
+from typing import TYPE_CHECKING, Callable, Iterable, Optional, Sequence, Type, Union
 
-from rich.console import Console
-from rich.live import Live
+import numpy as np
 
+from . import regions
 from .coordinate import Coordinate
 from .elements import ElementType
 from .matrix import CellMatrix
+from .rng import BulkRandom
+from .scheduler import RenderThread, Scheduler, SchedulerStats
+from .viewport import ScrollKeys, Viewport
+
+if TYPE_CHECKING:
+    from .metrics import MetricsRecorder, TickMetrics
+
+ENGINES = ("list", "numpy", "vector", "parallel", "jit")
+RENDERERS = ("rich", "diff")
 
 
 class Simulation:
     """A class to run a simulation from the terminal
 
-    Default behavior is to run the simulation at the current dimensions of the terminal. Currently, this is not
-    modifiable by the user without direct interference with the underlying matrix attr
+    Default behavior is to run the simulation at the current dimensions of the terminal. The world can be made any
+    size, in which case only the part of it inside the 'viewport' is rendered (see the 'viewport' module)
 
     Attributes:
-        1. matrix (CellMatrix): The underlying cell matrix
+        1. matrix (Union[CellMatrix, CellGrid]): The underlying cell matrix
+        2. engine (str): The grid backend the matrix uses. See ENGINES
+        3. viewport (Viewport): The window onto the matrix that is rendered. None until the simulation is first rendered
+                                or 'view' is called
     """
 
-    def __init__(self, xmax: Optional[int] = None, ymax: Optional[int] = None) -> None:
-        """Initializes an instance of the Simulation class"""
+    def __init__(
+        self,
+        xmax: Optional[int] = None,
+        ymax: Optional[int] = None,
+        engine: str = "list",
+        workers: Optional[int] = None,
+        seed: Optional[int] = None,
+    ) -> None:
+        """Initializes an instance of the Simulation class
+
+        Args:
+            xmax (int): The width of the grid. Defaults to the width of the terminal
+            ymax (int): The height of the grid. Defaults to twice the height of the terminal
+            engine (str): The grid backend to use. 'list' stores a Cell object per cell (CellMatrix), 'numpy' stores
+                          cells in typed NumPy arrays (CellGrid) and 'vector' steps those arrays a row at a time
+                          (BatchedCellGrid). 'parallel' steps vertical strips of those arrays across a pool of
+                          processes (ParallelCellGrid). 'jit' steps the arrays with a loop compiled by Numba
+                          (JitCellGrid), or like 'numpy' if Numba isn't installed. Defaults to 'list'
+            workers (int): The number of worker processes for the 'parallel' engine. Defaults to the number of CPUs
+            seed (int): The seed for the simulation's random number generator (see 'rng'). The same seed builds and
+                        steps the same world. Defaults to None, which seeds from the OS
+        """
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown engine {engine!r}. Expected one of {ENGINES}")
 
         if xmax is None or ymax is None:
+            from rich.console import Console
+
             console = Console()
             if xmax is None:
                 xmax = console.width
             if ymax is None:
                 ymax = console.height * 2
 
-        self.matrix = CellMatrix(xmax, ymax)
+        self.engine = engine
+        self.viewport: Optional[Viewport] = None
+        if engine == "numpy":
+            from .grid import CellGrid
+
+            self.matrix = CellGrid(xmax, ymax, seed)
+        elif engine == "vector":
+            from .grid import BatchedCellGrid
+
+            self.matrix = BatchedCellGrid(xmax, ymax, seed)
+        elif engine == "parallel":
+            from .parallel import ParallelCellGrid
+
+            self.matrix = ParallelCellGrid(xmax, ymax, workers, seed)
+        elif engine == "jit":
+            from .jit import JitCellGrid
+
+            self.matrix = JitCellGrid(xmax, ymax, seed)
+        else:
+            self.matrix = CellMatrix(xmax, ymax, seed)
 
     def start(
         self,
@@ -39,93 +96,272 @@ class Simulation:
         duration: Union[float, int] = 0,
         render: Optional[bool] = True,
         debug=False,
-    ) -> None:
+        renderer: str = "rich",
+        frame_rate: int = 0,
+        threaded: bool = False,
+        scale: Optional[int] = None,
+        record: Optional[Union[str, PathLike]] = None,
+        keyframe_interval: int = 300,
+        metrics: Optional[Union[str, PathLike, Callable[[TickMetrics], None]]] = None,
+        export: Optional[Union[str, PathLike]] = None,
+        export_format: str = "ppm",
+        export_every: int = 1,
+        export_scale: int = 1,
+        profile: Optional[str] = None,
+        profile_output: Optional[Union[str, PathLike]] = None,
+        profile_sort: str = "cumulative",
+        profile_interval: float = 0.005,
+    ) -> SchedulerStats:
         """Sets initial parameters for the simluation, then runs it
 
         Args:
             duration (Union[float, int]): The duration the simulation should run for. Defaults to 0 (infinity)
-            refresh_rate (int): The number of times the simluation should run before sleeping. Defaults to 0
+            refresh_rate (int): The number of times per second the simulation should step. Defaults to 0 (as fast as
+                                possible)
             render (bool): Controls if the simulation renders to the terminal. Defaults to True
-            debug (bool): Controls if the simulation runs in debug mode. This will run cProfile and disable rendering
+            debug (bool): Controls if the simulation runs in debug mode. This profiles it with cProfile (unless another
+                          'profile' is given) and disables rendering
+            renderer (str): How to render to the terminal. 'rich' redraws the whole matrix through rich.live.Live, 'diff'
+                            only redraws what changed (see the 'render' module). Defaults to 'rich'
+            frame_rate (int): The number of frames per second to render. Defaults to 0 (after every step)
+            threaded (bool): Controls if frames are rendered on a separate thread. Defaults to False
+            scale (int): Renders an overview, each glyph aggregating a block of scale x scale cells. Defaults to None,
+                         which keeps the viewport's scale (see 'view')
+            record (Union[str, PathLike]): A file to record the run to. Defaults to None, which records nothing
+            keyframe_interval (int): When recording, the number of ticks between keyframes. Defaults to 300
+            metrics (Union[str, PathLike, Callable]): A callback or file to hand per-tick metrics to. See 'run'.
+                                                      Defaults to None, which collects nothing
+            export (Union[str, PathLike]): A file, directory or '-' (standard output) to export frames to as images.
+                                           See 'run'. Defaults to None, which exports nothing
+            export_format (str): When exporting, how frames are encoded: 'rgb', 'ppm' or 'png'. Defaults to 'ppm'
+            export_every (int): When exporting, the number of ticks between frames. Defaults to 1
+            export_scale (int): When exporting, the number of pixels across each cell is drawn as. Defaults to 1
+            profile (str): Profiles the run, then reports where the time went: 'cprofile' traces every call, 'sample'
+                           samples what the simulation is doing at intervals, cheaply enough to profile big worlds (see
+                           the 'profiling' module). Defaults to None, which profiles nothing
+            profile_output (Union[str, PathLike]): When profiling, a file to save the profile to: a pstats file with
+                                                   'cprofile', the report (as JSON if named '*.json') with 'sample'.
+                                                   Defaults to None, which prints the report to stderr
+            profile_sort (str): With 'cprofile', what to sort the functions reported by. Defaults to 'cumulative'
+            profile_interval (float): With 'sample', the time between samples, in seconds. Defaults to 0.005
+
+        Returns:
+            The tick and frame rates achieved
         """
-        if refresh_rate == 0:
-            sleep_for = 0
-        else:
-            sleep_for = 1 / refresh_rate
+        if renderer not in RENDERERS:
+            raise ValueError(f"Unknown renderer {renderer!r}. Expected one of {RENDERERS}")
 
         if duration == 0:
             duration = float("inf")
 
         if debug is True:
-            import cProfile
+            render = False
+            profile = profile or "cprofile"
 
-            cProfile.runctx(
-                "exec(self.run(duration, sleep_for, False))", globals(), locals()
+        if render is True:
+            run = partial(
+                self.run,
+                duration,
+                refresh_rate,
+                True,
+                renderer,
+                frame_rate,
+                threaded,
+                scale,
+                record,
+                keyframe_interval,
+                metrics,
+                export,
+                export_format,
+                export_every,
+                export_scale,
             )
 
-        elif render is True:
-            self.run(duration, sleep_for, True)
-
         else:
-            self.run(duration, sleep_for, False)
+            run = partial(
+                self.run,
+                duration,
+                refresh_rate,
+                False,
+                record=record,
+                keyframe_interval=keyframe_interval,
+                metrics=metrics,
+                export=export,
+                export_format=export_format,
+                export_every=export_every,
+                export_scale=export_scale,
+            )
+
+        if profile is None:
+            return run()
+
+        from .profiling import profile as profiled
+
+        return profiled(run, profile, profile_output, profile_sort, profile_interval)
 
     def run(
         self,
         duration: Union[float, int],
-        sleep_for: Union[float, int],
+        tick_rate: Union[float, int],
         render: bool,
-    ) -> None:
+        renderer: str = "rich",
+        frame_rate: Union[float, int] = 0,
+        threaded: bool = False,
+        scale: Optional[int] = None,
+        record: Optional[Union[str, PathLike]] = None,
+        keyframe_interval: int = 300,
+        metrics: Optional[Union[str, PathLike, Callable[[TickMetrics], None]]] = None,
+        export: Optional[Union[str, PathLike]] = None,
+        export_format: str = "ppm",
+        export_every: int = 1,
+        export_scale: int = 1,
+    ) -> SchedulerStats:
         """Runs the simulation
 
+        Stepping and rendering are paced by a Scheduler, which keeps the tick rate steady regardless of how long each
+        step or frame takes, skipping frames if need be.
+
+        What's rendered is the simulation's 'viewport', which can be scrolled from the keyboard while running (see
+        viewport.ScrollKeys). If there is no viewport yet, one the size of the terminal is created.
+
         Args:
             duration (Union[float, int]): The duration the simulation should run for
-            sleep_for (Union[float, int]): The time the simulation should sleep between each step
+            tick_rate (Union[float, int]): The number of times per second to step the simulation. 0 for no limit
             render: bool: Cotnrols if the simulation renders to the terminal
+            renderer (str): How to render to the terminal, 'rich' or 'diff'. Defaults to 'rich'
+            frame_rate (Union[float, int]): The number of frames per second to render. Defaults to 0 (after every step)
+            threaded (bool): Controls if frames are rendered from snapshots on a separate thread. Defaults to False
+            scale (int): Zooms the viewport out to this scale. Defaults to None, which leaves it as it is
+            record (Union[str, PathLike]): A file to record the run to, which can be played back with 'tfs replay'
+                                           (see the 'recording' module). Defaults to None, which records nothing
+            keyframe_interval (int): When recording, the number of ticks between keyframes. Defaults to 300
+            metrics (Union[str, PathLike, Callable]): Collects metrics on every tick, handing each TickMetrics to this
+                                                      callback or writing them to this file as JSON lines (see the
+                                                      'metrics' module). Defaults to None, which collects nothing
+            export (Union[str, PathLike]): Exports a frame every 'export_every' ticks as an image, whether or not the
+                                           run renders to the terminal: streamed to this file ('-' for standard
+                                           output), or one file per frame if it's a directory (see the 'export'
+                                           module). Defaults to None, which exports nothing
+            export_format (str): When exporting, how frames are encoded: 'rgb', 'ppm' or 'png'. Defaults to 'ppm'
+            export_every (int): When exporting, the number of ticks between frames. Defaults to 1
+            export_scale (int): When exporting, the number of pixels across each cell is drawn as. Defaults to 1
+
+        Returns:
+            The tick and frame rates achieved
         """
-        elapsed = 0
+        viewport = None
         if render is True:
-            with Live(self.matrix, screen=True, auto_refresh=False) as live:
-                while elapsed < duration:
-                    self.step()
-                    live.update(self.matrix, refresh=True)
-                    sleep(sleep_for)
-                    elapsed += 1
-        else:
-            while elapsed < duration:
-                self.step()
-                sleep(sleep_for)
-                elapsed += 1
+            viewport = self.viewport or self.view()
+            if scale is not None:
+                viewport.zoom(scale)
 
-    def step(self) -> None:
-        """Steps the simulation forward once
+        step = self.step
+        with ExitStack() as stack:
+            if record is not None:
+                from .recording import Recorder
+
+                recorder = stack.enter_context(Recorder(self.matrix, record, keyframe_interval))
+                step = partial(recorder.step, step)
+
+            if export is not None:
+                from .export import FrameExporter
+
+                exporter = stack.enter_context(
+                    FrameExporter(self.matrix, export, export_format, export_every, export_scale)
+                )
+                step = partial(exporter.step, step)
+
+            timer = None
+            if metrics is not None:
+                from .metrics import MetricsRecorder
+
+                timer = stack.enter_context(MetricsRecorder(self.matrix, metrics))
+
+            return schedule(step, viewport, duration, tick_rate, renderer, frame_rate, threaded, timer)
+
+    def view(
+        self,
+        width: Optional[int] = None,
+        height: Optional[int] = None,
+        x: Optional[int] = None,
+        y: Optional[int] = None,
+        scale: int = 1,
+    ) -> Viewport:
+        """Sets up the window onto the matrix that is rendered
 
-        Explores every element in the simulation by working bottom to top, then left -> middle; right -> middle for each
-        row. Each step in the simulation calls the 'step' method on the underlying Cell type. Cell.step will determien
-        its next place in the CellMatrix and modify the CellMatrix reference passed to it accordingly.
+        Args:
+            width (int): The width of the window. Defaults to the width of the terminal, or of the matrix if smaller
+            height (int): The height of the window. Defaults to twice the height of the terminal, or the height of the
+                          matrix if smaller
+            x (int): The column at the left edge of the window. Defaults to centering the window
+            y (int): The row at the top edge of the window. Defaults to centering the window
+            scale (int): The width and height of the block of cells drawn as one glyph. Defaults to 1
+
+        Returns:
+            The new viewport, which is also stored as 'viewport'
+        """
+        if width is None or height is None:
+            from rich.console import Console
+
+            console = Console()
+            if width is None:
+                width = min(console.width, self.matrix.max_coord.x + 1)
+            if height is None:
+                height = min(console.height * 2, self.matrix.max_coord.y + 1)
+
+        self.viewport = Viewport(self.matrix, width, height, x, y, scale)
+        return self.viewport
 
-        Issue:
-            When we step each element from left -> right or right -> left, the elements on the trailing end exhibit odd
-            behavior. Specifically, elements will move diagonally and to the left (or right) depending on the order
-            we're stepping them in. Unsure of the exact cause of this, but for now, working "middle out" in either
-            direction visually solves the problem. This probably means there's some odd behavior in the middle of the
-            matrix for each step, but it's not visually identifiable. Working "middle out" is an acceptable workaround
-            for now.
+    def save(self, path: Union[str, PathLike]) -> None:
+        """Saves the state of the simulation to a checkpoint file. See the 'checkpoint' module for the format
 
-        After each cell has been stepped through, reset its updated flag to False
+        Args:
+            path (Union[str, PathLike]): The file to write to
         """
-        for y in range(self.matrix.max_coord.y + 1):
-            row = self.matrix.max_coord.y - y
-            for x in range(self.matrix.midpoint + 1):
-                element = self.matrix[row][x]
-                if element.state.ignore is False and element.updated is False:
-                    element.change_state(self.matrix)
-            midpoint_offset = self.matrix.max_coord.x - self.matrix.midpoint
-            for x in range(self.matrix.midpoint, self.matrix.max_coord.x + 1):
-                element = self.matrix[row][midpoint_offset - x]
-                if element.state.ignore is False and element.updated is False:
-                    element.change_state(self.matrix)
-
-        self.reset_updated()
+        from . import checkpoint
+
+        checkpoint.save(self, path)
+
+    @classmethod
+    def load(
+        cls, path: Union[str, PathLike], engine: Optional[str] = None, workers: Optional[int] = None
+    ) -> Simulation:
+        """Restores a simulation from a checkpoint file written by 'save'
+
+        Args:
+            path (Union[str, PathLike]): The file to read from
+            engine (str): The engine to restore the simulation on. Defaults to the engine it was saved from
+            workers (int): The number of worker processes for the 'parallel' engine. Defaults to the number of CPUs
+
+        Returns:
+            The restored simulation
+        """
+        from . import checkpoint
+
+        return checkpoint.load(path, engine, workers)
+
+    def close(self) -> None:
+        """Releases whatever the matrix holds on to, e.g. a ParallelCellGrid's worker pool. Other engines hold none"""
+        close = getattr(self.matrix, "close", None)
+        if close is not None:
+            close()
+
+    @property
+    def rng(self) -> BulkRandom:
+        """The simulation's random number generator. Scenarios should draw from it too, so a seed reproduces them"""
+        return self.matrix.rng
+
+    @property
+    def awake_chunks(self) -> int:
+        """The number of chunks of the matrix that will be stepped next step. See the 'chunks' module"""
+        return self.matrix.chunks.awake_count
+
+    def step(self) -> None:
+        """Steps the simulation forward once
+
+        Defers to the underlying matrix to step each cell. See CellMatrix.step for the order cells are visited in
+        """
+        self.matrix.step()
 
     def spawn(self, element: Type[ElementType], coord: Coordinate) -> None:
         """Spawns an element at a given x/y coordinate
@@ -135,11 +371,148 @@ class Simulation:
             coord (Coordinate): The coordinate to spawn the element at
         """
 
-        self.matrix[coord.y][coord.x] = element(coord, self.matrix.max_coord)
+        self.matrix.spawn(element, coord)
+
+    def spawn_rect(
+        self, element: Type[ElementType], x0: int, y0: int, x1: int, y1: int, density: float = 1.0
+    ) -> int:
+        """Spawns an element into a rectangle, in one batched pass
+
+        Args:
+            element (ElementType): An 'ElementType' type
+            x0 (int): The first column of the rectangle
+            y0 (int): The first row of the rectangle
+            x1 (int): The column after the last of the rectangle
+            y1 (int): The row after the last of the rectangle
+            density (float): The fraction of cells to fill, chosen at random. Defaults to 1.0, filling every cell
+
+        Returns:
+            The number of cells spawned. Cells outside the grid are skipped
+        """
+        return self._spawn_cells(element, regions.rect(x0, y0, x1, y1, *self._size), density)
+
+    def spawn_polygon(
+        self, element: Type[ElementType], vertices: Sequence[tuple[float, float]], density: float = 1.0
+    ) -> int:
+        """Spawns an element into every cell whose center lies inside a polygon, in one batched pass
+
+        Args:
+            element (ElementType): An 'ElementType' type
+            vertices (Sequence[tuple[float, float]]): The x/y corners of the polygon, in order
+            density (float): The fraction of cells to fill, chosen at random. Defaults to 1.0, filling every cell
+
+        Returns:
+            The number of cells spawned. Cells outside the grid are skipped
+        """
+        return self._spawn_cells(element, regions.polygon(vertices, *self._size), density)
+
+    def spawn_mask(
+        self, element: Type[ElementType], mask: np.ndarray, x: int = 0, y: int = 0, density: float = 1.0
+    ) -> int:
+        """Spawns an element into every cell set in a boolean mask, in one batched pass
+
+        Args:
+            element (ElementType): An 'ElementType' type
+            mask (np.ndarray): The mask, indexed [y, x]
+            x (int): The column the left edge of the mask lies on. Defaults to 0
+            y (int): The row the top edge of the mask lies on. Defaults to 0
+            density (float): The fraction of cells to fill, chosen at random. Defaults to 1.0, filling every cell
+
+        Returns:
+            The number of cells spawned. Cells outside the grid are skipped
+        """
+        return self._spawn_cells(element, regions.mask(mask, x, y, *self._size), density)
+
+    def spawn_coords(
+        self,
+        element: Type[ElementType],
+        coords: Union[np.ndarray, Iterable[Union[Coordinate, tuple[int, int]]]],
+        density: float = 1.0,
+    ) -> int:
+        """Spawns an element at many coordinates, in one batched pass
+
+        Args:
+            element (ElementType): An 'ElementType' type
+            coords (Union[np.ndarray, Iterable]): The coordinates, as an [n, 2] array of x/y pairs, or an iterable of
+                                                  Coordinates or (x, y) tuples
+            density (float): The fraction of cells to fill, chosen at random. Defaults to 1.0, filling every cell
+
+        Returns:
+            The number of cells spawned. Cells outside the grid are skipped
+        """
+        return self._spawn_cells(element, regions.coords(coords, *self._size), density)
+
+    @property
+    def _size(self) -> tuple[int, int]:
+        return (self.matrix.max_coord.x + 1, self.matrix.max_coord.y + 1)
+
+    def _spawn_cells(self, element: Type[ElementType], cells: regions.Cells, density: float) -> int:
+        """Thins out cells to the given density, then spawns the element into the rest"""
+        xs, ys = cells
+        if density < 1:
+            keep = self.rng.sample(len(xs), density)
+            xs = xs[keep]
+            ys = ys[keep]
+        self.matrix.spawn_cells(element, xs, ys)
+        return len(xs)
+
+
+def schedule(
+    step: Callable[[], None],
+    viewport: Optional[Viewport],
+    duration: Union[float, int],
+    tick_rate: Union[float, int],
+    renderer: str = "rich",
+    frame_rate: Union[float, int] = 0,
+    threaded: bool = False,
+    metrics: Optional[MetricsRecorder] = None,
+) -> SchedulerStats:
+    """Steps something with a Scheduler, rendering a viewport onto it to the terminal as it goes
+
+    Used by Simulation.run, and to play back recordings (see the 'recording' module).
+
+    Args:
+        step (Callable[[], None]): Steps whatever is being run forward once
+        viewport (Viewport): The window to render, which can be scrolled from the keyboard. None renders nothing
+        duration (Union[float, int]): The number of steps to run for
+        tick_rate (Union[float, int]): The number of steps per second. 0 for no limit
+        renderer (str): How to render to the terminal, 'rich' or 'diff'. Defaults to 'rich'
+        frame_rate (Union[float, int]): The number of frames per second to render. Defaults to 0 (after every step)
+        threaded (bool): Controls if frames are rendered from snapshots on a separate thread. Defaults to False
+        metrics (MetricsRecorder): Times each step and frame. Defaults to None, which times nothing
+
+    Returns:
+        The tick and frame rates achieved
+    """
+    if metrics is not None:
+        step = partial(metrics.step, step)
+    if viewport is None:
+        return Scheduler(step, None, tick_rate).run(duration)
+
+    if renderer == "diff":
+        from .render import DiffRenderer
+
+        screen = DiffRenderer()
+        draw = screen.render
+    else:
+        from rich.live import Live
+
+        screen = Live(viewport, screen=True, auto_refresh=False)
+
+        def draw(matrix) -> None:
+            screen.update(matrix, refresh=True)
+
+    with screen, ScrollKeys(viewport):
+        if threaded is False:
+            frame = partial(draw, viewport)
+            if metrics is not None:
+                frame = partial(metrics.draw, frame)
+            return Scheduler(step, frame, tick_rate, frame_rate).run(duration)
 
-    def reset_updated(self):
-        """Resets the 'updated' attribute for all elements in the matrix"""
-        for y in range(self.matrix.max_coord.y + 1):
-            row = self.matrix.max_coord.y - y
-            for x in range(self.matrix.max_coord.x + 1):
-                self.matrix[row][x].updated = False
+        thread = RenderThread(viewport, draw)
+        thread.start()
+        try:
+            frame = thread.submit if metrics is None else partial(metrics.draw, thread.submit)
+            return Scheduler(step, frame, tick_rate, frame_rate).run(duration)
+        finally:
+            thread.stop()
@@ -0,0 +1,385 @@
+"""Runs many headless variations of a world across a pool of processes, collecting the results into one table
+
+A sweep is every combination of the values given for each parameter of a run (see SweepRun):
+
+    {
+        "world": ["scenario_1", "full_water"],
+        "size": ["160x96", "320x192"],
+        "engine": ["numpy"],
+        "seed": [0, 1, 2],
+        "density": [0.5, 1.0],
+        "weights": [{}, {"Water": 1.5}],
+        "ticks": 2000
+    }
+
+is 48 runs of 2000 ticks each. Every run builds its world from the 'scenarios' module and steps it headless for its tick
+budget (or until nothing in it can move any more), in one of a pool of worker processes that each import the simulation
+once and then run one world after another. Each run reports:
+
+    1. The tick at which the world settled: the last tick at which any cell moved to another row. Liquids may keep
+       flowing sideways across a level surface forever, so that isn't counted. None if a cell still changed rows within
+       the last 'settle_window' ticks of the budget
+    2. The number of cells of each element type at the end
+    3. The number of steps per second, timing only the steps themselves
+
+Run with 'tfs sweep', or 'python -m terminal_falling_sand.sweep'. See 'tfs sweep --help' for options.
+"""
+
+import argparse
+import csv
+import itertools
+import json
+import sys
+from contextlib import ExitStack
+from dataclasses import asdict, dataclass, field
+from multiprocessing.pool import Pool
+from time import perf_counter
+from typing import Callable, Optional
+
+import numpy as np
+
+from . import scenarios
+from .args import grid_size
+from .elements import ELEMENT_TYPES, set_weight
+from .grid import element_type
+from .simulation import ENGINES
+
+# The 'parallel' engine steps with a pool of its own, which a pool's worker processes can't start
+SWEEP_ENGINES = tuple(engine for engine in ENGINES if engine != "parallel")
+SETTLE_WINDOW = 50
+
+
+@dataclass(frozen=True, slots=True)
+class SweepRun:
+    """One run of a sweep
+
+    Attributes:
+        world (str): The name of the world, one of scenarios.SCENARIOS
+        engine (str): The engine to run it on, one of SWEEP_ENGINES
+        width (int): The width of the grid
+        height (int): The height of the grid
+        seed (int): The seed for the simulation's random number generator
+        density (float): Scales how densely the world is filled with sand and water (see the 'scenarios' module)
+        weights (dict[str, float]): The weights to give element types for the run, by name, instead of their own
+        ticks (int): The most ticks to run for
+        settle_window (int): The number of ticks at the end of the budget in which no cell may change rows, for the
+                             world to count as settled
+    """
+
+    world: str
+    engine: str
+    width: int
+    height: int
+    seed: int = 0
+    density: float = 1.0
+    weights: dict[str, float] = field(default_factory=dict)
+    ticks: int = 1000
+    settle_window: int = SETTLE_WINDOW
+
+
+def expand(spec: dict) -> list[SweepRun]:
+    """Expands a sweep spec into its runs, one per combination of the values given for each parameter
+
+    Args:
+        spec (dict): The values to sweep over, by parameter: lists of 'world', 'size' (as WIDTHxHEIGHT strings or
+                     (width, height) pairs), 'engine', 'seed', 'density' and 'weights' (dicts of element names to
+                     weights), and single 'ticks' and 'settle_window' values. Every parameter is optional: 'world'
+                     defaults to every world, 'size' to 160x96, 'engine' to 'list', 'seed' to 0, 'density' to 1.0,
+                     'weights' to the elements' own, 'ticks' to 1000 and 'settle_window' to SETTLE_WINDOW (or
+                     'ticks', if fewer). 'settle_window' can't be more than 'ticks'
+
+    Returns:
+        The runs, in order
+    """
+    unknown = set(spec) - {"world", "size", "engine", "seed", "density", "weights", "ticks", "settle_window"}
+    if unknown:
+        raise ValueError(f"Unknown sweep parameters {sorted(unknown)}")
+
+    worlds = spec.get("world") or list(scenarios.SCENARIOS)
+    sizes = [grid_size(size) if isinstance(size, str) else tuple(size) for size in spec.get("size") or [(160, 96)]]
+    engines = spec.get("engine") or ["list"]
+    for world in worlds:
+        if world not in scenarios.SCENARIOS:
+            raise ValueError(f"Unknown world {world!r}. Expected one of {tuple(scenarios.SCENARIOS)}")
+    for engine in engines:
+        if engine not in SWEEP_ENGINES:
+            raise ValueError(f"Unknown engine {engine!r}. Expected one of {SWEEP_ENGINES}")
+    ticks = spec.get("ticks", 1000)
+    settle_window = spec.get("settle_window", min(SETTLE_WINDOW, ticks))
+    if settle_window > ticks:
+        raise ValueError(f"The settle window ({settle_window} ticks) can't be longer than the budget ({ticks} ticks)")
+    weights = spec.get("weights") or [{}]
+    for variant in weights:
+        for name in variant:
+            element_type(name)
+
+    return [
+        SweepRun(
+            world,
+            engine,
+            width,
+            height,
+            seed,
+            density,
+            dict(variant),
+            ticks,
+            settle_window,
+        )
+        for world, (width, height), engine, seed, density, variant in itertools.product(
+            worlds, sizes, engines, spec.get("seed") or [0], spec.get("density") or [1.0], weights
+        )
+    ]
+
+
+def _chunk_row_counts(sim, index: int) -> np.ndarray:
+    """Returns the number of cells of each element type in each row of a chunk of the simulation's matrix
+
+    Args:
+        sim (Simulation): The simulation
+        index (int): The index of the chunk, see the 'chunks' module
+
+    Returns:
+        The counts, indexed [y, element id] with y relative to the top of the chunk
+    """
+    chunks = sim.matrix.chunks
+    cy, cx = divmod(index, chunks.columns)
+    size = chunks.size
+    ids = sim.matrix.element_ids(cx * size, cy * size, (cx + 1) * size, (cy + 1) * size)
+    types = len(ELEMENT_TYPES)
+    rows = np.arange(ids.shape[0], dtype=np.intp)[:, None] * types
+    return np.bincount((ids + rows).reshape(-1), minlength=ids.shape[0] * types).reshape(-1, types)
+
+
+def run_one(run: SweepRun) -> dict:
+    """Builds and steps the world of a single run
+
+    Element weights are changed for the length of the run, then changed back.
+
+    Args:
+        run (SweepRun): The run
+
+    Returns:
+        The run's parameters and results
+    """
+    defaults = {}
+    try:
+        for name, weight in run.weights.items():
+            element = element_type(name)
+            defaults[element] = element.weight
+            set_weight(element, weight)
+
+        sim = scenarios.build(
+            run.world, engine=run.engine, xmax=run.width, ymax=run.height, seed=run.seed, density=run.density
+        )
+        try:
+            step_time = 0.0
+            ticks = 0
+            changed = 0
+            # The cells of each element type in each row of each chunk, indexed [cy, cx, y, element id]. Only the
+            # chunks a cell moved in during a step can change, so only those are counted again after it
+            chunks = sim.matrix.chunks
+            counts = np.zeros((chunks.rows, chunks.columns, chunks.size, len(ELEMENT_TYPES)), dtype=np.intp)
+            for index in range(chunks.rows * chunks.columns):
+                chunk_counts = _chunk_row_counts(sim, index)
+                counts[divmod(index, chunks.columns)][: len(chunk_counts)] = chunk_counts
+            while ticks < run.ticks and sim.awake_chunks:
+                start = perf_counter()
+                sim.step()
+                step_time += perf_counter() - start
+                ticks += 1
+
+                rows = sorted({index // chunks.columns for index in chunks.moved})
+                before = counts[rows].sum(axis=1)
+                for index in chunks.moved:
+                    chunk_counts = _chunk_row_counts(sim, index)
+                    counts[divmod(index, chunks.columns)][: len(chunk_counts)] = chunk_counts
+                if not np.array_equal(counts[rows].sum(axis=1), before):
+                    changed = ticks
+            totals = np.bincount(sim.matrix.element_ids().reshape(-1), minlength=len(ELEMENT_TYPES))
+        finally:
+            sim.close()
+    finally:
+        for element, weight in defaults.items():
+            set_weight(element, weight)
+
+    # A world with nothing awake has settled for good, however early its budget ran out
+    settled = ticks < run.ticks or changed <= run.ticks - run.settle_window
+    return {
+        **asdict(run),
+        "ticks_run": ticks,
+        "settled_tick": changed if settled else None,
+        "step_seconds": step_time,
+        "steps_per_second": ticks / step_time if step_time else 0.0,
+        "counts": {element.__name__: int(totals[element.id]) for element in ELEMENT_TYPES},
+    }
+
+
+def run_sweep(
+    runs: list[SweepRun], processes: Optional[int] = None, progress: Optional[Callable[[dict], None]] = None
+) -> list[dict]:
+    """Runs every run of a sweep across a pool of worker processes
+
+    Args:
+        runs (list[SweepRun]): The runs, as returned by 'expand'
+        processes (int): The number of worker processes. Defaults to the number of CPUs. 1 runs every run in this
+                         process, one after another
+        progress (Callable[[dict], None]): Handed each run's results as it finishes. Defaults to None
+
+    Returns:
+        The results of each run, in the same order as 'runs'
+    """
+    results: list[Optional[dict]] = [None] * len(runs)
+    with ExitStack() as stack:
+        if processes == 1:
+            finished = map(_run_indexed, enumerate(runs))
+        else:
+            pool = stack.enter_context(Pool(processes))
+            finished = pool.imap_unordered(_run_indexed, enumerate(runs))
+        for i, result in finished:
+            results[i] = result
+            if progress is not None:
+                progress(result)
+    return results
+
+
+def _run_indexed(indexed: tuple[int, SweepRun]) -> tuple[int, dict]:
+    """Runs a run in a worker process, keeping track of which it was"""
+    i, run = indexed
+    return i, run_one(run)
+
+
+def write_table(results: list[dict], file, format: str = "csv") -> None:
+    """Writes the results of a sweep as a table
+
+    Args:
+        results (list[dict]): The results, as returned by 'run_sweep'
+        file: The text file to write to
+        format (str): 'csv' for a row per run, with a column per element type counting its cells, or 'json' for a list
+                      of the results as they are. Defaults to 'csv'
+    """
+    if format == "json":
+        json.dump(results, file, indent=2)
+        file.write("\n")
+        return
+
+    names = [element.__name__ for element in ELEMENT_TYPES]
+    rows = []
+    for result in results:
+        row = {key: value for key, value in result.items() if key != "counts"}
+        row["weights"] = ",".join(f"{name}={weight}" for name, weight in result["weights"].items())
+        row.update(result["counts"])
+        rows.append(row)
+    columns = [key for key in (rows[0] if rows else {}) if key not in names] + names
+    writer = csv.DictWriter(file, columns, lineterminator="\n")
+    writer.writeheader()
+    writer.writerows(rows)
+
+
+def _weights(value: str) -> dict[str, float]:
+    """Parses a NAME=WEIGHT[,NAME=WEIGHT...] set of element weights"""
+    weights = {}
+    try:
+        for pair in filter(None, value.split(",")):
+            name, weight = pair.split("=")
+            weights[name.strip()] = float(weight)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Expected weights like Water=1.5,Sand=2, got {value!r}")
+    return weights
+
+
+parser = argparse.ArgumentParser(
+    prog="tfs sweep", description="Runs every combination of the given parameters headless, across a pool of processes"
+)
+parser.add_argument(
+    "--spec",
+    default=None,
+    help="A JSON file of the values to sweep over, by parameter (see the 'sweep' module). Options given on the command "
+    "line replace the file's",
+)
+parser.add_argument(
+    "-w",
+    "--world",
+    action="append",
+    choices=list(scenarios.SCENARIOS),
+    help="A world to run. May be repeated. Defaults to every world",
+)
+parser.add_argument(
+    "-s",
+    "--size",
+    action="append",
+    type=grid_size,
+    help="A grid size to run, as WIDTHxHEIGHT. May be repeated. Defaults to 160x96",
+)
+parser.add_argument(
+    "-e",
+    "--engine",
+    action="append",
+    choices=SWEEP_ENGINES,
+    help="An engine to run on. May be repeated. Defaults to 'list'",
+)
+parser.add_argument("--seed", action="append", type=int, help="A seed to run. May be repeated. Defaults to 0")
+parser.add_argument(
+    "--density",
+    action="append",
+    type=float,
+    help="Scales how densely worlds are filled with sand and water. May be repeated. Defaults to 1.0",
+)
+parser.add_argument(
+    "--weights",
+    action="append",
+    type=_weights,
+    help="Element weights to run with, as NAME=WEIGHT[,NAME=WEIGHT...]. May be repeated. Defaults to their own",
+)
+parser.add_argument("-t", "--ticks", type=int, default=None, help="The most ticks to run each world for")
+parser.add_argument(
+    "--settle-window",
+    type=int,
+    default=None,
+    help="The number of ticks at the end of a run in which no cell may change rows for the world to count as settled",
+)
+parser.add_argument(
+    "-p",
+    "--processes",
+    type=int,
+    default=None,
+    help="The number of worker processes. Defaults to the number of CPUs",
+)
+parser.add_argument("--format", choices=["csv", "json"], default="csv", help="How to write the table of results")
+parser.add_argument("-o", "--output", default=None, help="The file to write results to. Defaults to stdout")
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    """Runs a sweep from the command line, and writes its table of results"""
+    options = parser.parse_args(argv)
+    spec = {}
+    if options.spec is not None:
+        with open(options.spec, encoding="utf-8") as f:
+            spec = json.load(f)
+    for key in ("world", "size", "engine", "seed", "density", "weights", "ticks", "settle_window"):
+        value = getattr(options, key)
+        if value is not None:
+            spec[key] = value
+
+    try:
+        runs = expand(spec)
+    except ValueError as error:
+        parser.error(str(error))
+    print(f"Running {len(runs)} worlds", file=sys.stderr)
+
+    def report(result: dict) -> None:
+        print(
+            f"{result['world']} {result['width']}x{result['height']} {result['engine']} seed {result['seed']}: "
+            f"settled at {result['settled_tick']}, {result['steps_per_second']:.1f} steps/s",
+            file=sys.stderr,
+        )
+
+    results = run_sweep(runs, options.processes, report)
+    if options.output is None:
+        write_table(results, sys.stdout, options.format)
+    else:
+        with open(options.output, "w", encoding="utf-8", newline="") as f:
+            write_table(results, f, options.format)
+
+
+if __name__ == "__main__":
+    main()
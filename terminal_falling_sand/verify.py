@@ -0,0 +1,413 @@
+"""Checks that an engine steps worlds the way the reference 'list' engine does, across many random worlds
+
+Each world is generated at random from a seed (see 'random_world'), then loaded into the reference engine and a
+candidate engine, both seeded the same. Both are stepped together, and after every tick the candidate is checked against
+one of two MODES:
+
+    - 'exact': the candidate's grid must be identical to the reference's, element for element and color for color. The
+      'numpy' and 'jit' engines visit cells in the same order and draw the same random numbers as the 'list' engine, so
+      they must pass this
+    - 'invariants': the candidate must obey what any engine following the rules in cell_state.BEHAVIORS does, without
+      being identical to the reference. The 'vector' and 'parallel' engines order moves differently, so are only held
+      to these:
+
+        1. No cell of any element type is created or destroyed
+        2. Cells of an element type that never moves, and that nothing weighs more than (e.g. Glass), stay put
+        3. The world never gains potential energy (each cell's weight times its height, summed). A cell only ever swaps
+           with a lighter one below or beside it, which lowers it or leaves it the same
+
+'auto' picks 'exact' for the engines in EXACT_ENGINES, and 'invariants' for the rest. The reference is held to the
+invariants too. The first check each engine fails on a world is reported as a Divergence. Every candidate is stepped
+alongside a single reference, so adding engines to check only adds the cost of stepping them.
+
+By default the reference wakes every cell and chunk before each tick, so it steps every cell: nothing it does depends on
+cells and chunks being put to sleep (see the 'chunks' module and CellMatrix.step). Engines that skip sleeping cells, the
+reference engine itself included, are then checked against one that doesn't. Worlds are several chunks across and
+down, so moves cross chunk edges. In about half the worlds, each liquid is given a random dispersion too (see
+'random_dispersions'), so cells travelling several cells along a row get checked.
+
+Run with 'tfs verify', or 'python -m terminal_falling_sand.verify'. See 'tfs verify --help' for options.
+"""
+
+import argparse
+import functools
+import sys
+from dataclasses import dataclass
+from typing import Callable, Optional, Type
+
+import numpy as np
+
+from .args import grid_size
+from .colors import color_index
+from .elements import ELEMENT_TYPES, ElementType, set_dispersion
+from .simulation import ENGINES, Simulation
+
+MODES = ("auto", "exact", "invariants")
+MAX_DISPERSION = 6
+EXACT_ENGINES = ("list", "numpy", "jit")
+
+
+@dataclass(slots=True)
+class Divergence:
+    """The first check an engine failed on a world
+
+    Attributes:
+        engine (str): The engine that failed
+        seed (int): The seed of the world, see 'random_world'
+        tick (int): The tick after which the check failed. 0 is the world as generated
+        check (str): The check that failed: 'grid' (in 'exact' mode), 'counts', 'static' or 'energy'
+        detail (str): What was wrong
+        reference (bool): Whether the engine failed as the reference, rather than as a candidate. Defaults to False
+    """
+
+    engine: str
+    seed: int
+    tick: int
+    check: str
+    detail: str
+    reference: bool = False
+
+    def __str__(self) -> str:
+        engine = f"{self.engine} (reference)" if self.reference else self.engine
+        return f"{engine} failed '{self.check}' on world {self.seed} after tick {self.tick}: {self.detail}"
+
+
+def random_world(seed: int, max_width: int = 160, max_height: int = 120) -> tuple[np.ndarray, np.ndarray]:
+    """Generates a random world: a few rectangles, each partly filled with a random element type
+
+    Every registered element type other than Empty can turn up, in any of its colors.
+
+    Args:
+        seed (int): The seed to generate the world from. The same seed always generates the same world
+        max_width (int): The widest the world can be, at least 8. Defaults to 160
+        max_height (int): The tallest the world can be, at least 8. Defaults to 120
+
+    Returns:
+        The id of each cell's element type and the index of its color in colors.PALETTE, indexed [y, x]
+    """
+    rng = np.random.default_rng(seed)
+    width = int(rng.integers(8, max_width + 1))
+    height = int(rng.integers(8, max_height + 1))
+    element = np.zeros((height, width), dtype=np.uint8)
+    color = np.full((height, width), color_index(ELEMENT_TYPES[0].colors[0]), dtype=np.uint16)
+
+    for _ in range(int(rng.integers(2, 9))):
+        kind = ELEMENT_TYPES[int(rng.integers(1, len(ELEMENT_TYPES)))]
+        x0, x1 = sorted(rng.integers(0, width + 1, 2).tolist())
+        y0, y1 = sorted(rng.integers(0, height + 1, 2).tolist())
+        filled = rng.random((y1 - y0, x1 - x0)) < rng.uniform(0.1, 1.0)
+        palette = np.array([color_index(c) for c in kind.colors], dtype=np.uint16)
+        element[y0:y1, x0:x1][filled] = kind.id
+        color[y0:y1, x0:x1][filled] = palette[rng.integers(0, len(palette), int(filled.sum()))]
+    return element, color
+
+
+def random_dispersions(seed: int) -> dict[Type[ElementType], int]:
+    """Picks how far each liquid travels along a row in a random world (see elements.set_dispersion)
+
+    About half the worlds keep every element's own dispersion. The rest give each liquid one from 2 to MAX_DISPERSION.
+
+    Args:
+        seed (int): The seed of the world. The same seed always picks the same dispersions
+
+    Returns:
+        The dispersion to give each element type that gets a new one, by element type
+    """
+    rng = np.random.default_rng([seed, 1])
+    if rng.random() < 0.5:
+        return {}
+    return {e: int(rng.integers(2, MAX_DISPERSION + 1)) for e in ELEMENT_TYPES if e.spec.behavior == "liquid"}
+
+
+class Invariants:
+    """Checks a world for the invariants every engine must keep as it steps. See the module's docstring
+
+    Attributes:
+        counts (np.ndarray): The number of cells of each element type, by id
+        fixed (np.ndarray): A mask of the cells that must never change
+        energy (float): The world's potential energy as of the last check
+    """
+
+    def __init__(self, element: np.ndarray) -> None:
+        """Initializes an instance of the Invariants class
+
+        Args:
+            element (np.ndarray): The id of each cell's element type in the world as it starts, indexed [y, x]
+        """
+        heaviest = max((e.weight for e in ELEMENT_TYPES if not e.spec.ignore), default=0)
+        fixed = np.array([e.spec.ignore and e.weight >= heaviest for e in ELEMENT_TYPES])
+        # Cells that can't move don't count towards the energy, which keeps it finite
+        self._weights = np.array([0.0 if e.spec.ignore else e.weight for e in ELEMENT_TYPES], dtype=np.float64)
+        self._heights = np.arange(element.shape[0] - 1, -1, -1, dtype=np.float64)[:, None]
+
+        self.counts = self._counts(element)
+        self.fixed = fixed[element]
+        self._fixed_ids = element[self.fixed]
+        self.energy = self._energy(element)
+
+    def _counts(self, element: np.ndarray) -> np.ndarray:
+        return np.bincount(element.reshape(-1), minlength=len(ELEMENT_TYPES))
+
+    def _energy(self, element: np.ndarray) -> float:
+        return float((self._weights[element] * self._heights).sum())
+
+    def check(self, element: np.ndarray) -> Optional[tuple[str, str]]:
+        """Checks the world as it is now
+
+        Args:
+            element (np.ndarray): The id of each cell's element type, indexed [y, x]
+
+        Returns:
+            The check that failed and what was wrong, or None if none did
+        """
+        counts = self._counts(element)
+        if not np.array_equal(counts, self.counts):
+            changed = [
+                f"{e.__name__} {self.counts[e.id]} -> {counts[e.id]}"
+                for e in ELEMENT_TYPES
+                if counts[e.id] != self.counts[e.id]
+            ]
+            return ("counts", ", ".join(changed))
+
+        moved = element[self.fixed] != self._fixed_ids
+        if moved.any():
+            ys, xs = np.nonzero(self.fixed)
+            x, y = int(xs[moved][0]), int(ys[moved][0])
+            return ("static", f"{int(moved.sum())} fixed cells changed, e.g. ({x}, {y})")
+
+        energy = self._energy(element)
+        if energy > self.energy + 1e-9 * max(abs(self.energy), 1.0):
+            return ("energy", f"potential energy rose from {self.energy:g} to {energy:g}")
+        self.energy = energy
+        return None
+
+
+def _difference(
+    engine: str, expected: np.ndarray, candidate: Simulation, colors: Callable[[], np.ndarray]
+) -> Optional[str]:
+    """Describes how the candidate's grid differs from the reference's, if it does
+
+    The reference's colors are only looked up once its element types match the candidate's, as they're slow to get from
+    the 'list' engine.
+    """
+    actual = candidate.matrix.element_ids()
+    wrong = expected != actual
+    if not wrong.any():
+        wrong = colors() != candidate.matrix.color_indices()
+        if not wrong.any():
+            return None
+    ys, xs = np.nonzero(wrong)
+    x, y = int(xs[0]), int(ys[0])
+    return (
+        f"{int(wrong.sum())} cells differ, e.g. ({x}, {y}) is {ELEMENT_TYPES[expected[y, x]].__name__} on the "
+        f"reference and {ELEMENT_TYPES[actual[y, x]].__name__} on {engine}"
+    )
+
+
+def compare(
+    seed: int,
+    engines: list[str],
+    reference: str = "list",
+    ticks: int = 200,
+    mode: str = "auto",
+    max_width: int = 160,
+    max_height: int = 120,
+    workers: Optional[int] = None,
+    exhaustive: bool = True,
+) -> list[Divergence]:
+    """Steps a random world on candidate engines and on the reference engine, checking each candidate after every tick
+
+    The reference is stepped once for all the candidates. A candidate that fails a check is dropped, and the rest carry
+    on. If the reference itself fails one, there's nothing left to compare against, so the world ends there.
+
+    Liquids are given the world's dispersions (see 'random_dispersions') while it's stepped, then their own back.
+
+    Args:
+        seed (int): The seed of the world, see 'random_world'. Every simulation's random number generator is seeded
+                    with it too
+        engines (list[str]): The candidate engines. May include the reference engine if 'exhaustive' is set, which
+                             checks its chunk and cell sleep against stepping every cell
+        reference (str): The reference engine. Defaults to 'list'
+        ticks (int): The number of ticks to step. Defaults to 200
+        mode (str): How to check the candidates, one of MODES. Defaults to 'auto'
+        max_width (int): The widest the world can be. Defaults to 160
+        max_height (int): The tallest the world can be. Defaults to 120
+        workers (int): The number of worker processes for the 'parallel' engine. Defaults to the number of CPUs
+        exhaustive (bool): Whether the reference wakes every cell and chunk before each tick (see CellMatrix.wake_all),
+                           so it steps every cell rather than skipping those asleep. Defaults to True
+
+    Returns:
+        The first check each engine failed, for those that failed one
+    """
+    if mode not in MODES:
+        raise ValueError(f"Unknown mode {mode!r}. Expected one of {MODES}")
+    modes = {
+        engine: mode if mode != "auto" else "exact" if {engine, reference} <= set(EXACT_ENGINES) else "invariants"
+        for engine in engines
+        if exhaustive or engine != reference
+    }
+
+    element, color = random_world(seed, max_width, max_height)
+    height, width = element.shape
+    divergences = []
+    sims = {}
+    expected = None
+    dispersions = random_dispersions(seed)
+    defaults = {e: e.spec.dispersion for e in dispersions}
+    try:
+        for kind, dispersion in dispersions.items():
+            set_dispersion(kind, dispersion)
+        expected = Simulation(width, height, engine=reference, workers=workers, seed=seed)
+        expected.matrix.restore(element.copy(), color.copy(), 0)
+        for name in modes:
+            sim = sims[name] = Simulation(width, height, engine=name, workers=workers, seed=seed)
+            sim.matrix.restore(element.copy(), color.copy(), 0)
+        invariants = Invariants(element)
+        candidate_invariants = {name: Invariants(element) for name in sims}
+
+        for tick in range(1, ticks + 1):
+            if not sims:
+                break
+            if exhaustive:
+                expected.matrix.wake_all()
+            expected.step()
+            for sim in sims.values():
+                sim.step()
+            ids = expected.matrix.element_ids()
+            failed = invariants.check(ids)
+            if failed is not None:
+                divergences.append(Divergence(reference, seed, tick, *failed, reference=True))
+                break
+
+            colors = functools.cache(expected.matrix.color_indices)
+            for name in list(sims):
+                if modes[name] == "exact":
+                    # Identical to the reference, which was checked for the invariants already
+                    detail = _difference(name, ids, sims[name], colors)
+                    failed = None if detail is None else ("grid", detail)
+                else:
+                    failed = candidate_invariants[name].check(sims[name].matrix.element_ids())
+                if failed is not None:
+                    divergences.append(Divergence(name, seed, tick, *failed))
+                    sims.pop(name).close()
+    finally:
+        for sim in sims.values():
+            sim.close()
+        if expected is not None:
+            expected.close()
+        for kind, dispersion in defaults.items():
+            set_dispersion(kind, dispersion)
+    return divergences
+
+
+def verify(
+    engines: list[str],
+    worlds: int = 50,
+    seed: int = 0,
+    progress: Optional[Callable[[int, list[Divergence]], None]] = None,
+    **kwargs,
+) -> list[Divergence]:
+    """Compares engines against the reference on many random worlds, stopping at each engine's first divergence
+
+    Args:
+        engines (list[str]): The candidate engines
+        worlds (int): The number of worlds to compare the engines on. Defaults to 50
+        seed (int): The seed of the first world. The rest follow on from it. Defaults to 0
+        progress (Callable[[int, list[Divergence]], None]): Handed each world's seed and the divergences found on it,
+                                                            after each world. Defaults to None
+        **kwargs: Passed on to 'compare' (reference, ticks, mode, max_width, max_height, workers, exhaustive)
+
+    Returns:
+        The first divergence found on each engine that diverged, including the reference if it broke an invariant
+    """
+    reference = kwargs.get("reference", "list")
+    remaining = [engine for engine in engines if kwargs.get("exhaustive", True) or engine != reference]
+    divergences = []
+    for world in range(seed, seed + worlds):
+        if not remaining:
+            break
+        found = compare(world, remaining, **kwargs)
+        if progress is not None:
+            progress(world, found)
+        divergences += found
+        if any(divergence.reference for divergence in found):
+            break
+        diverged = {divergence.engine for divergence in found}
+        remaining = [engine for engine in remaining if engine not in diverged]
+    return divergences
+
+
+parser = argparse.ArgumentParser(
+    prog="tfs verify",
+    description="Checks that engines step random worlds the way the reference engine does. Exits with status 1 if any "
+    "engine diverges",
+)
+parser.add_argument(
+    "-e",
+    "--engine",
+    action="append",
+    choices=ENGINES,
+    help="An engine to check. May be repeated. Defaults to 'list', 'numpy', 'vector' and 'jit'",
+)
+parser.add_argument("--reference", choices=ENGINES, default="list", help="The engine to check against")
+parser.add_argument(
+    "-m",
+    "--mode",
+    choices=MODES,
+    default="auto",
+    help="'exact' compares grids tick by tick, 'invariants' checks conservation of elements, fixed cells and energy. "
+    "'auto' compares exactly on the engines meant to be identical to the reference",
+)
+parser.add_argument("-n", "--worlds", type=int, default=50, help="The number of random worlds to check each engine on")
+parser.add_argument("--seed", type=int, default=0, help="The seed of the first world")
+parser.add_argument("-t", "--ticks", type=int, default=200, help="The number of ticks to step each world")
+parser.add_argument(
+    "-s",
+    "--max-size",
+    type=grid_size,
+    default=(160, 120),
+    help="The largest a world can be, as WIDTHxHEIGHT. Defaults to 160x120, several chunks (see the 'chunks' module) "
+    "across and down",
+)
+parser.add_argument(
+    "--fast-reference",
+    dest="exhaustive",
+    action="store_false",
+    help="Lets the reference skip sleeping cells and chunks as it normally would, rather than stepping every cell",
+)
+parser.add_argument("--workers", type=int, default=None, help="The number of worker processes for the parallel engine")
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    """Verifies engines from the command line, exiting with status 1 if any diverged"""
+    options = parser.parse_args(argv)
+    engines = options.engine or ["list", "numpy", "vector", "jit"]
+    max_width, max_height = options.max_size
+
+    def report(seed: int, divergences: list[Divergence]) -> None:
+        for divergence in divergences:
+            print(divergence, file=sys.stderr)
+
+    divergences = verify(
+        engines,
+        options.worlds,
+        options.seed,
+        report,
+        reference=options.reference,
+        ticks=options.ticks,
+        mode=options.mode,
+        max_width=max_width,
+        max_height=max_height,
+        workers=options.workers,
+        exhaustive=options.exhaustive,
+    )
+    diverged = {divergence.engine for divergence in divergences}
+    for engine in engines:
+        if engine not in diverged and (options.exhaustive or engine != options.reference):
+            print(f"{engine}: {options.worlds} worlds of {options.ticks} ticks, no divergence", file=sys.stderr)
+    if divergences:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
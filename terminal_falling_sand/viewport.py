@@ -0,0 +1,221 @@
+"""Hosts the Viewport class, a scrollable window onto a matrix larger than the terminal
+
+A Viewport renders the same way a matrix does, and exposes the same color_indices method, so anything that can draw a
+matrix can draw a Viewport instead. Only the cells inside the window are read, so the cost of a frame depends on the
+size of the terminal rather than the size of the world.
+"""
+
+import os
+import sys
+from select import select
+from threading import Event, Thread
+from typing import Optional
+
+import numpy as np
+from rich.console import Console, ConsoleOptions, RenderResult
+
+from .colors import EMPTY_COLOR, color_index
+from .coordinate import Coordinate
+from .palette import RICH_PALETTE
+
+MAX_SCALE = 64
+
+
+def downsample(colors: np.ndarray, scale: int) -> np.ndarray:
+    """Aggregates each block of scale x scale cells into one cell
+
+    A block at least half full is drawn as the color of its first non-empty cell (row by row), otherwise as empty. Cells
+    past the edge of the array count as empty.
+
+    Args:
+        colors (np.ndarray): The index of each cell's color in the colors.PALETTE, indexed [y, x]
+        scale (int): The width and height of each block
+
+    Returns:
+        The color of each block, indexed [y, x]
+    """
+    if scale == 1:
+        return colors
+    empty = color_index(EMPTY_COLOR)
+    height, width = colors.shape
+    rows = -(-height // scale)
+    columns = -(-width // scale)
+    padded = np.full((rows * scale, columns * scale), empty, dtype=colors.dtype)
+    padded[:height, :width] = colors
+    blocks = padded.reshape(rows, scale, columns, scale).transpose(0, 2, 1, 3).reshape(rows, columns, scale * scale)
+
+    filled = blocks != empty
+    first = filled.argmax(axis=2)[..., None]
+    result = np.take_along_axis(blocks, first, axis=2)[..., 0]
+    result[filled.sum(axis=2) * 2 < scale * scale] = empty
+    return result
+
+
+class Viewport:
+    """A scrollable window onto a matrix, optionally downsampled into an overview
+
+    The window is 'width' x 'height' glyph cells (two rows of cells per line of the terminal, see
+    CellMatrix.__rich_console__). At a 'scale' above 1 each of those is a block of scale x scale cells of the matrix, so
+    the window covers scale times as much of the world in each direction. The window never leaves the matrix, unless
+    the matrix is smaller than the window, in which case the rest of the window is drawn empty.
+
+    Attributes:
+        matrix (Union[CellMatrix, CellGrid]): The matrix the viewport looks onto
+        width (int): The width of the window, in drawn cells
+        height (int): The height of the window, in drawn cells
+        x (int): The column of the matrix at the left edge of the window
+        y (int): The row of the matrix at the top edge of the window
+        scale (int): The width and height of the block of cells aggregated into each drawn cell. 1 draws every cell
+        max_coord (Coordinate): The maximum valid coordinate of what the viewport draws
+
+    """
+
+    def __init__(
+        self,
+        matrix,
+        width: int,
+        height: int,
+        x: Optional[int] = None,
+        y: Optional[int] = None,
+        scale: int = 1,
+    ) -> None:
+        """Initializes an instance of the Viewport class
+
+        Args:
+            matrix (Union[CellMatrix, CellGrid]): The matrix to look onto
+            width (int): The width of the window, in drawn cells
+            height (int): The height of the window, in drawn cells
+            x (int): The column at the left edge of the window. Defaults to centering the window
+            y (int): The row at the top edge of the window. Defaults to centering the window
+            scale (int): The width and height of the block of cells drawn as one. Defaults to 1
+        """
+        self.matrix = matrix
+        self.width = width
+        self.height = height
+        self.max_coord = Coordinate(width - 1, height - 1)
+        self.scale = scale
+        self.x = 0
+        self.y = 0
+        self.move(
+            (self._world_width - width * scale) // 2 if x is None else x,
+            (self._world_height - height * scale) // 2 if y is None else y,
+        )
+
+    @property
+    def _world_width(self) -> int:
+        return self.matrix.max_coord.x + 1
+
+    @property
+    def _world_height(self) -> int:
+        return self.matrix.max_coord.y + 1
+
+    def move(self, x: int, y: int) -> None:
+        """Moves the top left corner of the window to x/y, keeping the window inside the matrix"""
+        self.x = max(min(x, self._world_width - self.width * self.scale), 0)
+        self.y = max(min(y, self._world_height - self.height * self.scale), 0)
+
+    def scroll(self, dx: int, dy: int) -> None:
+        """Moves the window by dx/dy drawn cells, keeping it inside the matrix"""
+        self.move(self.x + dx * self.scale, self.y + dy * self.scale)
+
+    def zoom(self, scale: int) -> None:
+        """Changes the scale of the window, keeping it centered on the same cell
+
+        Args:
+            scale (int): The new scale, between 1 and MAX_SCALE
+        """
+        scale = max(min(scale, MAX_SCALE), 1)
+        center_x = self.x + self.width * self.scale // 2
+        center_y = self.y + self.height * self.scale // 2
+        self.scale = scale
+        self.move(center_x - self.width * scale // 2, center_y - self.height * scale // 2)
+
+    def color_indices(self) -> np.ndarray:
+        """Returns the index of each drawn cell's color in the colors.PALETTE, indexed [y, x]
+
+        Always 'height' x 'width', so frames can be compared with one another.
+        """
+        x0 = self.x
+        y0 = self.y
+        colors = self.matrix.color_indices(x0, y0, x0 + self.width * self.scale, y0 + self.height * self.scale)
+        colors = downsample(colors, self.scale)
+        if colors.shape != (self.height, self.width):
+            window = np.full((self.height, self.width), color_index(EMPTY_COLOR), dtype=np.uint16)
+            window[: colors.shape[0], : colors.shape[1]] = colors[: self.height, : self.width]
+            colors = window
+        return colors
+
+    def __rich_console__(self, console: Console, options: ConsoleOptions) -> RenderResult:
+        """Renders the window using the Rich Console Protocol. See CellMatrix.__rich_console__"""
+        yield from RICH_PALETTE.segments(self.color_indices())
+
+
+class ScrollKeys(Thread):
+    """Scrolls and zooms a Viewport from the keyboard while a simulation runs
+
+    The arrow keys (or h/j/k/l, or w/a/s/d) scroll by a quarter of the window, '+' and '-' zoom out of and back into an
+    overview. Ctrl+C still interrupts the simulation. Does nothing unless stdin is a terminal on a POSIX system.
+
+    Use as a context manager: entering puts the terminal in cbreak mode and starts reading keys, exiting restores it.
+    """
+
+    KEYS = {
+        b"\x1b[A": (0, -1),
+        b"\x1b[B": (0, 1),
+        b"\x1b[C": (1, 0),
+        b"\x1b[D": (-1, 0),
+        b"k": (0, -1),
+        b"j": (0, 1),
+        b"l": (1, 0),
+        b"h": (-1, 0),
+        b"w": (0, -1),
+        b"s": (0, 1),
+        b"d": (1, 0),
+        b"a": (-1, 0),
+    }
+
+    def __init__(self, viewport: Viewport) -> None:
+        """Initializes an instance of the ScrollKeys class
+
+        Args:
+            viewport (Viewport): The viewport to scroll
+        """
+        super().__init__(daemon=True)
+        self.viewport = viewport
+        self._stopping = Event()
+        self._settings = None
+
+    def __enter__(self) -> "ScrollKeys":
+        if os.name != "posix" or not sys.stdin.isatty():
+            return self
+        import termios
+        import tty
+
+        self._settings = termios.tcgetattr(sys.stdin.fileno())
+        tty.setcbreak(sys.stdin.fileno())
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        if self._settings is None:
+            return
+        import termios
+
+        self._stopping.set()
+        self.join()
+        termios.tcsetattr(sys.stdin.fileno(), termios.TCSADRAIN, self._settings)
+
+    def run(self) -> None:
+        fd = sys.stdin.fileno()
+        viewport = self.viewport
+        while not self._stopping.is_set():
+            if not select([fd], [], [], 0.1)[0]:
+                continue
+            key = os.read(fd, 8)
+            if key in (b"+", b"="):
+                viewport.zoom(viewport.scale * 2)
+            elif key in (b"-", b"_"):
+                viewport.zoom(viewport.scale // 2)
+            elif key in self.KEYS:
+                dx, dy = self.KEYS[key]
+                viewport.scroll(dx * max(viewport.width // 4, 1), dy * max(viewport.height // 4, 1))
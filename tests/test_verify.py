@@ -0,0 +1,28 @@
+"""Checks every engine against the reference on a few random worlds. See the 'verify' module"""
+
+import pytest
+
+from terminal_falling_sand import verify
+from terminal_falling_sand.elements import ELEMENT_TYPES
+from terminal_falling_sand.jit import JIT_AVAILABLE
+
+ENGINES = [
+    "list",
+    "numpy",
+    "vector",
+    pytest.param("jit", marks=pytest.mark.skipif(not JIT_AVAILABLE, reason="Numba isn't installed")),
+    "parallel",
+]
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_engine_matches_reference(engine: str) -> None:
+    divergences = verify.verify([engine], worlds=8, ticks=60, workers=2)
+    assert not divergences, "\n".join(str(divergence) for divergence in divergences)
+
+
+def test_dispersions_are_restored() -> None:
+    dispersions = [e.spec.dispersion for e in ELEMENT_TYPES]
+    seed = next(seed for seed in range(100) if verify.random_dispersions(seed))
+    verify.compare(seed, ["numpy"], ticks=1)
+    assert [e.spec.dispersion for e in ELEMENT_TYPES] == dispersions